@@ -0,0 +1,182 @@
+# sales/management/commands/partition_audit_logs.py
+"""
+Comando de Django para particionar la bitácora (audit_logs) por mes en PostgreSQL.
+
+Con particiones mensuales los índices de cada partición son más pequeños,
+el VACUUM es más barato y los meses antiguos se pueden archivar o eliminar
+como una tabla completa.
+
+Uso:
+    python manage.py partition_audit_logs --convert          # Una sola vez
+    python manage.py partition_audit_logs --months-ahead=3   # Programar mensualmente (cron)
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from sales.models_audit import AuditLog
+
+
+class Command(BaseCommand):
+    help = 'Particiona audit_logs por mes (PostgreSQL) y crea las particiones de los próximos meses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='Meses futuros para los que se crean particiones (default: 3)'
+        )
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Convertir la tabla actual en una tabla particionada (copia los datos)'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(
+                self.style.WARNING('El particionado solo está disponible en PostgreSQL; no se hizo nada')
+            )
+            return
+
+        table = AuditLog._meta.db_table
+        months_ahead = options['months_ahead']
+
+        with transaction.atomic():
+            if not self._is_partitioned(table):
+                if not options['convert']:
+                    self.stdout.write(
+                        self.style.ERROR(f'{table} no está particionada. Ejecute con --convert primero')
+                    )
+                    return
+                self._convert(table, months_ahead)
+            else:
+                created = self._ensure_partitions(table, self._current_month(), months_ahead)
+                self.stdout.write(self.style.SUCCESS(f'✓ {created} particiones nuevas'))
+
+    def _is_partitioned(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT relkind FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+        return row is not None and row[0] == 'p'
+
+    @staticmethod
+    def _current_month():
+        return timezone.now().date().replace(day=1)
+
+    def _convert(self, table, months_ahead):
+        """Recrea la tabla como particionada por RANGE(timestamp) y copia los datos."""
+        legacy = f'{table}_legacy'
+        quote = connection.ops.quote_name
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}')
+            cursor.execute(
+                f'CREATE TABLE {quote(table)} (LIKE {quote(legacy)} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+                f'PARTITION BY RANGE ("timestamp")'
+            )
+            # La clave primaria de una tabla particionada debe incluir la columna de partición
+            cursor.execute(f'ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, "timestamp")')
+
+            cursor.execute(f'SELECT MIN("timestamp") FROM {quote(legacy)}')
+            oldest = cursor.fetchone()[0]
+
+        start = oldest.date().replace(day=1) if oldest else self._current_month()
+        months_back = relativedelta(self._current_month(), start)
+        created = self._ensure_partitions(
+            table, start, months_back.years * 12 + months_back.months + months_ahead
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {quote(table)} SELECT * FROM {quote(legacy)}')
+            copied = cursor.rowcount
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 1)) FROM {quote(table)}",
+                [table]
+            )
+            cursor.execute(f'DROP TABLE {quote(legacy)}')
+            cursor.execute(
+                f'ALTER TABLE {quote(table)} ADD FOREIGN KEY (user_id) '
+                f'REFERENCES auth_user (id) DEFERRABLE INITIALLY DEFERRED'
+            )
+            cursor.execute(
+                f'CREATE INDEX ix_audit_timestamp_brin ON {quote(table)} '
+                f'USING BRIN ("timestamp") WITH (pages_per_range = 32)'
+            )
+
+        # Índices del modelo (se propagan a cada partición)
+        with connection.schema_editor() as schema_editor:
+            for index in AuditLog._meta.indexes:
+                schema_editor.add_index(AuditLog, index)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ {table} particionada: {created} particiones, {copied} registros copiados')
+        )
+
+    def _ensure_partitions(self, table, start, months_ahead):
+        """
+        Crea (si no existen) las particiones mensuales desde start hasta
+        months_ahead meses después, más una partición DEFAULT de respaldo.
+
+        Si la partición DEFAULT ya tiene registros de un mes nuevo, PostgreSQL
+        rechaza el CREATE TABLE ... PARTITION OF; por eso se separa la DEFAULT,
+        se crean las particiones, se le mueven los registros y se vuelve a unir.
+
+        Returns:
+            int: Número de particiones creadas
+        """
+        quote = connection.ops.quote_name
+        default = f'{table}_default'
+        created = 0
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1 FROM pg_class WHERE relname = %s', [default])
+            has_default = cursor.fetchone() is not None
+            detached = False
+
+            for offset in range(months_ahead + 1):
+                month_start = start + relativedelta(months=offset)
+                month_end = month_start + relativedelta(months=1)
+                partition = f'{table}_{month_start:%Y_%m}'
+
+                cursor.execute('SELECT 1 FROM pg_class WHERE relname = %s', [partition])
+                if cursor.fetchone():
+                    continue
+
+                if has_default and not detached:
+                    cursor.execute(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(default)}')
+                    detached = True
+
+                cursor.execute(
+                    f'CREATE TABLE {quote(partition)} PARTITION OF {quote(table)} '
+                    f'FOR VALUES FROM (%s) TO (%s)',
+                    [month_start.isoformat(), month_end.isoformat()]
+                )
+                created += 1
+
+                if detached:
+                    # Mover a la nueva partición los registros del mes que cayeron en DEFAULT
+                    cursor.execute(
+                        f'WITH moved AS ('
+                        f'DELETE FROM {quote(default)} WHERE "timestamp" >= %s AND "timestamp" < %s '
+                        f'RETURNING *) '
+                        f'INSERT INTO {quote(table)} SELECT * FROM moved',
+                        [month_start.isoformat(), month_end.isoformat()]
+                    )
+                    if cursor.rowcount:
+                        self.stdout.write(
+                            f'  {cursor.rowcount} registros movidos de {default} a {partition}'
+                        )
+
+            if detached:
+                cursor.execute(f'ALTER TABLE {quote(table)} ATTACH PARTITION {quote(default)} DEFAULT')
+            else:
+                # Evita perder registros si no se creó a tiempo la partición del mes
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS {quote(default)} PARTITION OF {quote(table)} DEFAULT'
+                )
+
+        return created
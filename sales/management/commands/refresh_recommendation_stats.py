@@ -0,0 +1,42 @@
+# sales/management/commands/refresh_recommendation_stats.py
+"""
+Comando de Django para recalcular las tablas desnormalizadas de recomendaciones.
+
+Uso:
+    python manage.py refresh_recommendation_stats
+    python manage.py refresh_recommendation_stats --days=30
+
+Programar cada hora (cron / tarea programada).
+"""
+
+from django.core.management.base import BaseCommand
+from sales.models_recommendations import ProductRecentSales, ProductCoOccurrence
+
+
+class Command(BaseCommand):
+    help = 'Recalcula las ventas recientes y co-ocurrencias de productos usadas por las recomendaciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Ventana de ventas recientes en días (default: 30)'
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+
+        self.stdout.write(f'Recalculando ventas de los últimos {days} días...')
+        total = ProductRecentSales.refresh(days=days)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ {total} productos con ventas recientes actualizados')
+        )
+
+        self.stdout.write('Recalculando productos comprados juntos...')
+        pairs = ProductCoOccurrence.refresh()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ {pairs} pares de productos actualizados')
+        )
@@ -340,7 +340,7 @@ class SessionTrackingMiddleware(MiddlewareMixin):
         """
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            ip = request.META.get('REMOTE_ADDR', '0.0.0.0')
-        return ip
+            # Primera IP de la lista, sin crear una lista con split()
+            comma = x_forwarded_for.find(',')
+            return (x_forwarded_for[:comma] if comma >= 0 else x_forwarded_for).strip()
+        return request.META.get('REMOTE_ADDR') or '0.0.0.0'
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_offer'),
+        ('sales', '0004_paymentmethod_order_payment_method'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product', 'order'], name='idx_orderitem_product_order'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_offer'),
+        ('sales', '0005_order_orderitem_recommender_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRecentSales',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recent_sales_stats', serialize=False, to='products.product')),
+                ('recent_sales', models.PositiveIntegerField(default=0)),
+                ('recent_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Ventas Recientes por Producto',
+                'verbose_name_plural': 'Ventas Recientes por Producto',
+                'db_table': 'product_recent_sales_30d',
+                'indexes': [models.Index(fields=['-recent_sales'], name='product_rec_recent__146288_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_offer'),
+        ('sales', '0006_productrecentsales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCoOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+                ('product_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Co-ocurrencia de Productos',
+                'verbose_name_plural': 'Co-ocurrencias de Productos',
+                'db_table': 'product_co_occurrence',
+                'constraints': [models.UniqueConstraint(fields=('product_a', 'product_b'), name='uniq_product_co_occurrence_pair')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_offer'),
+        ('sales', '0007_productcooccurrence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'customer', '-created_at'], name='ix_order_status_cust_dt'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'COMPLETED')), fields=['-created_at'], name='ix_order_completed_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'product'], name='ix_oi_order_prod'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_order_orderitem_access_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action_type',
+            field=models.CharField(choices=[('AUTH', 'Autenticación'), ('CREATE', 'Creación'), ('READ', 'Lectura'), ('UPDATE', 'Actualización'), ('DELETE', 'Eliminación'), ('REPORT', 'Generación de Reporte'), ('PAYMENT', 'Pago/Transacción'), ('CONFIG', 'Configuración'), ('ML', 'Acción de Machine Learning'), ('OTHER', 'Otra')], default='OTHER', help_text='Tipo de acción realizada', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='endpoint',
+            field=models.CharField(help_text='URL del endpoint accedido', max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='http_method',
+            field=models.CharField(help_text='Método HTTP (GET, POST, PUT, DELETE, etc.)', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='ip_address',
+            field=models.GenericIPAddressField(help_text='Dirección IP del usuario'),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='response_status',
+            field=models.IntegerField(help_text='Código de estado HTTP de la respuesta'),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='severity',
+            field=models.CharField(choices=[('LOW', 'Baja'), ('MEDIUM', 'Media'), ('HIGH', 'Alta'), ('CRITICAL', 'Crítica')], default='LOW', help_text='Nivel de severidad de la acción', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='success',
+            field=models.BooleanField(default=True, help_text='Si la operación fue exitosa'),
+        ),
+    ]
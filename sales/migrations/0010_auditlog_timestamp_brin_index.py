@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:37
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_timestamp_index(apps, schema_editor):
+    """
+    BRIN en PostgreSQL: audit_logs es de solo inserción y ordenada por tiempo,
+    así que un BRIN sirve los rangos de fechas casi sin costo de escritura.
+    En otros motores (SQLite en desarrollo) se mantiene un btree.
+    """
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX ix_audit_timestamp_brin ON audit_logs '
+            'USING BRIN ("timestamp") WITH (pages_per_range = 32)'
+        )
+    else:
+        schema_editor.execute(
+            'CREATE INDEX ix_audit_timestamp_brin ON audit_logs ("timestamp")'
+        )
+
+
+def drop_timestamp_index(apps, schema_editor):
+    schema_editor.execute('DROP INDEX IF EXISTS ix_audit_timestamp_brin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_auditlog_drop_single_column_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='auditlog',
+            name='audit_logs_timesta_d733ec_idx',
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Fecha y hora exacta de la acción'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', 'timestamp'], name='ix_audit_user_ts'),
+        ),
+        migrations.RunPython(create_timestamp_index, drop_timestamp_index),
+    ]
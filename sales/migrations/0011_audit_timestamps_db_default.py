@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-17 13:38
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+def restore_timestamp_index(apps, schema_editor):
+    """
+    En SQLite AlterField reconstruye la tabla y se pierde el índice de
+    timestamp creado con SQL en 0010; en PostgreSQL el BRIN se conserva.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS ix_audit_timestamp_brin ON audit_logs ("timestamp")'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0010_auditlog_timestamp_brin_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='timestamp',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now(), help_text='Fecha y hora exacta de la acción'),
+        ),
+        migrations.AlterField(
+            model_name='usersession',
+            name='last_activity',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.AlterField(
+            model_name='usersession',
+            name='login_time',
+            field=models.DateTimeField(db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.RunPython(restore_timestamp_index, migrations.RunPython.noop),
+    ]
@@ -23,6 +23,9 @@ class ProductSalesPredictor:
     Predictor de ventas por producto con filtros avanzados.
     """
     
+    # Campos de producto usados en las respuestas (el resto se difiere)
+    PRODUCT_FIELDS = ('id', 'name', 'price', 'stock', 'category__name')
+    
     def __init__(self):
         self.models = {}  # Diccionario de modelos por producto
         self.poly_features = {}
@@ -46,7 +49,9 @@ class ProductSalesPredictor:
             Dict con predicciones detalladas
         """
         try:
-            product = Product.objects.select_related('category').get(id=product_id)
+            product = Product.objects.select_related('category').only(
+                *self.PRODUCT_FIELDS
+            ).get(id=product_id)
         except Product.DoesNotExist:
             raise ValueError(f"Producto {product_id} no encontrado")
         
@@ -79,6 +84,21 @@ class ProductSalesPredictor:
         # Análisis de tendencia
         trend_analysis = self._analyze_product_trend(historical_data)
         
+        return self._build_product_forecast(
+            product, predictions, historical_data, trend_analysis, metrics
+        )
+    
+    def _build_product_forecast(
+        self,
+        product: Product,
+        predictions: List[Dict[str, Any]],
+        historical_data: pd.DataFrame,
+        trend_analysis: Dict[str, Any],
+        metrics: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Arma el resultado de predicción de un producto para len(predictions) días."""
+        days = len(predictions)
+        
         # Calcular métricas útiles
         total_predicted_units = sum(p['predicted_units'] for p in predictions)
         total_predicted_revenue = sum(p['predicted_revenue'] for p in predictions)
@@ -154,7 +174,7 @@ class ProductSalesPredictor:
             raise ValueError(f"Categoría {category_id} no encontrada")
         
         # Obtener todos los productos de la categoría
-        products = Product.objects.filter(category_id=category_id)
+        products = Product.objects.filter(category_id=category_id).only('id', 'name', 'stock')
         
         if not products.exists():
             return {
@@ -163,31 +183,40 @@ class ProductSalesPredictor:
                 'error': 'No hay productos en esta categoría'
             }
         
-        # Predecir cada producto
+        # Un solo query con el histórico de toda la categoría y un ajuste
+        # por bloque de productos en lugar de un modelo por producto
+        historical_data = self._get_category_historical_data(category_id)
+        daily_predictions = self._predict_units_by_product(historical_data, days)
+        
+        agg_stats = historical_data.groupby('product_id', sort=False).agg(
+            sum_units=('units', 'sum'),
+            sum_rev=('revenue', 'sum')
+        )
+        
         category_predictions = []
         total_predicted_units = 0
         total_predicted_revenue = 0
         
         for product in products:
-            try:
-                pred = self.predict_product_sales(
-                    product_id=product.id,
-                    days=days,
-                    include_confidence=False
-                )
-                
-                if 'error' not in pred:
-                    category_predictions.append({
-                        'product_id': product.id,
-                        'product_name': product.name,
-                        'predicted_units': pred['summary']['total_predicted_units'],
-                        'predicted_revenue': pred['summary']['total_predicted_revenue'],
-                        'current_stock': product.stock
-                    })
-                    total_predicted_units += pred['summary']['total_predicted_units']
-                    total_predicted_revenue += pred['summary']['total_predicted_revenue']
-            except Exception:
+            predicted_units = daily_predictions.get(product.id)
+            if predicted_units is None:
                 continue
+            
+            stats = agg_stats.loc[product.id]
+            avg_price = stats['sum_rev'] / max(stats['sum_units'], 1)
+            
+            units = round(float(np.round(predicted_units, 2).sum()), 2)
+            revenue = round(float(np.round(predicted_units * avg_price, 2).sum()), 2)
+            
+            category_predictions.append({
+                'product_id': product.id,
+                'product_name': product.name,
+                'predicted_units': units,
+                'predicted_revenue': revenue,
+                'current_stock': product.stock
+            })
+            total_predicted_units += units
+            total_predicted_revenue += revenue
         
         # Ordenar por unidades predichas
         category_predictions.sort(key=lambda x: x['predicted_units'], reverse=True)
@@ -278,23 +307,9 @@ class ProductSalesPredictor:
         Returns:
             Ranking de productos con mejores predicciones
         """
-        # Obtener productos con ventas recientes
-        since_date = timezone.now() - timedelta(days=60)
-        
-        query = Product.objects.filter(
-            order_items__order__status='COMPLETED',
-            order_items__order__created_at__gte=since_date,
-            stock__gt=0
-        )
-        
-        if category_id:
-            query = query.filter(category_id=category_id)
-        
-        products = query.distinct()[:50]  # Limitar a top 50 para no sobrecargar
-        
         rankings = []
         
-        for product in products:
+        for product in self._get_forecast_candidates(category_id):
             try:
                 pred = self.predict_product_sales(
                     product_id=product.id,
@@ -303,28 +318,60 @@ class ProductSalesPredictor:
                 )
                 
                 if 'error' not in pred:
-                    rankings.append({
-                        'rank': 0,  # Se asignará después
-                        'product_id': product.id,
-                        'product_name': product.name,
-                        'category': pred['product']['category'],
-                        # Cambiar nombre: predicted_units → predicted_sales
-                        'predicted_sales': pred['summary']['total_predicted_units'],
-                        'predicted_revenue': pred['summary']['total_predicted_revenue'],
-                        # Agregar campos nuevos
-                        'predicted_daily_sales': pred['summary']['average_daily_units'],
-                        'growth_rate': pred['summary']['growth_vs_historical']['units_growth_percent'],
-                        'days_until_stockout': pred['stock_alert']['days_until_stockout'],
-                        'restock_recommendation': pred['stock_alert']['restock_recommended'],
-                        # Campos existentes
-                        'trend': pred['trend']['trend_direction'],
-                        'current_stock': product.stock,
-                        # Agregar stock_status
-                        'stock_status': pred['stock_alert']['alert_level']
-                    })
+                    rankings.append(self._build_ranking_entry(product, pred))
             except Exception:
                 continue
         
+        return self._build_top_products_response(rankings, days, limit, category_id)
+    
+    def _get_forecast_candidates(self, category_id: Optional[int] = None):
+        """Productos con ventas recientes y stock, candidatos a ranking."""
+        # Obtener productos con ventas recientes
+        since_date = timezone.now() - timedelta(days=60)
+        
+        query = Product.objects.filter(
+            order_items__order__status='COMPLETED',
+            order_items__order__created_at__gte=since_date,
+            stock__gt=0
+        )
+        
+        if category_id:
+            query = query.filter(category_id=category_id)
+        
+        query = query.select_related('category').only(*self.PRODUCT_FIELDS)
+        
+        return query.distinct()[:50]  # Limitar a top 50 para no sobrecargar
+    
+    def _build_ranking_entry(self, product: Product, pred: Dict[str, Any]) -> Dict[str, Any]:
+        """Convierte la predicción de un producto en una fila del ranking."""
+        return {
+            'rank': 0,  # Se asignará después
+            'product_id': product.id,
+            'product_name': product.name,
+            'category': pred['product']['category'],
+            # Cambiar nombre: predicted_units → predicted_sales
+            'predicted_sales': pred['summary']['total_predicted_units'],
+            'predicted_revenue': pred['summary']['total_predicted_revenue'],
+            # Agregar campos nuevos
+            'predicted_daily_sales': pred['summary']['average_daily_units'],
+            'growth_rate': pred['summary']['growth_vs_historical']['units_growth_percent'],
+            'days_until_stockout': pred['stock_alert']['days_until_stockout'],
+            'restock_recommendation': pred['stock_alert']['restock_recommended'],
+            # Campos existentes
+            'trend': pred['trend']['trend_direction'],
+            'current_stock': product.stock,
+            # Agregar stock_status
+            'stock_status': pred['stock_alert']['alert_level']
+        }
+    
+    def _build_top_products_response(
+        self,
+        rankings: List[Dict[str, Any]],
+        days: int,
+        limit: int,
+        category_id: Optional[int]
+    ) -> Dict[str, Any]:
+        """Ordena el ranking y arma la respuesta de get_top_products_forecast."""
         # Ordenar por unidades predichas (usar nueva clave)
         rankings.sort(key=lambda x: x['predicted_sales'], reverse=True)
         
@@ -374,6 +421,97 @@ class ProductSalesPredictor:
         
         return df
     
+    def _get_category_historical_data(self, category_id: int) -> pd.DataFrame:
+        """Obtiene datos históricos diarios de todos los productos de una categoría."""
+        since_date = timezone.now() - timedelta(days=90)
+        
+        daily_sales = OrderItem.objects.filter(
+            product__category_id=category_id,
+            order__status='COMPLETED',
+            order__created_at__gte=since_date
+        ).annotate(
+            day=TruncDate('order__created_at')
+        ).values('product_id', 'day').annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'))
+        ).order_by('product_id', 'day')
+        
+        if not daily_sales:
+            return pd.DataFrame(columns=['product_id', 'date', 'units', 'revenue'])
+        
+        df = pd.DataFrame(list(daily_sales))
+        df['date'] = pd.to_datetime(df['day'])
+        df['units'] = pd.to_numeric(df['units'], errors='coerce').fillna(0).astype(float)
+        df['revenue'] = pd.to_numeric(df['revenue'], errors='coerce').fillna(0).astype(float)
+        
+        # Rellenar días faltantes con 0 dentro del rango de cada producto
+        df = df.set_index('date').groupby('product_id', sort=False)[['units', 'revenue']].resample('D').sum().reset_index()
+        
+        return df
+    
+    def _predict_units_by_product(
+        self,
+        historical_data: pd.DataFrame,
+        days: int
+    ) -> Dict[int, np.ndarray]:
+        """
+        Predice unidades diarias para varios productos a la vez.
+        
+        Los productos con el mismo rango de fechas comparten la matriz de
+        diseño, así que se resuelve un único mínimos cuadrados con una
+        columna por producto (mismo modelo que _train_product_model).
+        
+        Returns:
+            Dict product_id -> array con las unidades predichas por día
+        """
+        if historical_data.empty:
+            return {}
+        
+        spans = historical_data.groupby('product_id', sort=False)['date'].agg(['min', 'max'])
+        units = historical_data.pivot(index='date', columns='product_id', values='units')
+        
+        daily_predictions = {}
+        
+        for (start_date, last_date), group in spans.groupby(['min', 'max'], sort=False):
+            train_dates = pd.date_range(start=start_date, end=last_date, freq='D')
+            if len(train_dates) < 7:  # Mínimo 7 días de datos
+                continue
+            
+            future_dates = pd.date_range(
+                start=last_date + timedelta(days=1),
+                periods=days,
+                freq='D'
+            )
+            
+            poly = PolynomialFeatures(degree=2, include_bias=False)
+            X_train = poly.fit_transform(self._date_features(train_dates, 0))
+            X_future = poly.transform(self._date_features(future_dates, len(train_dates)))
+            
+            # Columna de intercepto
+            X_train = np.column_stack([np.ones(len(X_train)), X_train])
+            X_future = np.column_stack([np.ones(len(X_future)), X_future])
+            
+            product_ids = group.index.tolist()
+            Y = units.loc[train_dates, product_ids].fillna(0).to_numpy()
+            
+            coefficients = np.linalg.lstsq(X_train, Y, rcond=None)[0]
+            predicted = np.maximum(X_future @ coefficients, 0)
+            
+            for column, product_id in enumerate(product_ids):
+                daily_predictions[product_id] = predicted[:, column]
+        
+        return daily_predictions
+    
+    @staticmethod
+    def _date_features(dates: pd.DatetimeIndex, offset: int) -> np.ndarray:
+        """Características temporales (días desde inicio, día de semana, fin de semana)."""
+        day_of_week = dates.dayofweek.to_numpy()
+        return np.column_stack([
+            np.arange(offset, offset + len(dates)),
+            day_of_week,
+            (day_of_week >= 5).astype(int)
+        ])
+    
     def _train_product_model(self, df: pd.DataFrame) -> tuple:
         """Entrena modelo para el producto."""
         # Crear características temporales
@@ -537,19 +675,49 @@ class ProductSalesPredictor:
         if len(periods) > 10:
             raise ValueError("Máximo 10 períodos permitidos")
         
-        forecasts = {}
-        
         for days in periods:
             if days < 1 or days > 365:
                 raise ValueError(f"Período {days} fuera de rango (1-365)")
-            
+        
+        # Todos los períodos comparten modelo y fecha de inicio: se entrena
+        # una vez por producto con el horizonte más largo y se recorta
+        max_days = max(periods)
+        product_forecasts = []
+        
+        for product in self._get_forecast_candidates(category_id):
             try:
-                forecast = self.get_top_products_forecast(
-                    days=days,
-                    limit=limit,
-                    category_id=category_id
+                historical_data = self._get_product_historical_data(product.id)
+                if len(historical_data) < 7:
+                    continue
+                
+                model, poly_features, metrics = self._train_product_model(historical_data)
+                predictions = self._generate_product_predictions(
+                    model, poly_features, historical_data, max_days
+                )
+                trend_analysis = self._analyze_product_trend(historical_data)
+                
+                product_forecasts.append(
+                    (product, predictions, historical_data, trend_analysis, metrics)
+                )
+            except Exception:
+                continue
+        
+        forecasts = {}
+        
+        for days in periods:
+            try:
+                rankings = [
+                    self._build_ranking_entry(
+                        product,
+                        self._build_product_forecast(
+                            product, predictions[:days], historical_data, trend_analysis, metrics
+                        )
+                    )
+                    for product, predictions, historical_data, trend_analysis, metrics in product_forecasts
+                ]
+                forecasts[f'{days}d'] = self._build_top_products_response(
+                    rankings, days, limit, category_id
                 )
-                forecasts[f'{days}d'] = forecast
             except Exception as e:
                 forecasts[f'{days}d'] = {
                     'error': str(e),
@@ -5,31 +5,131 @@ Implementa múltiples estrategias de recomendación.
 import numpy as np
 import pandas as pd
 from typing import List, Dict, Any, Optional
-from collections import defaultdict, Counter
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-from django.db.models import Count, Sum, Q, F, Avg
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.models import Count, Sum, Q, F, Avg, Max, Case, When, Value, CharField, IntegerField, DateTimeField, ExpressionWrapper, Window
+from django.db.models.functions import Now, RowNumber
 from django.utils import timezone
+from scipy.sparse import csr_matrix
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import StandardScaler
 
-from sales.models import Order, OrderItem
+from sales.models import Order, OrderItem, ProductRecentSales, ProductCoOccurrence
 from products.models import Product
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 
+def combine_scores(
+    ids: np.ndarray,
+    scores: np.ndarray,
+    weights: np.ndarray,
+    strategy_starts: np.ndarray,
+    purchased: np.ndarray,
+    n: int
+) -> tuple:
+    """
+    Combina los scores de varias estrategias por producto y retorna el top n.
+    
+    Función sin estado sobre arreglos de NumPy: los resultados de todas las
+    estrategias van concatenados en ids/scores y strategy_starts indica el
+    índice donde empieza cada estrategia.
+    
+    Args:
+        ids: IDs de producto (int64)
+        scores: Score de cada ID en su estrategia
+        weights: Peso de cada estrategia
+        strategy_starts: Índice inicial de cada estrategia en ids/scores
+        purchased: IDs a excluir
+        n: Número de productos a retornar
+        
+    Returns:
+        Tupla (ids, scores combinados) ordenada de mayor a menor score
+    """
+    if len(ids) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=float)
+    
+    # Peso de la estrategia a la que pertenece cada elemento
+    counts = np.diff(np.append(strategy_starts, len(ids)))
+    weighted = scores * np.repeat(weights, counts)
+    
+    product_ids, inverse = np.unique(ids, return_inverse=True)
+    combined = np.bincount(inverse, weights=weighted)
+    
+    # Excluir productos ya comprados
+    keep = ~np.isin(product_ids, purchased)
+    product_ids = product_ids[keep]
+    combined = combined[keep]
+    
+    # Top n sin ordenar todos los candidatos: O(M + n log n)
+    if n < len(combined):
+        top = np.argpartition(-combined, n)[:n]
+    else:
+        top = np.arange(len(combined))
+    top = top[np.argsort(-combined[top], kind='stable')]
+    
+    return product_ids[top], combined[top]
+
+
 class ProductRecommender:
     """
     Sistema de recomendaciones de productos que combina múltiples estrategias.
     """
     
+    # Cache de la matriz usuario-producto
+    MATRICES_CACHE_KEY = 'ml_recommender_matrices'
+    MATRICES_CACHE_TIMEOUT = 3600  # 1 hora
+    MATRICES_REFRESH_SECONDS = 300  # Cada cuánto verificar si hay ventas nuevas
+    TRENDING_CACHE_TIMEOUT = 300  # 5 minutos
+    # Antigüedad máxima de ProductRecentSales (refresh_recommendation_stats corre
+    # cada hora); si el refresco se detiene se vuelve al query en vivo
+    RECENT_SALES_MAX_AGE = timedelta(hours=2)
+    
+    # Ejecutar las estrategias independientes en hilos
+    PARALLEL_STRATEGIES = True
+    
+    # Campos de producto que se leen para armar las respuestas (sin instanciar modelos)
+    PRODUCT_FIELDS = ('id', 'name', 'price', 'stock', 'image', 'category_id', 'category__name')
+    
     def __init__(self):
         self.user_item_matrix = None
         self.product_similarity_matrix = None
+        self.user_index = {}
+        self.product_ids = np.array([], dtype=np.int64)
+        self.matrices_version = None
+        self.matrices_checked_at = None
         self.scaler = StandardScaler()
         
+    @classmethod
+    def _fresh_recent_sales(cls):
+        """
+        Filas de ProductRecentSales refrescadas dentro de RECENT_SALES_MAX_AGE
+        (la antigüedad se compara en el mismo query, sin consulta extra).
+        """
+        return ProductRecentSales.objects.filter(
+            refreshed_at__gte=ExpressionWrapper(
+                Now() - cls.RECENT_SALES_MAX_AGE,
+                output_field=DateTimeField()
+            )
+        )
+    
+    @staticmethod
+    def _recent_window_start(days: int = 30) -> ExpressionWrapper:
+        """
+        Inicio de la ventana de ventas recientes calculado en la base de datos
+        (NOW() - intervalo), así el query no lleva un timestamp distinto por llamada.
+        """
+        return ExpressionWrapper(
+            Now() - timedelta(days=days),
+            output_field=DateTimeField()
+        )
+    
     def get_recommendations_for_user(
         self, 
         user_id: int, 
@@ -47,29 +147,55 @@ class ProductRecommender:
         Returns:
             Dict con recomendaciones y metadatos
         """
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
+        if not User.objects.filter(id=user_id).exists():
             raise ValueError(f"Usuario {user_id} no encontrado")
         
-        # Obtener diferentes tipos de recomendaciones
-        collaborative = self._collaborative_filtering(user_id, n_recommendations)
-        content_based = self._content_based_filtering(user_id, n_recommendations)
-        trending = self._get_trending_products(n_recommendations)
-        frequently_bought_together = self._frequently_bought_together(user_id, n_recommendations)
-        
-        # Productos ya comprados por el usuario
-        purchased_products = set()
-        if exclude_purchased:
-            purchased_products = set(
-                OrderItem.objects.filter(
-                    order__customer_id=user_id,
-                    order__status='COMPLETED'
-                ).values_list('product_id', flat=True)
+        # Productos ya comprados por el usuario y sus categorías (compartido por
+        # todas las estrategias y por las razones de recomendación)
+        user_purchases = self._get_user_product_categories(user_id)
+        user_products = set(user_purchases)
+        user_category_ids = set(user_purchases.values())
+        
+        # Obtener diferentes tipos de recomendaciones (queries independientes en paralelo)
+        use_co_occurrence_table = getattr(settings, 'RECOMMENDATION_USE_CO_OCCURRENCE_TABLE', False)
+        collaborative, product_stats, co_occurrence = self._run_in_parallel(
+            lambda: self._collaborative_filtering(user_id, n_recommendations, user_products),
+            lambda: self._get_product_strategy_stats(
+                user_products,
+                n_recommendations,
+                include_co_occurrence=not use_co_occurrence_table
+            ),
+            lambda: (
+                self._co_occurrence_scores(user_products, n_recommendations)
+                if use_co_occurrence_table else None
             )
+        )
         
-        # Combinar recomendaciones con scores ponderados
-        combined_scores = defaultdict(float)
+        content_based = self._top_scores(
+            [
+                row for row in product_stats
+                if row['category_id'] in user_category_ids
+                and row['stock'] > 0
+                and row['id'] not in user_products
+            ],
+            'popularity', n_recommendations, default_score=0.5
+        )
+        trending = self._top_scores(
+            [row for row in product_stats if row['stock'] > 0 and row['recent_sales'] > 0],
+            'recent_sales', n_recommendations
+        )
+        if use_co_occurrence_table:
+            frequently_bought_together = co_occurrence
+        else:
+            frequently_bought_together = self._top_scores(
+                [
+                    row for row in product_stats
+                    if row['co_occurrence'] > 0 and row['id'] not in user_products
+                ],
+                'co_occurrence', n_recommendations
+            )
+        
+        purchased_products = user_products if exclude_purchased else set()
         
         # Pesos para cada estrategia
         weights = {
@@ -79,46 +205,46 @@ class ProductRecommender:
             'frequently_bought': 0.20
         }
         
-        for product_id, score in collaborative:
-            if product_id not in purchased_products:
-                combined_scores[product_id] += score * weights['collaborative']
-        
-        for product_id, score in content_based:
-            if product_id not in purchased_products:
-                combined_scores[product_id] += score * weights['content_based']
-        
-        for product_id, score in trending:
-            if product_id not in purchased_products:
-                combined_scores[product_id] += score * weights['trending']
-        
-        for product_id, score in frequently_bought_together:
-            if product_id not in purchased_products:
-                combined_scores[product_id] += score * weights['frequently_bought']
+        # Combinar recomendaciones con scores ponderados
+        sorted_recommendations = self._combine_scores(
+            [
+                (collaborative, weights['collaborative']),
+                (content_based, weights['content_based']),
+                (trending, weights['trending']),
+                (frequently_bought_together, weights['frequently_bought'])
+            ],
+            purchased_products,
+            n_recommendations
+        )
         
-        # Ordenar por score
-        sorted_recommendations = sorted(
-            combined_scores.items(), 
-            key=lambda x: x[1], 
-            reverse=True
-        )[:n_recommendations]
+        # Obtener detalles de productos en un solo query, con las ventas de los
+        # últimos 30 días para las razones de recomendación
+        sorted_ids = [product_id for product_id, _ in sorted_recommendations]
+        products = {
+            row['id']: row
+            for row in Product.objects.filter(id__in=sorted_ids).annotate(
+                recent_sales=Count(
+                    'order_items',
+                    filter=Q(
+                        order_items__order__status='COMPLETED',
+                        order_items__order__created_at__gte=self._recent_window_start()
+                    )
+                )
+            ).values(*self.PRODUCT_FIELDS, 'recent_sales')
+        }
+        recent_sales = {product_id: row['recent_sales'] for product_id, row in products.items()}
         
-        # Obtener detalles de productos
         recommended_products = []
         for product_id, score in sorted_recommendations:
-            try:
-                product = Product.objects.select_related('category').get(id=product_id)
-                recommended_products.append({
-                    'id': product.id,
-                    'name': product.name,
-                    'price': float(product.price),
-                    'category': product.category.name if product.category else None,
-                    'image': product.image.url if product.image else None,
-                    'stock': product.stock,
-                    'recommendation_score': round(score, 3),
-                    'reason': self._get_recommendation_reason(user_id, product_id)
-                })
-            except Product.DoesNotExist:
+            product = products.get(product_id)
+            if product is None:
                 continue
+            
+            recommended_products.append({
+                **self._product_to_dict(product),
+                'recommendation_score': round(score, 3),
+                'reason': self._get_recommendation_reason(product, user_category_ids, recent_sales)
+            })
         
         return {
             'user_id': user_id,
@@ -128,147 +254,396 @@ class ProductRecommender:
             'generated_at': timezone.now().isoformat()
         }
     
-    def _collaborative_filtering(self, user_id: int, n: int) -> List[tuple]:
+    def _run_in_parallel(self, *tasks) -> List[Any]:
         """
-        Filtrado colaborativo: recomendaciones basadas en usuarios similares.
-        "Usuarios que compraron como tú también compraron..."
+        Ejecuta funciones independientes (dominadas por latencia de BD) en hilos.
+        
+        Cada hilo usa su propia conexión y la cierra al terminar. Dentro de una
+        transacción se ejecutan en serie, porque otras conexiones no verían los
+        datos sin confirmar.
+        
+        Returns:
+            Lista con el resultado de cada función, en el mismo orden
         """
-        # Obtener productos que ha comprado este usuario
-        user_products = set(
+        if not self.PARALLEL_STRATEGIES or connection.in_atomic_block:
+            return [task() for task in tasks]
+        
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            futures = [executor.submit(self._run_with_own_connection, task) for task in tasks]
+            return [future.result() for future in futures]
+    
+    @staticmethod
+    def _run_with_own_connection(task):
+        """Ejecuta la función y cierra las conexiones de BD del hilo."""
+        try:
+            return task()
+        finally:
+            connections.close_all()
+    
+    def _combine_scores(
+        self,
+        strategy_results: List[tuple],
+        purchased_products: set,
+        n: int
+    ) -> List[tuple]:
+        """
+        Suma los scores ponderados de cada estrategia por producto y retorna el top n.
+        
+        Args:
+            strategy_results: Lista de (resultados [(product_id, score)], peso)
+            purchased_products: IDs a excluir
+            n: Número de productos a retornar
+            
+        Returns:
+            Lista de (product_id, score combinado) ordenada de mayor a menor
+        """
+        ids = np.array(
+            [product_id for results, _ in strategy_results for product_id, _ in results],
+            dtype=np.int64
+        )
+        scores = np.array(
+            [score for results, _ in strategy_results for _, score in results],
+            dtype=float
+        )
+        weights = np.array([weight for _, weight in strategy_results], dtype=float)
+        strategy_starts = np.cumsum([0] + [len(results) for results, _ in strategy_results[:-1]])
+        purchased = np.fromiter(purchased_products, dtype=np.int64)
+        
+        top_ids, top_scores = combine_scores(ids, scores, weights, strategy_starts, purchased, n)
+        return [(int(product_id), float(score)) for product_id, score in zip(top_ids, top_scores)]
+    
+    def _get_user_products(self, user_id: int) -> set:
+        """Obtiene los IDs de productos que ha comprado el usuario."""
+        return set(
             OrderItem.objects.filter(
                 order__customer_id=user_id,
                 order__status='COMPLETED'
             ).values_list('product_id', flat=True)
         )
+    
+    def _get_user_product_categories(self, user_id: int) -> Dict[int, int]:
+        """Productos que ha comprado el usuario -> categoría de cada uno."""
+        return dict(
+            OrderItem.objects.filter(
+                order__customer_id=user_id,
+                order__status='COMPLETED'
+            ).values_list('product_id', 'product__category_id').distinct()
+        )
+    
+    def _get_product_strategy_stats(
+        self,
+        user_products: set,
+        n: int,
+        include_co_occurrence: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Calcula en un solo query los conteos que usan las estrategias de
+        contenido, tendencia y comprados juntos.
+        
+        Solo se agregan los productos candidatos de alguna estrategia y el
+        ranking se hace en la base de datos: el resultado trae únicamente los
+        n mejores de cada estrategia.
+        
+        Args:
+            user_products: Productos comprados por el usuario
+            n: Número de productos por estrategia
+            include_co_occurrence: Si False, no calcula co_occurrence (se
+                usa ProductCoOccurrence) y la reporta como 0
+        
+        Returns:
+            Lista de dicts por producto con popularity (ventas completadas),
+            recent_sales (últimos 30 días) y co_occurrence (órdenes distintas
+            que lo contienen junto a productos del usuario)
+        """
+        since_date = self._recent_window_start()
+        completed = Q(order_items__order__status='COMPLETED')
+        
+        in_stock = Q(stock__gt=0)
+        not_purchased = ~Q(id__in=user_products)
+        user_categories = Product.objects.filter(id__in=user_products).values('category_id')
+        recently_sold = OrderItem.objects.filter(
+            order__status='COMPLETED',
+            order__created_at__gte=since_date
+        ).values('product_id')
+        
+        # Candidatos de cada estrategia (mismas condiciones que se aplican al elegir el top)
+        content_candidates = in_stock & Q(category_id__in=user_categories) & not_purchased
+        trending_candidates = in_stock & Q(id__in=recently_sold)
+        
+        annotations = {
+            'popularity': Count('order_items', filter=completed),
+            'recent_sales': Count(
+                'order_items',
+                filter=completed & Q(order_items__order__created_at__gte=since_date)
+            ),
+        }
+        ranks = {
+            'content_rank': self._rank_window(content_candidates, 'popularity'),
+            'trending_rank': self._rank_window(trending_candidates, 'recent_sales'),
+        }
+        candidates = content_candidates | trending_candidates
+        
+        if include_co_occurrence:
+            orders_with_user_products = Order.objects.filter(
+                status='COMPLETED',
+                items__product_id__in=user_products
+            )
+            co_ordered = OrderItem.objects.filter(
+                order__in=orders_with_user_products
+            ).values('product_id')
+            co_occurrence_candidates = Q(id__in=co_ordered) & not_purchased
+            
+            annotations['co_occurrence'] = Count(
+                'order_items__order',
+                filter=Q(order_items__order__in=orders_with_user_products),
+                distinct=True
+            )
+            ranks['co_occurrence_rank'] = self._rank_window(co_occurrence_candidates, 'co_occurrence')
+            candidates |= co_occurrence_candidates
+        else:
+            annotations['co_occurrence'] = Value(0, output_field=IntegerField())
+        
+        # Entre los n primeros de alguna estrategia
+        top_n = Q()
+        for rank in ranks:
+            top_n |= Q(**{f'{rank}__lte': n})
+        
+        return list(
+            Product.objects.filter(candidates).annotate(**annotations).annotate(**ranks).filter(
+                top_n
+            ).order_by('id').values(
+                'id', 'category_id', 'stock', 'popularity', 'recent_sales', 'co_occurrence'
+            )
+        )
+    
+    @staticmethod
+    def _rank_window(candidates: Q, score: str) -> Window:
+        """
+        Posición (1, 2, ...) de cada producto por `score` descendente entre los
+        candidatos de una estrategia; los que no son candidatos quedan al final.
+        """
+        return Window(
+            expression=RowNumber(),
+            order_by=[
+                Case(When(candidates, then=Value(0)), default=Value(1)).asc(),
+                F(score).desc(),
+                F('id').asc(),
+            ]
+        )
+    
+    def _top_scores(
+        self,
+        rows: List[Dict[str, Any]],
+        key: str,
+        n: int,
+        default_score: float = 0.0
+    ) -> List[tuple]:
+        """Top n filas por `key`, con score normalizado entre 0 y 1."""
+        top = sorted(rows, key=lambda row: row[key], reverse=True)[:n]
+        
+        max_value = top[0][key] if top else 1
+        
+        return [
+            (row['id'], row[key] / max_value if max_value > 0 else default_score)
+            for row in top
+        ]
+    
+    def _collaborative_filtering(
+        self,
+        user_id: int,
+        n: int,
+        user_products: Optional[set] = None
+    ) -> List[tuple]:
+        """
+        Filtrado colaborativo: recomendaciones basadas en usuarios similares.
+        "Usuarios que compraron como tú también compraron..."
+        """
+        # Obtener productos que ha comprado este usuario
+        if user_products is None:
+            user_products = self._get_user_products(user_id)
         
         if not user_products:
             return []
         
-        # Encontrar usuarios que compraron productos similares
-        similar_users = OrderItem.objects.filter(
-            order__status='COMPLETED',
-            product_id__in=user_products
-        ).exclude(
-            order__customer_id=user_id
-        ).values('order__customer_id').annotate(
-            common_products=Count('product_id', distinct=True)
-        ).order_by('-common_products')[:20]
+        matrix, user_index, product_ids = self.build_matrices()
         
-        similar_user_ids = [u['order__customer_id'] for u in similar_users]
+        row = user_index.get(user_id)
+        if row is None:
+            return []
         
-        # Obtener productos que compraron esos usuarios similares
-        recommended_products = OrderItem.objects.filter(
-            order__customer_id__in=similar_user_ids,
-            order__status='COMPLETED'
-        ).exclude(
-            product_id__in=user_products
-        ).values('product_id').annotate(
-            purchase_count=Count('id'),
-            total_revenue=Sum(F('price') * F('quantity'))
-        ).order_by('-purchase_count')[:n]
+        # Similitud coseno del usuario contra todos los demás
+        similarities = cosine_similarity(matrix[row], matrix).ravel()
+        similarities[row] = 0
+        
+        # Top 20 vecinos más similares
+        k = min(20, int(np.count_nonzero(similarities > 0)))
+        if k == 0:
+            return []
+        neighbors = np.argpartition(-similarities, k - 1)[:k]
+        
+        # Score de cada producto: suma de compras de los vecinos ponderada por similitud
+        scores = matrix[neighbors].T @ similarities[neighbors]
+        scores[matrix[row].indices] = 0  # Excluir lo que el usuario ya compró
+        
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) == 0:
+            return []
+        top = candidates[np.argsort(-scores[candidates], kind='stable')[:n]]
         
         # Normalizar scores entre 0 y 1
-        max_count = recommended_products[0]['purchase_count'] if recommended_products else 1
+        max_score = scores[top[0]]
         
         return [
-            (item['product_id'], item['purchase_count'] / max_count)
-            for item in recommended_products
+            (int(product_ids[col]), float(scores[col] / max_score))
+            for col in top
         ]
     
-    def _content_based_filtering(self, user_id: int, n: int) -> List[tuple]:
-        """
-        Filtrado basado en contenido: productos similares a los que ha comprado.
-        "Basado en tus compras anteriores..."
+    def build_matrices(self, force: bool = False) -> tuple:
         """
-        # Obtener categorías que ha comprado el usuario
-        user_categories = OrderItem.objects.filter(
-            order__customer_id=user_id,
-            order__status='COMPLETED'
-        ).values_list('product__category_id', flat=True).distinct()
+        Obtiene la matriz usuario-producto.
         
-        if not user_categories:
-            return []
+        La matriz se guarda en memoria y en el cache de Django, versionada
+        por la última orden completada. Solo se reconstruye cuando hay ventas
+        nuevas (verificado como máximo cada MATRICES_REFRESH_SECONDS).
         
-        # Obtener productos comprados
-        purchased_products = set(
+        Args:
+            force: Si True, reconstruye sin consultar el cache
+            
+        Returns:
+            Tupla (matriz CSR, dict user_id -> fila, array columna -> product_id)
+        """
+        now = timezone.now()
+        if (
+            not force
+            and self.user_item_matrix is not None
+            and self.matrices_checked_at is not None
+            and (now - self.matrices_checked_at).total_seconds() < self.MATRICES_REFRESH_SECONDS
+        ):
+            return self.user_item_matrix, self.user_index, self.product_ids
+        
+        version = self._get_matrices_version()
+        self.matrices_checked_at = now
+        
+        if not force and version == self.matrices_version:
+            return self.user_item_matrix, self.user_index, self.product_ids
+        
+        cached = None if force else cache.get(self.MATRICES_CACHE_KEY)
+        if cached and cached['version'] == version:
+            matrices = cached
+        else:
+            matrix, user_index, product_ids = self._build_user_item_matrix()
+            matrices = {
+                'version': version,
+                'user_item_matrix': matrix,
+                'user_index': user_index,
+                'product_ids': product_ids,
+            }
+            cache.set(self.MATRICES_CACHE_KEY, matrices, self.MATRICES_CACHE_TIMEOUT)
+        
+        self.user_item_matrix = matrices['user_item_matrix']
+        self.user_index = matrices['user_index']
+        self.product_ids = matrices['product_ids']
+        self.matrices_version = version
+        
+        return self.user_item_matrix, self.user_index, self.product_ids
+    
+    def _get_matrices_version(self) -> str:
+        """Checksum de las órdenes completadas (cambia cuando hay ventas nuevas)."""
+        stats = Order.objects.filter(status='COMPLETED').aggregate(
+            last_update=Max('updated_at'),
+            total=Count('id')
+        )
+        last_update = stats['last_update'].isoformat() if stats['last_update'] else ''
+        return f"{stats['total']}:{last_update}"
+    
+    def _build_user_item_matrix(self) -> tuple:
+        """
+        Construye la matriz dispersa usuario-producto (CSR) de compras completadas.
+        
+        Returns:
+            Tupla (matriz, dict user_id -> fila, array columna -> product_id)
+        """
+        rows = np.array(
             OrderItem.objects.filter(
-                order__customer_id=user_id,
                 order__status='COMPLETED'
-            ).values_list('product_id', flat=True)
-        )
+            ).values_list('order__customer_id', 'product_id', 'quantity'),
+            dtype=np.int64
+        ).reshape(-1, 3)
         
-        # Encontrar productos de las mismas categorías
-        similar_products = Product.objects.filter(
-            category_id__in=user_categories,
-            stock__gt=0
-        ).exclude(
-            id__in=purchased_products
-        ).annotate(
-            popularity=Count('order_items', filter=Q(order_items__order__status='COMPLETED'))
-        ).order_by('-popularity')[:n]
+        user_ids, user_rows = np.unique(rows[:, 0], return_inverse=True)
+        product_ids, product_cols = np.unique(rows[:, 1], return_inverse=True)
         
-        # Normalizar scores
-        max_popularity = similar_products[0].popularity if similar_products else 1
+        matrix = csr_matrix(
+            (rows[:, 2].astype(float), (user_rows, product_cols)),
+            shape=(len(user_ids), len(product_ids))
+        )
+        matrix.sum_duplicates()
+        matrix.data = np.log1p(matrix.data)  # Escala logarítmica de cantidades
         
-        return [
-            (product.id, product.popularity / max_popularity if max_popularity > 0 else 0.5)
-            for product in similar_products
-        ]
+        user_index = {int(user_id): i for i, user_id in enumerate(user_ids)}
+        
+        return matrix, user_index, product_ids
     
     def _get_trending_products(self, n: int) -> List[tuple]:
         """
         Productos en tendencia (más vendidos recientemente).
         """
-        # Últimos 30 días
-        since_date = timezone.now() - timedelta(days=30)
-        
-        trending = Product.objects.filter(
-            stock__gt=0,
-            order_items__order__status='COMPLETED',
-            order_items__order__created_at__gte=since_date
-        ).annotate(
-            recent_sales=Count('order_items'),
-            recent_revenue=Sum(F('order_items__price') * F('order_items__quantity'))
-        ).order_by('-recent_sales')[:n]
+        # Tabla desnormalizada (refresh_recommendation_stats) si está al día
+        trending = list(
+            self._fresh_recent_sales().filter(
+                product__stock__gt=0,
+                recent_sales__gt=0
+            ).order_by('-recent_sales').values_list('product_id', 'recent_sales')[:n]
+        )
+        if not trending:
+            # Últimos 30 días
+            since_date = self._recent_window_start()
+            
+            trending = list(
+                Product.objects.filter(
+                    stock__gt=0,
+                    order_items__order__status='COMPLETED',
+                    order_items__order__created_at__gte=since_date
+                ).annotate(
+                    recent_sales=Count('order_items')
+                ).order_by('-recent_sales').values_list('id', 'recent_sales')[:n]
+            )
         
         # Normalizar
-        max_sales = trending[0].recent_sales if trending else 1
+        max_sales = trending[0][1] if trending else 1
         
         return [
-            (product.id, product.recent_sales / max_sales)
-            for product in trending
+            (product_id, recent_sales / max_sales)
+            for product_id, recent_sales in trending
         ]
     
-    def _frequently_bought_together(self, user_id: int, n: int) -> List[tuple]:
+    def _co_occurrence_scores(self, user_products: set, n: int) -> List[tuple]:
         """
-        Productos frecuentemente comprados juntos.
-        "Los clientes que compraron X también compraron Y"
+        Productos comprados junto a los del usuario, con candidatos tomados de
+        ProductCoOccurrence.
+        
+        Los conteos por par no se pueden sumar (una orden con dos productos del
+        usuario contaría dos veces), así que el score es el mismo que en el
+        query en vivo: órdenes completadas distintas que contienen el candidato
+        y algún producto del usuario.
         """
-        # Obtener productos que ha comprado este usuario
-        user_products = list(
-            OrderItem.objects.filter(
-                order__customer_id=user_id,
-                order__status='COMPLETED'
-            ).values_list('product_id', flat=True).distinct()
-        )
+        pairs = ProductCoOccurrence.objects.filter(
+            Q(product_a_id__in=user_products) | Q(product_b_id__in=user_products)
+        ).values_list('product_a_id', 'product_b_id')
         
-        if not user_products:
+        candidate_ids = {product_id for pair in pairs for product_id in pair} - user_products
+        if not candidate_ids:
             return []
         
-        # Encontrar órdenes que contienen esos productos
-        orders_with_user_products = Order.objects.filter(
-            status='COMPLETED',
-            items__product_id__in=user_products
-        ).distinct()
-        
-        # Contar qué otros productos aparecen en esas órdenes
-        related_products = OrderItem.objects.filter(
-            order__in=orders_with_user_products
-        ).exclude(
-            product_id__in=user_products
-        ).values('product_id').annotate(
-            co_occurrence=Count('id')
-        ).order_by('-co_occurrence')[:n]
+        related_products = list(
+            OrderItem.objects.filter(
+                product_id__in=candidate_ids,
+                order__status='COMPLETED',
+                order__items__product_id__in=user_products
+            ).values('product_id').annotate(
+                co_occurrence=Count('order', distinct=True)
+            ).order_by('-co_occurrence', 'product_id')[:n]
+        )
         
         # Normalizar
         max_occurrence = related_products[0]['co_occurrence'] if related_products else 1
@@ -278,38 +653,29 @@ class ProductRecommender:
             for item in related_products
         ]
     
-    def _get_recommendation_reason(self, user_id: int, product_id: int) -> str:
+    def _get_recommendation_reason(
+        self,
+        product: Dict[str, Any],
+        user_category_ids: set,
+        recent_sales: Dict[int, int]
+    ) -> str:
         """
         Genera una explicación de por qué se recomienda este producto.
+        
+        Args:
+            product: Fila del producto recomendado (ver PRODUCT_FIELDS)
+            user_category_ids: Categorías que el usuario ya compró
+            recent_sales: Ventas de los últimos 30 días por product_id
         """
-        try:
-            product = Product.objects.select_related('category').get(id=product_id)
-            
-            # Verificar si el usuario compró de la misma categoría
-            user_has_category = OrderItem.objects.filter(
-                order__customer_id=user_id,
-                order__status='COMPLETED',
-                product__category=product.category
-            ).exists()
-            
-            if user_has_category:
-                return f"Basado en tus compras de {product.category.name}"
-            
-            # Verificar si es trending
-            since_date = timezone.now() - timedelta(days=30)
-            recent_sales = OrderItem.objects.filter(
-                product_id=product_id,
-                order__status='COMPLETED',
-                order__created_at__gte=since_date
-            ).count()
-            
-            if recent_sales > 10:
-                return "Producto popular este mes"
-            
-            return "Recomendado para ti"
-            
-        except Product.DoesNotExist:
-            return "Recomendación personalizada"
+        # Verificar si el usuario compró de la misma categoría
+        if product['category_id'] in user_category_ids:
+            return f"Basado en tus compras de {product['category__name']}"
+        
+        # Verificar si es trending
+        if recent_sales.get(product['id'], 0) > 10:
+            return "Producto popular este mes"
+        
+        return "Recomendado para ti"
     
     def get_similar_products(self, product_id: int, n: int = 6) -> List[Dict[str, Any]]:
         """
@@ -324,21 +690,11 @@ class ProductRecommender:
             Lista de productos similares
         """
         try:
-            product = Product.objects.select_related('category').get(id=product_id)
+            product = Product.objects.only('id', 'category_id').get(id=product_id)
         except Product.DoesNotExist:
             raise ValueError(f"Producto {product_id} no encontrado")
         
-        # Estrategia 1: Misma categoría
-        similar_by_category = Product.objects.filter(
-            category=product.category,
-            stock__gt=0
-        ).exclude(
-            id=product_id
-        ).annotate(
-            popularity=Count('order_items', filter=Q(order_items__order__status='COMPLETED'))
-        ).order_by('-popularity')[:n]
-        
-        # Estrategia 2: Productos comprados juntos
+        # Estrategia 1: Productos comprados juntos
         bought_together = OrderItem.objects.filter(
             order__items__product_id=product_id,
             order__status='COMPLETED'
@@ -350,31 +706,46 @@ class ProductRecommender:
         
         bought_together_ids = [item['product_id'] for item in bought_together]
         
-        # Combinar resultados
-        similar_products_ids = list(similar_by_category.values_list('id', flat=True))
-        similar_products_ids.extend([pid for pid in bought_together_ids if pid not in similar_products_ids])
-        
-        # Limitar a n productos
-        similar_products_ids = similar_products_ids[:n]
+        # La razón se etiqueta en la base de datos
+        reason = Case(
+            When(id__in=bought_together_ids, then=Value('Frecuentemente comprados juntos')),
+            default=Value('De la misma categoría'),
+            output_field=CharField()
+        )
         
-        # Obtener detalles
-        products = Product.objects.filter(
-            id__in=similar_products_ids
-        ).select_related('category')
+        # Estrategia 2: Misma categoría (ya con categoría cargada para el resultado)
+        similar_products = list(
+            Product.objects.filter(
+                category_id=product.category_id,
+                stock__gt=0
+            ).exclude(
+                id=product_id
+            ).annotate(
+                popularity=Count('order_items', filter=Q(order_items__order__status='COMPLETED')),
+                reason=reason
+            ).order_by('-popularity').values(*self.PRODUCT_FIELDS, 'reason')[:n]
+        )
         
-        result = []
-        for p in products:
-            result.append({
-                'id': p.id,
-                'name': p.name,
-                'price': float(p.price),
-                'category': p.category.name if p.category else None,
-                'image': p.image.url if p.image else None,
-                'stock': p.stock,
-                'reason': 'Frecuentemente comprados juntos' if p.id in bought_together_ids else 'De la misma categoría'
-            })
+        # Completar hasta n con productos comprados juntos de otras categorías
+        similar_products_ids = {p['id'] for p in similar_products}
+        missing_ids = [pid for pid in bought_together_ids if pid not in similar_products_ids]
+        missing_ids = missing_ids[:n - len(similar_products)]
+        
+        if missing_ids:
+            extra_products = {
+                row['id']: row
+                for row in Product.objects.filter(
+                    id__in=missing_ids
+                ).annotate(reason=reason).values(*self.PRODUCT_FIELDS, 'reason')
+            }
+            similar_products.extend(
+                extra_products[pid] for pid in missing_ids if pid in extra_products
+            )
         
-        return result
+        return [
+            {**self._product_to_dict(p), 'reason': p['reason']}
+            for p in similar_products
+        ]
     
     def get_trending_in_category(self, category_id: int, n: int = 10) -> List[Dict[str, Any]]:
         """
@@ -387,32 +758,77 @@ class ProductRecommender:
         Returns:
             Lista de productos en tendencia
         """
-        since_date = timezone.now() - timedelta(days=30)
-        
-        trending = Product.objects.filter(
-            category_id=category_id,
-            stock__gt=0,
-            order_items__order__status='COMPLETED',
-            order_items__order__created_at__gte=since_date
-        ).annotate(
-            recent_sales=Count('order_items'),
-            recent_revenue=Sum(F('order_items__price') * F('order_items__quantity'))
-        ).order_by('-recent_sales')[:n]
+        return cache.get_or_set(
+            f'ml_recommender:trending_cat_{category_id}:n_{n}',
+            lambda: self._query_trending_in_category(category_id, n),
+            self.TRENDING_CACHE_TIMEOUT
+        )
+    
+    def _query_trending_in_category(self, category_id: int, n: int) -> List[Dict[str, Any]]:
+        """Consulta los productos en tendencia de una categoría (sin cache)."""
+        # Tabla desnormalizada (refresh_recommendation_stats) si está al día
+        trending = list(
+            self._fresh_recent_sales().filter(
+                product__category_id=category_id,
+                product__stock__gt=0,
+                recent_sales__gt=0
+            ).order_by('-recent_sales').values(
+                'recent_sales',
+                'recent_revenue',
+                id=F('product_id'),
+                name=F('product__name'),
+                price=F('product__price'),
+                image=F('product__image'),
+                stock=F('product__stock')
+            )[:n]
+        )
+        if not trending:
+            since_date = self._recent_window_start()
+            
+            trending = Product.objects.filter(
+                category_id=category_id,
+                stock__gt=0,
+                order_items__order__status='COMPLETED',
+                order_items__order__created_at__gte=since_date
+            ).annotate(
+                recent_sales=Count('order_items'),
+                recent_revenue=Sum(F('order_items__price') * F('order_items__quantity'))
+            ).order_by('-recent_sales').values(
+                'id', 'name', 'price', 'image', 'stock', 'recent_sales', 'recent_revenue'
+            )[:n]
         
         result = []
         for product in trending:
             result.append({
-                'id': product.id,
-                'name': product.name,
-                'price': float(product.price),
-                'image': product.image.url if product.image else None,
-                'stock': product.stock,
-                'recent_sales': product.recent_sales,
-                'recent_revenue': float(product.recent_revenue or 0),
-                'trend_score': product.recent_sales  # Simplificado
+                'id': product['id'],
+                'name': product['name'],
+                'price': float(product['price']),
+                'image': self._image_url(product['image']),
+                'stock': product['stock'],
+                'recent_sales': product['recent_sales'],
+                'recent_revenue': float(product['recent_revenue'] or 0),
+                'trend_score': product['recent_sales']  # Simplificado
             })
         
         return result
+    
+    def _product_to_dict(self, product: Dict[str, Any]) -> Dict[str, Any]:
+        """Convierte una fila de PRODUCT_FIELDS al formato de respuesta."""
+        return {
+            'id': product['id'],
+            'name': product['name'],
+            'price': float(product['price']),
+            'category': product['category__name'],
+            'image': self._image_url(product['image']),
+            'stock': product['stock']
+        }
+    
+    @staticmethod
+    def _image_url(image_name: Optional[str]) -> Optional[str]:
+        """URL pública de la imagen a partir del nombre guardado en la base de datos."""
+        if not image_name:
+            return None
+        return Product._meta.get_field('image').storage.url(image_name)
 
 
 # Instancia singleton del recomendador
@@ -1,9 +1,12 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from products.models import Product
 
 # Importar modelos de auditoría
 from .models_audit import AuditLog, UserSession
+from .models_recommendations import ProductRecentSales, ProductCoOccurrence
 
 
 class PaymentMethod(models.Model):
@@ -38,6 +41,18 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'customer', '-created_at'], name='ix_order_status_cust_dt'),
+            models.Index(
+                fields=['-created_at'],
+                name='ix_order_completed_recent',
+                condition=models.Q(status='COMPLETED')
+            ),
+            # Filtros de reportes: estado + rango de fechas (reports_core usa
+            # created_at y ReportGenerator updated_at)
+            models.Index(fields=['status', 'created_at'], name='ix_order_status_created'),
+            models.Index(fields=['status', 'updated_at'], name='ix_order_status_updated'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.customer.username} - {self.status}"
@@ -49,5 +64,24 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2) # Precio al momento de la compra
 
+    class Meta:
+        indexes = [
+            # Órdenes de un producto (recomendaciones) y productos de una
+            # orden (self-join de co-ocurrencia): el orden de columnas importa
+            models.Index(fields=['product', 'order'], name='idx_orderitem_product_order'),
+            models.Index(fields=['order', 'product'], name='ix_oi_order_prod'),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} of {self.product.name}"
\ No newline at end of file
+        return f"{self.quantity} of {self.product.name}"
+
+
+# Las métricas del dashboard (reports_core) se cachean por periodo: se
+# invalidan con cada orden guardada o eliminada. El estado ya guardado no
+# alcanza (COMPLETED -> CANCELLED también cambia las métricas) y la
+# invalidación es un solo cache.set
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_report_metrics(sender, instance, **kwargs):
+    from .reports_core import invalidar_cache_metricas
+    invalidar_cache_metricas()
@@ -2,6 +2,9 @@
 Modelos para el sistema de alertas automáticas de comandos de voz
 """
 
+from datetime import timedelta
+
+from dateutil.relativedelta import relativedelta
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
@@ -10,6 +13,55 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+class VoiceCommandAlertQuerySet(models.QuerySet):
+    """
+    QuerySet con los accesos que usa el scheduler de alertas
+    """
+
+    def for_scheduler(self):
+        """
+        Alertas activas con el usuario cargado (para notificar sin queries extra)
+        """
+        return self.filter(active=True).select_related('user')
+
+    def condition_context(self) -> dict:
+        """
+        Calcula una sola vez las métricas que usan las condiciones de umbral,
+        para evaluar muchas alertas sin consultar la BD por cada una.
+
+        Returns:
+            dict: {'min_stock': int | None, 'sales_drop_percent': float}
+        """
+        from django.db.models import Min, Sum, F, Q
+        from products.models import Product
+        from sales.models import OrderItem
+
+        now = timezone.now()
+        current_start = now - timedelta(days=7)
+        previous_start = now - timedelta(days=14)
+
+        # Stock bajo: hay algún producto con stock <= umbral si el mínimo lo está
+        min_stock = Product.objects.aggregate(min_stock=Min('stock'))['min_stock']
+
+        # Ventas: últimos 7 días vs los 7 anteriores
+        revenue = F('price') * F('quantity')
+        sales = OrderItem.objects.filter(
+            order__status='COMPLETED',
+            order__created_at__gte=previous_start
+        ).aggregate(
+            current=Sum(revenue, filter=Q(order__created_at__gte=current_start)),
+            previous=Sum(revenue, filter=Q(order__created_at__lt=current_start))
+        )
+        current = float(sales['current'] or 0)
+        previous = float(sales['previous'] or 0)
+        sales_drop_percent = ((previous - current) / previous * 100) if previous > 0 else 0.0
+
+        return {
+            'min_stock': min_stock,
+            'sales_drop_percent': sales_drop_percent,
+        }
+
+
 class VoiceCommandAlert(models.Model):
     """
     Almacena alertas/programaciones de comandos de voz
@@ -94,6 +146,8 @@ class VoiceCommandAlert(models.Model):
         help_text="Email destino (usa el del usuario si está vacío)"
     )
 
+    objects = VoiceCommandAlertQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Alerta de Comando de Voz'
@@ -102,10 +156,15 @@ class VoiceCommandAlert(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.description or self.command[:50]}"
 
-    def should_trigger(self) -> bool:
+    def should_trigger(self, context: dict = None) -> bool:
         """
         Determina si la alerta debe ejecutarse ahora
 
+        Args:
+            context: Métricas precalculadas con
+                VoiceCommandAlert.objects.condition_context() (opcional);
+                el scheduler lo calcula una vez para todas las alertas
+
         Returns:
             bool: True si debe ejecutarse
         """
@@ -125,7 +184,7 @@ class VoiceCommandAlert(models.Model):
 
         # TIPO 2: Alertas por umbral (threshold)
         elif self.alert_type == 'threshold':
-            return self._check_threshold_condition()
+            return self._check_threshold_condition(context)
 
         # TIPO 3: Alertas por condición (condition)
         elif self.alert_type == 'condition':
@@ -133,10 +192,13 @@ class VoiceCommandAlert(models.Model):
 
         return False
 
-    def _check_threshold_condition(self) -> bool:
+    def _check_threshold_condition(self, context: dict = None) -> bool:
         """
         Verifica si se cumple la condición de umbral
 
+        Args:
+            context: Métricas precalculadas (ver condition_context)
+
         Returns:
             bool: True si se cumple
         """
@@ -144,25 +206,23 @@ class VoiceCommandAlert(models.Model):
             return False
 
         condition_type = self.conditions.get('type')
+        if condition_type not in ('stock_low', 'sales_drop'):
+            return False
+
+        if context is None:
+            context = VoiceCommandAlert.objects.condition_context()
 
         # Stock bajo
         if condition_type == 'stock_low':
             threshold = self.conditions.get('threshold', 10)
-            # Aquí se haría la consulta real a la BD
-            # from sales.models import Product
-            # low_stock_count = Product.objects.filter(stock__lte=threshold).count()
-            # return low_stock_count > 0
             logger.info(f"Verificando stock bajo (umbral: {threshold})")
-            return False  # Placeholder
+            min_stock = context['min_stock']
+            return min_stock is not None and min_stock <= threshold
 
         # Ventas caen X%
-        elif condition_type == 'sales_drop':
-            percentage = self.conditions.get('percentage', 20)
-            # Aquí se compararía con período anterior
-            logger.info(f"Verificando caída de ventas (>{percentage}%)")
-            return False  # Placeholder
-
-        return False
+        percentage = self.conditions.get('percentage', 20)
+        logger.info(f"Verificando caída de ventas (>{percentage}%)")
+        return context['sales_drop_percent'] >= percentage
 
     def _check_condition(self) -> bool:
         """
@@ -197,7 +257,6 @@ class VoiceCommandAlert(models.Model):
 
             # Si ya pasó hoy, programar para mañana
             if next_trigger <= now:
-                from datetime import timedelta
                 next_trigger += timedelta(days=1)
 
             self.next_trigger = next_trigger
@@ -209,7 +268,6 @@ class VoiceCommandAlert(models.Model):
             minute = self.schedule.get('minute', 0)
 
             # Calcular próximo día de la semana
-            from datetime import timedelta
             days_ahead = day_of_week - now.weekday()
             if days_ahead <= 0:  # Ya pasó esta semana
                 days_ahead += 7
@@ -225,26 +283,14 @@ class VoiceCommandAlert(models.Model):
             hour = self.schedule.get('hour', 9)
             minute = self.schedule.get('minute', 0)
 
-            # Próximo mes, mismo día
-            if now.day < day_of_month:
-                # Este mes
-                next_trigger = now.replace(day=day_of_month, hour=hour, minute=minute, second=0, microsecond=0)
-            else:
-                # Mes siguiente
-                from datetime import timedelta
-                import calendar
-
-                # Ir al primer día del próximo mes
-                if now.month == 12:
-                    next_month = now.replace(year=now.year + 1, month=1, day=1)
-                else:
-                    next_month = now.replace(month=now.month + 1, day=1)
-
-                # Ajustar día (por si el mes no tiene ese día)
-                max_day = calendar.monthrange(next_month.year, next_month.month)[1]
-                day = min(day_of_month, max_day)
-
-                next_trigger = next_month.replace(day=day, hour=hour, minute=minute, second=0, microsecond=0)
+            # Este mes si el día aún no llega, si no el mes siguiente.
+            # relativedelta(day=N) ajusta al último día si el mes no tiene ese día.
+            target = relativedelta(day=day_of_month, hour=hour, minute=minute, second=0, microsecond=0)
+            months_ahead = 0 if now.day < day_of_month else 1
+
+            next_trigger = now + relativedelta(months=months_ahead) + target
+            if next_trigger <= now:
+                next_trigger = now + relativedelta(months=months_ahead + 1) + target
 
             self.next_trigger = next_trigger
 
@@ -4,10 +4,45 @@ Sistema de Auditoría y Bitácora
 Registra TODAS las acciones de los usuarios con timestamp, IP, y detalles completos.
 """
 
-from django.db import models
+from django.conf import settings
+from django.db import models, connection, connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models.functions import Now
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import UploadedFile
 from django.utils import timezone
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional
+import atexit
+import hashlib
+import io
 import json
+import queue
+import random
+import threading
+import time
+
+try:
+    import orjson  # Serialización JSON más rápida (opcional)
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# Campos del body que nunca se guardan en la bitácora
+_SENSITIVE_FIELDS = frozenset({'password', 'token', 'secret', 'api_key', 'card_number'})
+
+# Bytes de la respuesta de error que se guardan como texto
+ERROR_MESSAGE_HEAD_BYTES = 1024
+
+# Escritura asíncrona de la bitácora: los registros se encolan en la petición
+# y un hilo de fondo los guarda por lotes (bulk_create, o COPY en PostgreSQL).
+AUDIT_QUEUE_MAXSIZE = 10000
+AUDIT_BATCH_SIZE = 200
+AUDIT_FLUSH_INTERVAL = 0.5  # segundos
+
+_AUDIT_QUEUE = queue.Queue(maxsize=AUDIT_QUEUE_MAXSIZE)
+_writer_thread = None
+_writer_lock = threading.Lock()
 
 
 class AuditLog(models.Model):
@@ -68,7 +103,6 @@ class AuditLog(models.Model):
         max_length=20,
         choices=ACTION_TYPES,
         default='OTHER',
-        db_index=True,
         help_text="Tipo de acción realizada"
     )
     action_description = models.TextField(
@@ -78,12 +112,10 @@ class AuditLog(models.Model):
     # Información de la petición HTTP
     http_method = models.CharField(
         max_length=10,
-        db_index=True,
         help_text="Método HTTP (GET, POST, PUT, DELETE, etc.)"
     )
     endpoint = models.CharField(
         max_length=500,
-        db_index=True,
         help_text="URL del endpoint accedido"
     )
     query_params = models.TextField(
@@ -97,7 +129,6 @@ class AuditLog(models.Model):
 
     # Información de la respuesta
     response_status = models.IntegerField(
-        db_index=True,
         help_text="Código de estado HTTP de la respuesta"
     )
     response_time_ms = models.IntegerField(
@@ -107,7 +138,6 @@ class AuditLog(models.Model):
     )
     success = models.BooleanField(
         default=True,
-        db_index=True,
         help_text="Si la operación fue exitosa"
     )
     error_message = models.TextField(
@@ -117,7 +147,6 @@ class AuditLog(models.Model):
 
     # Información de red
     ip_address = models.GenericIPAddressField(
-        db_index=True,
         help_text="Dirección IP del usuario"
     )
     user_agent = models.TextField(
@@ -130,7 +159,6 @@ class AuditLog(models.Model):
         max_length=10,
         choices=SEVERITY_LEVELS,
         default='LOW',
-        db_index=True,
         help_text="Nivel de severidad de la acción"
     )
     additional_data = models.JSONField(
@@ -140,9 +168,9 @@ class AuditLog(models.Model):
     )
 
     # Timestamp
+    # Índice BRIN en PostgreSQL (btree en otros motores), ver migración 0010
     timestamp = models.DateTimeField(
-        default=timezone.now,
-        db_index=True,
+        db_default=Now(),
         help_text="Fecha y hora exacta de la acción"
     )
 
@@ -152,7 +180,7 @@ class AuditLog(models.Model):
         verbose_name_plural = 'Registros de Auditoría'
         ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=['-timestamp', 'user']),
+            models.Index(fields=['user', 'timestamp'], name='ix_audit_user_ts'),
             models.Index(fields=['action_type', '-timestamp']),
             models.Index(fields=['ip_address', '-timestamp']),
             models.Index(fields=['success', '-timestamp']),
@@ -179,68 +207,76 @@ class AuditLog(models.Model):
             response_time_ms: Tiempo de respuesta en ms
 
         Returns:
-            AuditLog: Instancia creada
+            AuditLog: Instancia creada, o None si se encoló para el hilo escritor
+            o si la lectura no fue elegida por el muestreo
         """
-        # Obtener IP
-        ip_address = cls._get_client_ip(request)
-
-        # Obtener User Agent
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-
-        # Preparar request body (censurar contraseñas)
-        request_body = ''
-        if request.method in ['POST', 'PUT', 'PATCH']:
-            try:
-                if hasattr(request, 'data'):
-                    body_data = dict(request.data)
-                else:
-                    body_data = dict(request.POST)
-
-                # Censurar campos sensibles
-                sensitive_fields = ['password', 'token', 'secret', 'api_key', 'card_number']
-                for field in sensitive_fields:
-                    if field in body_data:
-                        body_data[field] = '***CENSORED***'
-
-                request_body = json.dumps(body_data, ensure_ascii=False)[:5000]  # Limitar a 5000 chars
-            except:
-                request_body = ''
-
-        # Query params
-        query_params = request.META.get('QUERY_STRING', '')
-
         # Response status
         response_status = response.status_code if response else 200
         success = 200 <= response_status < 400
 
-        # Error message
-        error_message = ''
-        if not success and response:
+        # Muestreo de lecturas exitosas: se guarda 1 de cada N
+        # (errores y acciones que no son READ se registran siempre)
+        if action_type == 'READ' and success:
+            sample_rate = getattr(settings, 'AUDIT_READ_SAMPLE_RATE', 1)
+            if sample_rate > 1:
+                if random.randrange(sample_rate) != 0:
+                    return None
+                additional_data = {**(additional_data or {}), 'sample_rate': sample_rate}
+
+        # Solo se toman referencias baratas aquí; la serialización del body y
+        # del mensaje de error se hace al construir el registro (en el hilo
+        # escritor cuando la escritura es asíncrona).
+        body_source = None
+        if request.method in ['POST', 'PUT', 'PATCH']:
             try:
-                error_message = str(response.content.decode('utf-8'))[:1000]
-            except:
-                error_message = 'Error desconocido'
-
-        # Crear el registro
-        return cls.objects.create(
-            user=user if user and user.is_authenticated else None,
-            username=user.username if user and user.is_authenticated else 'Anónimo',
-            action_type=action_type,
-            action_description=description,
-            http_method=request.method,
-            endpoint=request.path,
-            query_params=query_params,
-            request_body=request_body,
-            response_status=response_status,
-            response_time_ms=response_time_ms,
-            success=success,
-            error_message=error_message,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            severity=severity,
-            additional_data=additional_data,
+                body_source = request.data if hasattr(request, 'data') else request.POST
+            except Exception:
+                body_source = None
+
+        # Contenido de la respuesta para el mensaje de error
+        error_content = None
+        if not success and response:
+            error_content = getattr(response, 'content', None)
+
+        pending = PendingAuditLog(
+            fields={
+                'user': user if user and user.is_authenticated else None,
+                'username': user.username if user and user.is_authenticated else 'Anónimo',
+                'action_type': action_type,
+                'action_description': description,
+                'http_method': request.method,
+                'endpoint': request.path,
+                'query_params': request.META.get('QUERY_STRING', ''),
+                'response_status': response_status,
+                'response_time_ms': response_time_ms,
+                'success': success,
+                'ip_address': cls._get_client_ip(request),
+                'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+                'severity': severity,
+                'additional_data': additional_data,
+            },
+            body_source=body_source,
+            error_content=error_content,
         )
 
+        # Dentro de una transacción se guarda en la misma conexión, para que
+        # el registro siga la suerte de la transacción (p.ej. en tests)
+        if getattr(settings, 'AUDIT_ASYNC_WRITES', True) and not connection.in_atomic_block:
+            # La escritura diferida tarda hasta AUDIT_FLUSH_INTERVAL; se fija la
+            # hora de la petición en vez de usar la del servidor al insertar
+            pending.fields['timestamp'] = timezone.now()
+            try:
+                _AUDIT_QUEUE.put_nowait(pending)
+                _ensure_writer()
+                return None
+            except queue.Full:
+                # Cola llena: guardar de forma síncrona (backpressure)
+                pass
+
+        log = pending.build()
+        log.save()
+        return log
+
     @staticmethod
     def _get_client_ip(request):
         """
@@ -248,10 +284,10 @@ class AuditLog(models.Model):
         """
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            ip = request.META.get('REMOTE_ADDR', '0.0.0.0')
-        return ip
+            # Primera IP de la lista, sin crear una lista con split()
+            comma = x_forwarded_for.find(',')
+            return (x_forwarded_for[:comma] if comma >= 0 else x_forwarded_for).strip()
+        return request.META.get('REMOTE_ADDR') or '0.0.0.0'
 
     def to_dict(self):
         """
@@ -260,7 +296,7 @@ class AuditLog(models.Model):
         return {
             'id': self.id,
             'user': self.username,
-            'action_type': self.get_action_type_display(),
+            'action_type': _ACTION_DISPLAY.get(self.action_type, self.action_type),
             'action_description': self.action_description,
             'http_method': self.http_method,
             'endpoint': self.endpoint,
@@ -268,10 +304,250 @@ class AuditLog(models.Model):
             'timestamp': self.timestamp.isoformat(),
             'success': self.success,
             'response_status': self.response_status,
-            'severity': self.get_severity_display(),
+            'severity': _SEVERITY_DISPLAY.get(self.severity, self.severity),
         }
 
 
+# Etiquetas legibles de los choices (evita get_*_display() por registro)
+_ACTION_DISPLAY = dict(AuditLog.ACTION_TYPES)
+_SEVERITY_DISPLAY = dict(AuditLog.SEVERITY_LEVELS)
+
+
+@dataclass
+class PendingAuditLog:
+    """
+    Registro de auditoría pendiente de construir y guardar.
+
+    Guarda solo valores que sobreviven al fin de la petición: los campos ya
+    calculados, la referencia a los datos del body y el contenido (bytes) de
+    la respuesta de error.
+    """
+    fields: dict
+    body_source: Any = None
+    error_content: Optional[bytes] = None
+
+    def build(self):
+        """Construye la instancia de AuditLog (sin guardar)."""
+        error_message = ''
+        if not self.fields['success']:
+            error_message = _format_error_message(self.error_content)
+        return AuditLog(
+            request_body=_serialize_request_body(self.body_source),
+            error_message=error_message,
+            **self.fields
+        )
+
+
+def _serialize_request_body(src):
+    """Serializa el body de la petición a JSON censurando campos sensibles."""
+    if src is None:
+        return ''
+    try:
+        # QueryDict: conservar todos los valores de cada campo
+        items = src.lists() if hasattr(src, 'lists') else src.items()
+
+        # Copiar y censurar campos sensibles en una sola pasada; los archivos
+        # se guardan solo como metadatos
+        body_data = {
+            key: ('***CENSORED***' if key in _SENSITIVE_FIELDS else _body_value(value))
+            for key, value in items
+        }
+
+        # Limitar a 5000 bytes/chars; con orjson se corta antes de decodificar
+        if orjson is not None:
+            return orjson.dumps(body_data)[:5000].decode('utf-8', 'replace')
+        return json.dumps(body_data, ensure_ascii=False)[:5000]
+    except Exception:
+        return ''
+
+
+def _body_value(value):
+    """Reemplaza archivos subidos por '<file:NB>' (también dentro de listas)."""
+    if isinstance(value, UploadedFile):
+        return f'<file:{value.size}B>'
+    if isinstance(value, list):
+        return [f'<file:{v.size}B>' if isinstance(v, UploadedFile) else v for v in value]
+    return value
+
+
+def _format_error_message(content):
+    """
+    Mensaje de error a partir del contenido de la respuesta.
+
+    Solo se decodifican los primeros ERROR_MESSAGE_HEAD_BYTES; del resto se
+    guarda el tamaño y un hash corto para poder correlacionar respuestas.
+    """
+    if content is None:
+        return 'Error desconocido'
+    try:
+        head = bytes(content[:ERROR_MESSAGE_HEAD_BYTES]).decode('utf-8', 'replace')
+        remaining = len(content) - ERROR_MESSAGE_HEAD_BYTES
+        if remaining > 0:
+            tail_hash = hashlib.blake2b(memoryview(content)[ERROR_MESSAGE_HEAD_BYTES:], digest_size=8).hexdigest()
+            head += f'…[+{remaining}B #{tail_hash}]'
+        return head
+    except Exception:
+        return 'Error desconocido'
+
+
+def _ensure_writer():
+    """Inicia el hilo escritor de la bitácora si aún no está corriendo."""
+    global _writer_thread
+    if _writer_thread is not None and _writer_thread.is_alive():
+        return
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(
+                target=_audit_writer,
+                name='audit-log-writer',
+                daemon=True
+            )
+            _writer_thread.start()
+
+
+def _audit_writer():
+    """
+    Consume la cola de la bitácora y guarda los registros por lotes.
+
+    Un lote se cierra al llegar a AUDIT_BATCH_SIZE registros o al pasar
+    AUDIT_FLUSH_INTERVAL segundos desde el primero.
+    """
+    # Conexión propia del hilo, abierta una vez y reutilizada entre lotes
+    try:
+        connections[_audit_db_alias()].ensure_connection()
+    except Exception as e:
+        print(f"Error al conectar el escritor de bitácora: {e}")
+
+    while True:
+        batch = [_AUDIT_QUEUE.get()]
+        deadline = time.monotonic() + AUDIT_FLUSH_INTERVAL
+        while len(batch) < AUDIT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_AUDIT_QUEUE.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _write_batch(batch)
+
+
+def _write_batch(pending_batch):
+    """Construye y guarda un lote de registros de auditoría en una sola transacción."""
+    batch = []
+    for pending in pending_batch:
+        try:
+            batch.append(pending.build())
+        except Exception as e:
+            print(f"Error al construir registro de bitácora: {e}")
+    if not batch:
+        return
+
+    alias = _audit_db_alias()
+    conn = connections[alias]
+    try:
+        # Reutilizar la conexión del hilo mientras siga siendo válida
+        conn.close_if_unusable_or_obsolete()
+        with transaction.atomic(using=alias):
+            if conn.vendor == 'postgresql':
+                _copy_batch(batch, conn)
+            else:
+                AuditLog.objects.using(alias).bulk_create(batch, batch_size=AUDIT_BATCH_SIZE)
+    except Exception as e:
+        # Si falla el lote, guardar uno por uno para no perder los registros válidos
+        print(f"Error al guardar lote de bitácora ({len(batch)} registros): {e}")
+        for log in batch:
+            try:
+                log.pk = None
+                log.save(force_insert=True, using=alias)
+            except Exception as e:
+                print(f"Error al guardar registro de bitácora ({log.http_method} {log.endpoint}): {e}")
+
+
+def _audit_db_alias():
+    """
+    Alias de BD del escritor: 'audit' si está configurado (conexión directa y
+    persistente, ver AUDIT_DATABASE_URL en settings) o 'default'.
+    """
+    return 'audit' if 'audit' in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+def _copy_batch(batch, conn):
+    """
+    Inserta el lote con COPY FROM STDIN (PostgreSQL).
+
+    Una sola sentencia por lote, sin parámetros por fila; mucho más rápido que
+    bulk_create para una tabla de solo inserción como audit_logs.
+    """
+    fields = [f for f in AuditLog._meta.concrete_fields if not f.primary_key]
+    columns = ', '.join(conn.ops.quote_name(f.column) for f in fields)
+    # Columnas JSON: se envían como texto JSON y PostgreSQL las convierte a jsonb
+    json_columns = [isinstance(f, models.JSONField) for f in fields]
+
+    buffer = io.StringIO()
+    for log in batch:
+        buffer.write('\t'.join(
+            _copy_value(getattr(log, f.attname), is_json)
+            for f, is_json in zip(fields, json_columns)
+        ))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    with conn.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {AuditLog._meta.db_table} ({columns}) FROM STDIN',
+            buffer
+        )
+
+
+def _copy_value(value, is_json=False):
+    """Formatea un valor para el formato de texto de COPY."""
+    if value is None:
+        return '\\N'
+    if is_json:
+        # Se serializa una sola vez (orjson si está disponible)
+        value = _json_dumps(value)
+    elif isinstance(value, bool):
+        return 't' if value else 'f'
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return (
+        value.replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def _json_dumps(value):
+    """Serializa a JSON con orjson si está disponible."""
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value, ensure_ascii=False)
+
+
+@atexit.register
+def flush_audit_queue():
+    """
+    Guarda de forma síncrona los registros que sigan en la cola.
+
+    Se ejecuta al terminar el proceso para no perder registros pendientes.
+    """
+    batch = []
+    while True:
+        try:
+            batch.append(_AUDIT_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+        if len(batch) >= AUDIT_BATCH_SIZE:
+            _write_batch(batch)
+            batch = []
+    if batch:
+        _write_batch(batch)
+
+
 class UserSession(models.Model):
     """
     Modelo para rastrear sesiones de usuarios.
@@ -285,8 +561,8 @@ class UserSession(models.Model):
     session_key = models.CharField(max_length=40, unique=True)
     ip_address = models.GenericIPAddressField()
     user_agent = models.TextField(blank=True)
-    login_time = models.DateTimeField(default=timezone.now)
-    last_activity = models.DateTimeField(default=timezone.now)
+    login_time = models.DateTimeField(db_default=Now())
+    last_activity = models.DateTimeField(db_default=Now())
     logout_time = models.DateTimeField(null=True, blank=True)
     is_active = models.BooleanField(default=True, db_index=True)
 
@@ -0,0 +1,141 @@
+# sales/models_recommendations.py
+"""
+Tablas desnormalizadas para el sistema de recomendaciones.
+Se recalculan periódicamente con: python manage.py refresh_recommendation_stats
+"""
+
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Count, Sum, F
+from django.utils import timezone
+
+from products.models import Product
+
+
+class ProductRecentSales(models.Model):
+    """
+    Ventas completadas de los últimos 30 días por producto.
+
+    Evita recalcular el GROUP BY sobre OrderItem en cada consulta de
+    productos en tendencia.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recent_sales_stats'
+    )
+    recent_sales = models.PositiveIntegerField(default=0)
+    recent_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'product_recent_sales_30d'
+        verbose_name = 'Ventas Recientes por Producto'
+        verbose_name_plural = 'Ventas Recientes por Producto'
+        indexes = [
+            models.Index(fields=['-recent_sales']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.recent_sales} ventas"
+
+    @classmethod
+    def refresh(cls, days=30):
+        """
+        Recalcula la tabla completa a partir de las órdenes completadas.
+
+        Args:
+            days: Tamaño de la ventana en días
+
+        Returns:
+            int: Número de productos con ventas en la ventana
+        """
+        from sales.models import OrderItem
+
+        now = timezone.now()
+        since_date = now - timedelta(days=days)
+
+        rows = OrderItem.objects.filter(
+            order__status='COMPLETED',
+            order__created_at__gte=since_date
+        ).values('product_id').annotate(
+            recent_sales=Count('id'),
+            recent_revenue=Sum(F('price') * F('quantity'))
+        )
+
+        stats = [
+            cls(
+                product_id=row['product_id'],
+                recent_sales=row['recent_sales'],
+                recent_revenue=row['recent_revenue'] or 0,
+                refreshed_at=now
+            )
+            for row in rows
+        ]
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(stats, batch_size=1000)
+
+        return len(stats)
+
+
+class ProductCoOccurrence(models.Model):
+    """
+    Número de órdenes completadas distintas que contienen ambos productos.
+
+    Cada par se guarda una sola vez con product_a < product_b.
+    """
+    product_a = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    product_b = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'product_co_occurrence'
+        verbose_name = 'Co-ocurrencia de Productos'
+        verbose_name_plural = 'Co-ocurrencias de Productos'
+        constraints = [
+            models.UniqueConstraint(fields=['product_a', 'product_b'], name='uniq_product_co_occurrence_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_a_id} + {self.product_b_id}: {self.count}"
+
+    @classmethod
+    def refresh(cls):
+        """
+        Recalcula todos los pares a partir de las órdenes completadas.
+
+        Returns:
+            int: Número de pares guardados
+        """
+        from sales.models import OrderItem
+
+        now = timezone.now()
+
+        # Self-join de OrderItem por orden (i1.product_id < i2.product_id)
+        rows = OrderItem.objects.filter(
+            order__status='COMPLETED',
+            order__items__product_id__gt=F('product_id')
+        ).values('product_id', 'order__items__product_id').annotate(
+            count=Count('order', distinct=True)
+        )
+
+        pairs = [
+            cls(
+                product_a_id=row['product_id'],
+                product_b_id=row['order__items__product_id'],
+                count=row['count'],
+                refreshed_at=now
+            )
+            for row in rows
+        ]
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(pairs, batch_size=1000)
+
+        return len(pairs)
@@ -5,6 +5,7 @@ Usa TF-IDF + LogisticRegression. Modelo se guarda en ml_models/nlp_intent_model.
 from __future__ import annotations
 
 import os
+import threading
 import joblib
 from typing import Dict, Any, Optional, Tuple, List
 from pathlib import Path
@@ -20,20 +21,21 @@ from django.conf import settings
 
 MODEL_PATH = Path(getattr(settings, 'BASE_DIR', '.')) / 'ml_models' / 'nlp_intent_model.pkl'
 
+# Modelo cargado en memoria: (mtime del archivo, pipeline, clases)
+_CACHED: Optional[Tuple[float, Pipeline, List[str]]] = None
+_CACHE_LOCK = threading.Lock()
+
 
 def _default_training_data(available_reports: Dict[str, Dict[str, Any]]) -> Tuple[List[str], List[str]]:
     X: List[str] = []
     y: List[str] = []
     for key, info in available_reports.items():
-        # Usar keywords como ejemplos base
-        for kw in info.get('keywords', []):
-            X.append(kw)
-            y.append(key)
-        # Variaciones simples
+        # Usar keywords como ejemplos base, más variaciones simples
+        keywords = info.get('keywords', [])
+        X.extend(keywords)
         X.append(info['name'].lower())
-        y.append(key)
         X.append(info['description'].lower())
-        y.append(key)
+        y.extend([key] * (len(keywords) + 2))
     # Algunos comodines
     extras = [
         ("reporte de ventas", 'ventas_basico'),
@@ -46,9 +48,8 @@ def _default_training_data(available_reports: Dict[str, Dict[str, Any]]) -> Tupl
         ("inventario y stock", 'analisis_inventario'),
         ("predicciones de ventas", 'prediccion_ventas'),
     ]
-    for text, label in extras:
-        X.append(text)
-        y.append(label)
+    X.extend(text for text, _ in extras)
+    y.extend(label for _, label in extras)
     return X, y
 
 
@@ -65,7 +66,16 @@ def train_intent_model(available_reports: Dict[str, Dict[str, Any]]) -> Dict[str
     acc = accuracy_score(y_te, pipe.predict(X_te))
 
     MODEL_PATH.parent.mkdir(exist_ok=True)
-    joblib.dump({'pipeline': pipe}, MODEL_PATH)
+    # Sin compresión para poder cargarlo con mmap_mode. Se escribe en un
+    # temporal y se reemplaza de forma atómica: los pipelines ya cargados
+    # siguen mapeando el archivo anterior (sobrescribirlo en el lugar causa
+    # SIGBUS) y el chequeo de mtime nunca ve un archivo a medio escribir.
+    tmp_path = MODEL_PATH.with_suffix(f'.{os.getpid()}.tmp')
+    try:
+        joblib.dump({'pipeline': pipe}, tmp_path, compress=0)
+        os.replace(tmp_path, MODEL_PATH)
+    finally:
+        tmp_path.unlink(missing_ok=True)
 
     return {'trained': True, 'samples': len(X), 'accuracy': float(acc), 'model_path': str(MODEL_PATH)}
 
@@ -75,20 +85,77 @@ def is_model_available() -> bool:
 
 
 def load_model_or_none() -> Optional[Pipeline]:
-    if not is_model_available():
+    """Retorna el pipeline entrenado (cacheado en memoria) o None si no existe."""
+    loaded = _load_cached_model()
+    return loaded[0] if loaded is not None else None
+
+
+def _load_cached_model() -> Optional[Tuple[Pipeline, List[str]]]:
+    """
+    Retorna (pipeline, clases), cargándolo del disco solo la primera vez
+    o cuando el archivo cambia (p.ej. tras reentrenar).
+    """
+    global _CACHED
+    try:
+        mtime = MODEL_PATH.stat().st_mtime
+    except OSError:
         return None
-    data = joblib.load(MODEL_PATH)
-    return data['pipeline']
+
+    cached = _CACHED
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2]
+
+    with _CACHE_LOCK:
+        # Otro hilo pudo haberlo cargado mientras esperábamos
+        if _CACHED is None or _CACHED[0] != mtime:
+            # mmap: los arrays (coef_, idf_) se comparten entre workers vía page cache
+            pipeline = joblib.load(MODEL_PATH, mmap_mode='r')['pipeline']
+            _CACHED = (mtime, pipeline, list(pipeline.classes_))
+        return _CACHED[1], _CACHED[2]
 
 
-def predict_intent_or_none(text: str) -> Optional[Dict[str, Any]]:
-    model = load_model_or_none()
-    if model is None:
+def predict_intent_or_none(text: str, with_confidence: bool = True) -> Optional[Dict[str, Any]]:
+    results = predict_intents_many([text], with_confidence=with_confidence)
+    if results is None:
         return None
-    proba = model.predict_proba([text])[0]
-    classes = list(model.classes_)
-    idx = int(proba.argmax())
-    return {
-        'label': classes[idx],
-        'confidence': float(proba[idx])
-    }
+    return results[0]
+
+
+def predict_intents_many(texts: List[str], with_confidence: bool = True) -> Optional[List[Dict[str, Any]]]:
+    """
+    Clasifica varios textos en una sola pasada por el pipeline.
+
+    Args:
+        texts: Textos a clasificar
+        with_confidence: Si es False se usa decision_function (sin softmax),
+            que da la misma clase que predict_proba, y confidence es None
+
+    Returns:
+        Lista de {'label', 'confidence'} en el mismo orden que texts,
+        o None si no hay modelo entrenado.
+    """
+    loaded = _load_cached_model()
+    if loaded is None:
+        return None
+    model, classes = loaded
+    if not texts:
+        return []
+
+    if not with_confidence:
+        scores = model.decision_function(texts)
+        if scores.ndim == 1:
+            # Clasificación binaria: un solo score por texto
+            idxs = (scores > 0).astype(int)
+        else:
+            idxs = scores.argmax(axis=1)
+        return [{'label': classes[idx], 'confidence': None} for idx in idxs]
+
+    proba = model.predict_proba(texts)
+    idxs = proba.argmax(axis=1)
+    return [
+        {
+            'label': classes[idx],
+            'confidence': float(proba[row, idx])
+        }
+        for row, idx in enumerate(idxs)
+    ]
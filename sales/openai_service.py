@@ -6,6 +6,7 @@ from __future__ import annotations
 
 import os
 import json
+from functools import lru_cache
 from typing import Optional, Dict, Any
 
 _client = None
@@ -30,6 +31,19 @@ def get_openai_client():
         return None
 
 
+@lru_cache(maxsize=8)
+def _build_sys_prompt(allowed_ids: tuple) -> str:
+    """Prompt de sistema para clasificar comandos; se cachea por catálogo de reportes."""
+    return (
+        "Eres un asistente que clasifica pedidos de reportes de ventas. "
+        "Debes responder ÚNICAMENTE en JSON válido con estas claves: "
+        "{report_type, report_name, report_description, endpoint_type, format, params, supports_ml, confidence}. "
+        f"report_type debe ser uno de: {list(allowed_ids)}. "
+        "format en {json,pdf,excel}. params puede incluir start_date, end_date (YYYY-MM-DD), "
+        "group_by (product|client|category|date), forecast_days. No incluyas texto adicional."
+    )
+
+
 def analyze_command_with_openai(command: str, allowed_reports: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
     """
     Usa un modelo de chat para clasificar el comando y extraer intención.
@@ -39,15 +53,7 @@ def analyze_command_with_openai(command: str, allowed_reports: Dict[str, Dict[st
     if client is None:
         return None
 
-    allowed_ids = list(allowed_reports.keys())
-    sys_prompt = (
-        "Eres un asistente que clasifica pedidos de reportes de ventas. "
-        "Debes responder ÚNICAMENTE en JSON válido con estas claves: "
-        "{report_type, report_name, report_description, endpoint_type, format, params, supports_ml, confidence}. "
-        f"report_type debe ser uno de: {allowed_ids}. "
-        "format en {json,pdf,excel}. params puede incluir start_date, end_date (YYYY-MM-DD), "
-        "group_by (product|client|category|date), forecast_days. No incluyas texto adicional."
-    )
+    sys_prompt = _build_sys_prompt(tuple(allowed_reports))
 
     user_prompt = (
         "Clasifica este comando y devuelve JSON válido. Si no estás seguro, escoge 'ventas_basico'.\n\n"
@@ -72,7 +78,7 @@ def analyze_command_with_openai(command: str, allowed_reports: Dict[str, Dict[st
             content = content[4:].strip()
         data = json.loads(content)
         # Validación mínima
-        if 'report_type' not in data or data['report_type'] not in allowed_ids:
+        if 'report_type' not in data or data['report_type'] not in allowed_reports:
             return None
         return data
     except Exception:
@@ -10,6 +10,36 @@ from dateutil import parser as date_parser
 from django.utils import timezone
 
 
+# Patrones de fechas (compilados una sola vez)
+# Rango explícito "del DD/MM/YYYY al DD/MM/YYYY"
+_DATE_RANGE_RE = re.compile(r'del?\s+(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+al?\s+(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')
+# "últimos X días"
+_DAYS_RE = re.compile(r'últimos?\s+(\d+)\s+días?|last\s+(\d+)\s+days?')
+# Año específico "del año 2024"
+_YEAR_RE = re.compile(r'(?:del?\s+)?año\s+(\d{4})|year\s+(\d{4})')
+
+
+def _build_keyword_re(categories, prefix=''):
+    """
+    Compila un único patrón que reconoce las palabras clave de todas las categorías.
+
+    Cada categoría es un grupo con nombre dentro de un lookahead, así una sola
+    pasada sobre el texto encuentra todas las categorías presentes, incluso
+    cuando sus palabras clave se solapan (p.ej. "venta" dentro de "inventario").
+    """
+    alternatives = '|'.join(
+        f"(?P<{key}>{'|'.join(re.escape(keyword) for keyword in keywords)})"
+        for key, keywords in categories.items()
+    )
+    return re.compile(f"{re.escape(prefix)}(?={alternatives})")
+
+
+def _first_category(pattern, text, categories):
+    """Retorna la primera categoría (en orden de prioridad) presente en el texto."""
+    found = {match.lastgroup for match in pattern.finditer(text)}
+    return next((key for key in categories if key in found), None)
+
+
 class PromptParser:
     """
     Clase para interpretar prompts de texto y extraer parámetros de reportes.
@@ -36,6 +66,19 @@ class PromptParser:
         'date': ['fecha', 'fechas', 'date', 'dates', 'dia', 'dias', 'day', 'days']
     }
     
+    # Tipos de reporte soportados
+    REPORT_TYPES = {
+        'sales': ['venta', 'ventas', 'sale', 'sales', 'orden', 'ordenes', 'order', 'orders'],
+        'products': ['producto', 'productos', 'product', 'products', 'inventario', 'inventory', 'stock'],
+        'clients': ['cliente', 'clientes', 'client', 'clients', 'usuario', 'usuarios', 'user', 'users'],
+        'revenue': ['ingreso', 'ingresos', 'revenue', 'ganancia', 'ganancias']
+    }
+    
+    # Patrones de palabras clave (una sola pasada por familia)
+    _FORMAT_RE = _build_keyword_re(FORMATS)
+    _GROUPING_RE = _build_keyword_re(GROUPINGS, prefix='por')
+    _REPORT_TYPE_RE = _build_keyword_re(REPORT_TYPES)
+    
     # Meses en español
     MONTHS = {
         'enero': 1, 'febrero': 2, 'marzo': 3, 'abril': 4,
@@ -70,19 +113,16 @@ class PromptParser:
         """
         Extrae el formato de salida del reporte (PDF, Excel, Pantalla).
         """
-        for format_key, keywords in self.FORMATS.items():
-            for keyword in keywords:
-                if keyword in self.prompt:
-                    self.params['format'] = format_key
-                    return
+        format_key = _first_category(self._FORMAT_RE, self.prompt, self.FORMATS)
+        if format_key:
+            self.params['format'] = format_key
     
     def _extract_dates(self):
         """
         Extrae fechas del prompt usando múltiples estrategias.
         """
         # Estrategia 1: Buscar rangos explícitos "del DD/MM/YYYY al DD/MM/YYYY"
-        date_range_pattern = r'del?\s+(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+al?\s+(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-        match = re.search(date_range_pattern, self.prompt)
+        match = _DATE_RANGE_RE.search(self.prompt)
         
         if match:
             try:
@@ -132,8 +172,7 @@ class PromptParser:
             return
         
         # Estrategia 5: Buscar "últimos X días"
-        days_pattern = r'últimos?\s+(\d+)\s+días?|last\s+(\d+)\s+days?'
-        match = re.search(days_pattern, self.prompt)
+        match = _DAYS_RE.search(self.prompt)
         if match:
             days = int(match.group(1) or match.group(2))
             self.params['end_date'] = timezone.now()
@@ -141,8 +180,7 @@ class PromptParser:
             return
         
         # Estrategia 6: Buscar año específico "del año 2024"
-        year_pattern = r'(?:del?\s+)?año\s+(\d{4})|year\s+(\d{4})'
-        match = re.search(year_pattern, self.prompt)
+        match = _YEAR_RE.search(self.prompt)
         if match:
             year = int(match.group(1) or match.group(2))
             self.params['start_date'] = timezone.make_aware(datetime(year, 1, 1))
@@ -180,32 +218,18 @@ class PromptParser:
         """
         Extrae el tipo de agrupación solicitado.
         """
-        for group_key, keywords in self.GROUPINGS.items():
-            for keyword in keywords:
-                if f"por {keyword}" in self.prompt or f"agrupado por {keyword}" in self.prompt:
-                    self.params['group_by'] = group_key
-                    return
-                if f"por {keyword}".replace(' ', '') in self.prompt.replace(' ', ''):
-                    self.params['group_by'] = group_key
-                    return
+        # "por producto", "agrupado por producto" o "porproducto" (sin espacios)
+        group_key = _first_category(self._GROUPING_RE, self.prompt.replace(' ', ''), self.GROUPINGS)
+        if group_key:
+            self.params['group_by'] = group_key
     
     def _extract_report_type(self):
         """
         Extrae el tipo de reporte solicitado.
         """
-        # Tipos de reporte soportados
-        report_keywords = {
-            'sales': ['venta', 'ventas', 'sale', 'sales', 'orden', 'ordenes', 'order', 'orders'],
-            'products': ['producto', 'productos', 'product', 'products', 'inventario', 'inventory', 'stock'],
-            'clients': ['cliente', 'clientes', 'client', 'clients', 'usuario', 'usuarios', 'user', 'users'],
-            'revenue': ['ingreso', 'ingresos', 'revenue', 'ganancia', 'ganancias']
-        }
-        
-        for report_type, keywords in report_keywords.items():
-            for keyword in keywords:
-                if keyword in self.prompt:
-                    self.params['report_type'] = report_type
-                    return
+        report_type = _first_category(self._REPORT_TYPE_RE, self.prompt, self.REPORT_TYPES)
+        if report_type:
+            self.params['report_type'] = report_type
 
 
 def parse_prompt(prompt_text):
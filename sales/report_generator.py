@@ -3,13 +3,17 @@
 Generador dinámico de reportes basado en parámetros extraídos de prompts.
 """
 
-from django.db.models import Sum, Count, F, Q, Avg, Max, Min
+from django.db.models import Sum, Count, F, Q, Avg, Max, Min, OuterRef, Subquery, ExpressionWrapper, DecimalField, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Trim, TruncDate
 from django.contrib.auth.models import User
 from django.utils import timezone
 from .models import Order, OrderItem
 from products.models import Product, Category
 from decimal import Decimal
-from datetime import datetime
+
+
+# Formato de las columnas en bolivianos
+BS_FORMAT = 'Bs {:.2f}'
 
 
 class ReportGenerator:
@@ -19,13 +23,17 @@ class ReportGenerator:
     
     def __init__(self, params):
         self.params = params
+        self._base_qs = None
         self.report_data = {
             'title': '',
             'subtitle': '',
             'headers': [],
             'rows': [],
             'totals': {},
-            'metadata': {}
+            'metadata': {},
+            # Formato por columna (None = sin formato); las filas se arman con
+            # valores crudos y se formatean una sola vez al final de generate()
+            'column_formats': []
         }
     
     def generate(self):
@@ -35,15 +43,31 @@ class ReportGenerator:
         report_type = self.params.get('report_type', 'sales')
         
         if report_type == 'sales':
-            return self._generate_sales_report()
+            self._generate_sales_report()
         elif report_type == 'products':
-            return self._generate_products_report()
+            self._generate_products_report()
         elif report_type == 'clients':
-            return self._generate_clients_report()
+            self._generate_clients_report()
         elif report_type == 'revenue':
-            return self._generate_revenue_report()
+            self._generate_revenue_report()
         else:
-            return self._generate_sales_report()  # Por defecto
+            self._generate_sales_report()  # Por defecto
+        
+        return self._apply_column_formats()
+    
+    def _apply_column_formats(self):
+        """
+        Convierte las filas crudas (Decimal, fechas, ids) a texto según
+        column_formats, en una sola pasada.
+        """
+        formats = self.report_data['column_formats']
+        if any(formats):
+            self.report_data['rows'] = [
+                [fmt.format(value) if fmt and value is not None else value
+                 for value, fmt in zip(row, formats)]
+                for row in self.report_data['rows']
+            ]
+        return self.report_data
     
     def _generate_sales_report(self):
         """
@@ -62,19 +86,38 @@ class ReportGenerator:
         else:
             return self._sales_general()
     
-    def _get_base_orders_queryset(self):
+    def _get_base_filters(self, prefix=''):
         """
-        Obtiene el queryset base de órdenes filtrado por fechas.
+        Filtros de órdenes completadas en el rango de fechas.
+        
+        Args:
+            prefix (str): Prefijo de la relación hacia Order (ej: 'order__')
         """
-        queryset = Order.objects.filter(status='COMPLETED')
+        filters = {f'{prefix}status': 'COMPLETED'}
         
         if self.params.get('start_date'):
-            queryset = queryset.filter(updated_at__gte=self.params['start_date'])
+            filters[f'{prefix}updated_at__gte'] = self.params['start_date']
         
         if self.params.get('end_date'):
-            queryset = queryset.filter(updated_at__lte=self.params['end_date'])
+            filters[f'{prefix}updated_at__lte'] = self.params['end_date']
         
-        return queryset
+        return filters
+    
+    def _get_base_orders_queryset(self):
+        """
+        Obtiene el queryset base de órdenes filtrado por fechas (se construye
+        una sola vez por reporte).
+        """
+        if self._base_qs is None:
+            self._base_qs = Order.objects.filter(**self._get_base_filters())
+        return self._base_qs
+    
+    def _get_base_items_queryset(self):
+        """
+        Items de las órdenes del reporte, filtrando por JOIN con Order en lugar
+        de una subconsulta order__in.
+        """
+        return OrderItem.objects.filter(**self._get_base_filters(prefix='order__'))
     
     def _sales_by_product(self):
         """
@@ -83,47 +126,34 @@ class ReportGenerator:
         self.report_data['title'] = 'Reporte de Ventas por Producto'
         self.report_data['subtitle'] = self._get_date_range_text()
         self.report_data['headers'] = ['Producto', 'Categoría', 'Cantidad Vendida', 'Ingresos Totales', 'Precio Promedio']
-        
-        # Obtener items de órdenes completadas en el rango de fechas
-        order_items = OrderItem.objects.filter(
-            order__in=self._get_base_orders_queryset()
-        ).select_related('product', 'product__category')
-        
-        # Agrupar por producto
-        product_stats = {}
-        for item in order_items:
-            # Uso seguro de atributos dinámicos de modelos Django para evitar advertencias de Pylance
-            product_id = getattr(item.product, 'id', getattr(item.product, 'pk', None))
-            if product_id not in product_stats:
-                product_stats[product_id] = {
-                    'name': item.product.name,
-                    'category': item.product.category.name,
-                    'quantity': 0,
-                    'revenue': Decimal('0.00'),
-                    'prices': []
-                }
-            
-            product_stats[product_id]['quantity'] += item.quantity
-            product_stats[product_id]['revenue'] += item.price * item.quantity
-            product_stats[product_id]['prices'].append(float(item.price))
+        self.report_data['column_formats'] = [None, None, None, BS_FORMAT, BS_FORMAT]
+        
+        # Agrupar por producto en la base de datos (una sola consulta GROUP BY)
+        product_stats = list(
+            self._get_base_items_queryset().values(
+                'product_id',
+                'product__name',
+                'product__category__name'
+            ).annotate(
+                units=Sum('quantity'),
+                revenue=Sum(F('quantity') * F('price')),
+                avg_price=Avg('price')
+            ).order_by('-revenue')
+        )
         
         # Construir filas
-        for product_id, stats in product_stats.items():
-            avg_price = sum(stats['prices']) / len(stats['prices']) if stats['prices'] else 0
+        for stats in product_stats:
             self.report_data['rows'].append([
-                stats['name'],
-                stats['category'],
-                stats['quantity'],
-                f"Bs {stats['revenue']:.2f}",
-                f"Bs {avg_price:.2f}"
+                stats['product__name'],
+                stats['product__category__name'],
+                stats['units'],
+                stats['revenue'],
+                stats['avg_price'] or 0
             ])
         
-        # Ordenar por ingresos (mayor a menor)
-        self.report_data['rows'].sort(key=lambda x: float(str(x[3]).replace('Bs', '').strip()), reverse=True)
-        
         # Calcular totales
-        total_quantity = sum(stats['quantity'] for stats in product_stats.values())
-        total_revenue = sum(stats['revenue'] for stats in product_stats.values())
+        total_quantity = sum(stats['units'] for stats in product_stats)
+        total_revenue = sum((stats['revenue'] for stats in product_stats), Decimal('0.00'))
         
         self.report_data['totals'] = {
             'total_products': len(product_stats),
@@ -140,44 +170,40 @@ class ReportGenerator:
         self.report_data['title'] = 'Reporte de Ventas por Cliente'
         self.report_data['subtitle'] = self._get_date_range_text()
         self.report_data['headers'] = ['Cliente', 'Email', 'Cantidad de Compras', 'Monto Total', 'Ticket Promedio']
+        self.report_data['column_formats'] = [None, None, None, BS_FORMAT, BS_FORMAT]
         
         # ✅ OPTIMIZADO: select_related para traer datos del cliente
         orders = self._get_base_orders_queryset().select_related('customer')
         
-        # Agrupar por cliente
+        # Agrupar por cliente, ordenado por monto total (mayor a menor) en la base de datos
+        # Nombre completo armado en la base de datos; si está vacío se usa el username
         client_stats = orders.values(
             'customer__id',
-            'customer__username',
             'customer__email',
-            'customer__first_name',
-            'customer__last_name'
+            full_name=Coalesce(
+                NullIf(Trim(Concat('customer__first_name', Value(' '), 'customer__last_name')), Value('')),
+                'customer__username'
+            )
         ).annotate(
             num_orders=Count('id'),
             total_spent=Sum('total_price')
-        )
+        ).order_by('-total_spent', 'customer__id')
         
         # Construir filas
         for stats in client_stats:
-            full_name = f"{stats['customer__first_name']} {stats['customer__last_name']}".strip()
-            if not full_name:
-                full_name = stats['customer__username']
-            
             avg_ticket = float(stats['total_spent']) / stats['num_orders'] if stats['num_orders'] > 0 else 0
             
             self.report_data['rows'].append([
-                full_name,
+                stats['full_name'],
                 stats['customer__email'],
                 stats['num_orders'],
-                f"Bs {stats['total_spent']:.2f}",
-                f"Bs {avg_ticket:.2f}"
+                stats['total_spent'],
+                avg_ticket
             ])
         
-        # Ordenar por monto total (mayor a menor)
-        self.report_data['rows'].sort(key=lambda x: float(str(x[3]).replace('Bs', '').strip()), reverse=True)
-        
         # Calcular totales
         total_orders = sum(row[2] for row in self.report_data['rows'])
-        total_revenue = sum(float(str(row[3]).replace('Bs', '').strip()) for row in self.report_data['rows'])
+        total_revenue = sum((row[3] for row in self.report_data['rows']), Decimal('0.00'))
         
         self.report_data['totals'] = {
             'total_clients': len(self.report_data['rows']),
@@ -194,44 +220,31 @@ class ReportGenerator:
         self.report_data['title'] = 'Reporte de Ventas por Categoría'
         self.report_data['subtitle'] = self._get_date_range_text()
         self.report_data['headers'] = ['Categoría', 'Productos Vendidos', 'Cantidad Total', 'Ingresos Totales']
-        
-        order_items = OrderItem.objects.filter(
-            order__in=self._get_base_orders_queryset()
-        ).select_related('product__category')
-        
-        # Agrupar por categoría
-        category_stats = {}
-        for item in order_items:
-            category_name = item.product.category.name
-            if category_name not in category_stats:
-                category_stats[category_name] = {
-                    'products': set(),
-                    'quantity': 0,
-                    'revenue': Decimal('0.00')
-                }
-            
-            # Añadir id de producto de forma segura (puede no estar definido como atributo estático para el linter)
-            pid = getattr(item.product, 'id', getattr(item.product, 'pk', None))
-            if pid is not None:
-                category_stats[category_name]['products'].add(pid)
-            category_stats[category_name]['quantity'] += item.quantity
-            category_stats[category_name]['revenue'] += item.price * item.quantity
+        self.report_data['column_formats'] = [None, None, None, BS_FORMAT]
+        
+        # Agrupar por categoría en la base de datos, ordenado por ingresos (mayor a menor)
+        category_stats = list(
+            self._get_base_items_queryset().values(
+                'product__category__name'
+            ).annotate(
+                products=Count('product_id', distinct=True),
+                units=Sum('quantity'),
+                revenue=Sum(F('quantity') * F('price'))
+            ).order_by('-revenue')
+        )
         
         # Construir filas
-        for category, stats in category_stats.items():
+        for stats in category_stats:
             self.report_data['rows'].append([
-                category,
-                len(stats['products']),
-                stats['quantity'],
-                f"Bs {stats['revenue']:.2f}"
+                stats['product__category__name'],
+                stats['products'],
+                stats['units'],
+                stats['revenue']
             ])
         
-        # Ordenar por ingresos (mayor a menor)
-        self.report_data['rows'].sort(key=lambda x: float(str(x[3]).replace('Bs', '').strip()), reverse=True)
-        
         # Calcular totales
-        total_quantity = sum(stats['quantity'] for stats in category_stats.values())
-        total_revenue = sum(stats['revenue'] for stats in category_stats.values())
+        total_quantity = sum(stats['units'] for stats in category_stats)
+        total_revenue = sum((stats['revenue'] for stats in category_stats), Decimal('0.00'))
         
         self.report_data['totals'] = {
             'total_categories': len(category_stats),
@@ -248,50 +261,38 @@ class ReportGenerator:
         self.report_data['title'] = 'Reporte de Ventas por Fecha'
         self.report_data['subtitle'] = self._get_date_range_text()
         self.report_data['headers'] = ['Fecha', 'Número de Ventas', 'Productos Vendidos', 'Ingresos del Día']
-        
-        orders = self._get_base_orders_queryset().order_by('updated_at')
-        
-        # Agrupar por fecha
-        date_stats = {}
-        for order in orders:
-            date_key = order.updated_at.strftime('%Y-%m-%d')
-            if date_key not in date_stats:
-                date_stats[date_key] = {
-                    'num_orders': 0,
-                    'total_items': 0,
-                    'revenue': Decimal('0.00')
-                }
-            
-            date_stats[date_key]['num_orders'] += 1
-            # Contar items usando access dinámico para evitar warnings del analizador estático
-            items_rel = getattr(order, 'items', None)
-            try:
-                items_count = items_rel.count() if items_rel is not None else 0
-            except Exception:
-                # Fallback si items no es queryset pero una lista u otro iter
-                try:
-                    items_count = len(items_rel) if items_rel is not None else 0
-                except Exception:
-                    items_count = 0
-            date_stats[date_key]['total_items'] += items_count
-            date_stats[date_key]['revenue'] += order.total_price
+        self.report_data['column_formats'] = ['{:%d/%m/%Y}', None, None, BS_FORMAT]
+        
+        # Cantidad de items por orden como subconsulta: un JOIN con items
+        # duplicaría total_price al sumar los ingresos del día
+        items_per_order = OrderItem.objects.filter(
+            order=OuterRef('pk')
+        ).values('order').annotate(n=Count('id')).values('n')
+        
+        # Agrupar por fecha en la base de datos (una sola consulta)
+        date_stats = list(
+            self._get_base_orders_queryset().annotate(
+                day=TruncDate('updated_at')
+            ).values('day').annotate(
+                num_orders=Count('id'),
+                total_items=Sum(Coalesce(Subquery(items_per_order), 0)),
+                revenue=Sum('total_price')
+            ).order_by('day')
+        )
         
         # Construir filas
-        for date_str, stats in sorted(date_stats.items()):
-            date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-            formatted_date = date_obj.strftime('%d/%m/%Y')
-            
+        for stats in date_stats:
             self.report_data['rows'].append([
-                formatted_date,
+                stats['day'],
                 stats['num_orders'],
                 stats['total_items'],
-                f"Bs {stats['revenue']:.2f}"
+                stats['revenue']
             ])
         
         # Calcular totales
-        total_orders = sum(stats['num_orders'] for stats in date_stats.values())
-        total_items = sum(stats['total_items'] for stats in date_stats.values())
-        total_revenue = sum(stats['revenue'] for stats in date_stats.values())
+        total_orders = sum(stats['num_orders'] for stats in date_stats)
+        total_items = sum(stats['total_items'] for stats in date_stats)
+        total_revenue = sum((stats['revenue'] for stats in date_stats), Decimal('0.00'))
         
         self.report_data['totals'] = {
             'total_days': len(date_stats),
@@ -309,39 +310,60 @@ class ReportGenerator:
         self.report_data['title'] = 'Reporte General de Ventas'
         self.report_data['subtitle'] = self._get_date_range_text()
         self.report_data['headers'] = ['ID Orden', 'Cliente', 'Fecha', 'Productos', 'Total']
+        self.report_data['column_formats'] = ['#{}', None, '{:%d/%m/%Y %H:%M}', None, BS_FORMAT]
         
-        orders = self._get_base_orders_queryset().order_by('-updated_at')
-        
-        for order in orders:
-            # Acceso seguro a atributos dinámicos para compatibilidad con Pylance
-            order_pk = getattr(order, 'id', getattr(order, 'pk', ''))
-            items_rel = getattr(order, 'items', None)
-            try:
-                items_count = items_rel.count() if items_rel is not None else 0
-            except Exception:
-                try:
-                    items_count = len(items_rel) if items_rel is not None else 0
-                except Exception:
-                    items_count = 0
-
-            self.report_data['rows'].append([
-                f"#{order_pk}",
-                order.customer.username,
-                order.updated_at.strftime('%d/%m/%Y %H:%M'),
-                items_count,
-                f"Bs {order.total_price:.2f}"
-            ])
+        self.report_data['rows'] = list(self._iter_sales_general())
         
-        # Calcular totales
-        total_revenue = sum(order.total_price for order in orders)
+        # Calcular totales con una sola agregación en la base de datos
+        totals = self._get_base_orders_queryset().aggregate(
+            total_orders=Count('id'),
+            total_revenue=Sum('total_price')
+        )
         
         self.report_data['totals'] = {
-            'total_orders': orders.count(),
-            'total_revenue': f"Bs {total_revenue:.2f}"
+            'total_orders': totals['total_orders'],
+            'total_revenue': f"Bs {totals['total_revenue'] or Decimal('0.00'):.2f}"
         }
         
         return self.report_data
     
+    def _iter_sales_general(self, chunk=1000):
+        """
+        Genera las filas del reporte general por bloques, con paginación por
+        keyset sobre (-updated_at, -id), sin cargar todas las órdenes a la vez.
+        
+        Args:
+            chunk (int): Órdenes leídas por consulta
+        
+        Yields:
+            list: Fila del reporte con valores sin formatear
+        """
+        # Solo las columnas de la fila, como tuplas (sin instanciar modelos)
+        queryset = self._get_base_orders_queryset().annotate(
+            item_count=Count('items')
+        ).order_by('-updated_at', '-id').values_list(
+            'id', 'customer__username', 'updated_at', 'item_count', 'total_price'
+        )
+        
+        cursor = None
+        while True:
+            page = queryset
+            if cursor is not None:
+                last_updated_at, last_pk = cursor
+                page = page.filter(
+                    Q(updated_at__lt=last_updated_at) |
+                    Q(updated_at=last_updated_at, id__lt=last_pk)
+                )
+            rows = list(page[:chunk])
+            
+            for row in rows:
+                yield list(row)
+            
+            if len(rows) < chunk:
+                return
+            last_pk, _, last_updated_at, _, _ = rows[-1]
+            cursor = (last_updated_at, last_pk)
+    
     def _generate_products_report(self):
         """
         Reporte de productos (inventario, stock, etc.).
@@ -349,24 +371,31 @@ class ReportGenerator:
         self.report_data['title'] = 'Reporte de Productos'
         self.report_data['subtitle'] = 'Inventario Actual'
         self.report_data['headers'] = ['Producto', 'Categoría', 'Precio', 'Stock Actual', 'Valor en Inventario']
+        self.report_data['column_formats'] = [None, None, BS_FORMAT, None, BS_FORMAT]
+        
+        # Valor en inventario calculado en la base de datos; una sola evaluación
+        products = list(
+            Product.objects.select_related('category').annotate(
+                inventory_value=ExpressionWrapper(
+                    F('price') * F('stock'),
+                    output_field=DecimalField(max_digits=14, decimal_places=2)
+                )
+            ).order_by('name')
+        )
         
-        products = Product.objects.select_related('category').order_by('name')
-        
-        total_value = Decimal('0.00')
         for product in products:
-            inventory_value = product.price * product.stock
-            total_value += inventory_value
-            
             self.report_data['rows'].append([
                 product.name,
                 product.category.name,
-                f"Bs {product.price:.2f}",
+                product.price,
                 product.stock,
-                f"Bs {inventory_value:.2f}"
+                product.inventory_value
             ])
         
+        total_value = sum((product.inventory_value for product in products), Decimal('0.00'))
+        
         self.report_data['totals'] = {
-            'total_products': products.count(),
+            'total_products': len(products),
             'total_inventory_value': f"Bs {total_value:.2f}"
         }
         
@@ -6,24 +6,48 @@ Provee utilidades para:
 - Construcción de datos tabulares para exportar ventas, clientes y productos
 
 Nota: se filtra por órdenes con estado COMPLETED.
+Las métricas del dashboard se cachean METRICAS_CACHE_TIMEOUT segundos por
+periodo y se invalidan cada vez que se guarda o elimina una orden.
 """
 from __future__ import annotations
 
+import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Tuple
 
-from django.db.models import Sum, Count, Avg, Max, F
+from django.db.models import Sum, Count, Avg, Max, F, Q, Window, ExpressionWrapper, DecimalField
+from django.db.models.functions import Lag, TruncMonth
+from django.core.cache import cache
 from django.utils import timezone
 
 from .models import Order, OrderItem
 from products.models import Product
-from django.contrib.auth.models import User
+
+
+MESES_NOMBRES = {
+    1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril', 5: 'Mayo', 6: 'Junio',
+    7: 'Julio', 8: 'Agosto', 9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
+}
+
+METRICAS_CACHE_TIMEOUT = 60  # segundos
+_METRICAS_VERSION_KEY = 'reports:metricas:version'
+
+
+def invalidar_cache_metricas() -> None:
+    """Invalida todas las métricas cacheadas cambiando la versión de las claves."""
+    cache.set(_METRICAS_VERSION_KEY, time.time_ns(), None)
 
 
 def _parse_date(s: str | None) -> datetime | None:
     if not s:
         return None
     try:
+        # fromisoformat es mucho más rápido que strptime para 'YYYY-MM-DD'
+        return datetime.fromisoformat(s)
+    except (TypeError, ValueError):
+        pass
+    try:
+        # Fechas sin ceros a la izquierda (ej: '2024-1-5')
         return datetime.strptime(s, '%Y-%m-%d')
     except Exception:
         return None
@@ -44,10 +68,13 @@ def _get_period(fecha_inicio: str | None, fecha_fin: str | None) -> Tuple[dateti
 
 def obtener_metricas_y_series(filtros: Dict[str, Any]) -> Dict[str, Any]:
     """Genera métricas y series para dashboards (Bs, sin departamentos)."""
-    fecha_inicio = filtros.get('fecha_inicio')
-    fecha_fin = filtros.get('fecha_fin')
-    start_dt, end_dt = _get_period(fecha_inicio, fecha_fin)
+    start_dt, end_dt = _get_period(filtros.get('fecha_inicio'), filtros.get('fecha_fin'))
+    version = cache.get_or_set(_METRICAS_VERSION_KEY, time.time_ns, None)
+    key = f"reports:metricas:{version}:{start_dt.date()}:{end_dt.date()}"
+    return cache.get_or_set(key, lambda: _calcular_metricas_y_series(start_dt, end_dt), METRICAS_CACHE_TIMEOUT)
+
 
+def _calcular_metricas_y_series(start_dt: datetime, end_dt: datetime) -> Dict[str, Any]:
     # Filtrar órdenes completadas en el periodo
     orders = Order.objects.filter(
         status=Order.OrderStatus.COMPLETED,
@@ -62,40 +89,35 @@ def obtener_metricas_y_series(filtros: Dict[str, Any]) -> Dict[str, Any]:
         total_ventas=Sum('total_price'),
         total_ordenes=Count('id'),
         promedio_orden=Avg('total_price'),
-        total_clientes=Count('customer', distinct=True),
     )
 
     total_ventas = float(agg_orders.get('total_ventas') or 0)
     total_ordenes = int(agg_orders.get('total_ordenes') or 0)
     promedio_orden = float(agg_orders.get('promedio_orden') or 0)
-    total_clientes = int(agg_orders.get('total_clientes') or 0)
 
-    # Ventas por mes
+    # Ventas por mes (el total del mes anterior se obtiene con LAG en SQL)
     ventas_mes = (
         orders
-        .values('created_at__year', 'created_at__month')
-        .annotate(total=Sum('total_price'), cantidad=Count('id'))
-        .order_by('created_at__year', 'created_at__month')
+        .annotate(mes=TruncMonth('created_at'))
+        .values('mes')
+        .annotate(
+            total=Sum('total_price'),
+            cantidad=Count('id'),
+        )
+        .annotate(total_anterior=Window(expression=Lag('total'), order_by=F('mes').asc()))
+        .order_by('mes')
     )
-    meses_nombres = {
-        1: 'Enero', 2: 'Febrero', 3: 'Marzo', 4: 'Abril', 5: 'Mayo', 6: 'Junio',
-        7: 'Julio', 8: 'Agosto', 9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
-    }
     ventas_por_mes: List[Dict[str, Any]] = []
-    ventas_mes_list = list(ventas_mes)
-    for i, item in enumerate(ventas_mes_list):
-        year = item['created_at__year']
-        month = item['created_at__month']
+    for item in ventas_mes:
+        year = item['mes'].year
+        month = item['mes'].month
         total = float(item['total'] or 0)
         cantidad = int(item['cantidad'] or 0)
-        crecimiento = 0.0
-        if i > 0:
-            total_anterior = float(ventas_mes_list[i - 1]['total'] or 0)
-            if total_anterior > 0:
-                crecimiento = ((total - total_anterior) / total_anterior) * 100.0
+        total_anterior = float(item['total_anterior'] or 0)
+        crecimiento = ((total - total_anterior) / total_anterior) * 100.0 if total_anterior > 0 else 0.0
         ventas_por_mes.append({
             'mes': f"{year}-{month:02d}",
-            'mes_nombre': f"{meses_nombres.get(month, str(month))} {year}",
+            'mes_nombre': f"{MESES_NOMBRES.get(month, str(month))} {year}",
             'total': round(total, 2),
             'cantidad': cantidad,
             'crecimiento': round(crecimiento, 2),
@@ -124,16 +146,23 @@ def obtener_metricas_y_series(filtros: Dict[str, Any]) -> Dict[str, Any]:
     ]
 
     # Tipos de cliente por número de órdenes en el periodo
-    customers = (
-        User.objects
-        .filter(orders__in=orders)
-        .annotate(num_orders=Count('orders'))
-        .values('id', 'username', 'num_orders')
+    clasificacion = (
+        orders
+        .filter(customer__isnull=False)
+        .values('customer')
+        .annotate(num_orders=Count('id'))
+        .aggregate(
+            nuevos=Count('customer', filter=Q(num_orders=1)),
+            recurrentes=Count('customer', filter=Q(num_orders__gte=2, num_orders__lte=5)),
+            vip=Count('customer', filter=Q(num_orders__gte=6)),
+        )
     )
-    nuevos = sum(1 for c in customers if c['num_orders'] == 1)
-    recurrentes = sum(1 for c in customers if 2 <= (c['num_orders'] or 0) <= 5)
-    vip = sum(1 for c in customers if (c['num_orders'] or 0) >= 6)
-    total_clasificados = max(nuevos + recurrentes + vip, 1)
+    nuevos = clasificacion['nuevos'] or 0
+    recurrentes = clasificacion['recurrentes'] or 0
+    vip = clasificacion['vip'] or 0
+    # Cada cliente con órdenes cae en exactamente un tipo: evita un COUNT(DISTINCT) aparte
+    total_clientes = nuevos + recurrentes + vip
+    total_clasificados = max(total_clientes, 1)
     tipos_cliente = [
         {'tipo': 'nuevo', 'cantidad': nuevos, 'porcentaje': round(nuevos / total_clasificados * 100, 2)},
         {'tipo': 'recurrente', 'cantidad': recurrentes, 'porcentaje': round(recurrentes / total_clasificados * 100, 2)},
@@ -160,30 +189,52 @@ def obtener_metricas_y_series(filtros: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+def _get_slice(filtros: Dict[str, Any]) -> Tuple[int, int | None]:
+    """Lee offset/limit opcionales de los filtros (paginación de exportaciones)."""
+    try:
+        offset = max(int(filtros.get('offset') or 0), 0)
+    except (TypeError, ValueError):
+        offset = 0
+    try:
+        limit = int(filtros['limit']) if filtros.get('limit') else None
+    except (TypeError, ValueError):
+        limit = None
+    if limit is not None and limit <= 0:
+        limit = None
+    return offset, limit
+
+
 def construir_datos_ventas(filtros: Dict[str, Any]) -> Tuple[List[str], List[List[Any]], Dict[str, Any]]:
-    """Construye datos tabulares de ventas desde OrderItem."""
+    """Construye datos tabulares de ventas desde OrderItem (paginable con offset/limit)."""
     start_dt, end_dt = _get_period(filtros.get('fecha_inicio'), filtros.get('fecha_fin'))
+    offset, limit = _get_slice(filtros)
     items = (
         OrderItem.objects
         .select_related('order', 'product', 'order__customer')
         .filter(order__status=Order.OrderStatus.COMPLETED,
                 order__created_at__gte=start_dt,
                 order__created_at__lte=end_dt)
-        .order_by('-order__created_at')
+        .annotate(subtotal=ExpressionWrapper(
+            F('quantity') * F('price'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ))
+        .order_by('-order__created_at', 'pk')
     )
+    # Total de todo el periodo calculado en la base de datos (no solo de la página)
+    total_general = items.aggregate(total=Sum('subtotal'))['total'] or 0
+
+    page = items[offset:offset + limit] if limit is not None else items[offset:]
     headers = ['Fecha', 'Cliente', 'Producto', 'Cantidad', 'Precio (Bs)', 'Total (Bs)']
     rows: List[List[Any]] = []
-    total_general = 0.0
-    for it in items:
-        total = float(it.quantity * it.price)
-        total_general += total
+    # iterator(): lee del cursor por bloques sin cachear todo el queryset en memoria
+    for it in page.iterator(chunk_size=2000):
         rows.append([
             it.order.created_at.strftime('%d/%m/%Y'),
             getattr(it.order.customer, 'username', 'N/A'),
             it.product.name,
             int(it.quantity),
-            f"Bs {float(it.price):.2f}",
-            f"Bs {total:.2f}",
+            f"Bs {it.price:.2f}",
+            f"Bs {it.subtotal:.2f}",
         ])
     totals = {'total_general': f"Bs {total_general:.2f}", 'registros': len(rows)}
     return headers, rows, totals
@@ -192,35 +243,31 @@ def construir_datos_ventas(filtros: Dict[str, Any]) -> Tuple[List[str], List[Lis
 def construir_datos_clientes(filtros: Dict[str, Any]) -> Tuple[List[str], List[List[Any]], Dict[str, Any]]:
     """Resumen por cliente (número de órdenes completadas y total gastado)."""
     start_dt, end_dt = _get_period(filtros.get('fecha_inicio'), filtros.get('fecha_fin'))
-    orders = Order.objects.filter(status=Order.OrderStatus.COMPLETED,
-                                  created_at__gte=start_dt, created_at__lte=end_dt).select_related('customer')
-    by_user: Dict[int, Dict[str, Any]] = {}
-    for o in orders:
-        if not o.customer:
-            continue
-        uid = o.customer.pk
-        if uid not in by_user:
-            by_user[uid] = {
-                'username': o.customer.username,
-                'num_ordenes': 0,
-                'total_gastado': 0.0,
-                'ultima_compra': o.created_at,
-            }
-        udata = by_user[uid]
-        udata['num_ordenes'] += 1
-        udata['total_gastado'] += float(o.total_price or 0)
-        if o.created_at and o.created_at > udata['ultima_compra']:
-            udata['ultima_compra'] = o.created_at
+    # Agrupado por cliente en la base de datos; los más recientes primero
+    by_user = (
+        Order.objects
+        .filter(status=Order.OrderStatus.COMPLETED,
+                created_at__gte=start_dt, created_at__lte=end_dt,
+                customer__isnull=False)
+        .values('customer_id', 'customer__username')
+        .annotate(
+            num_ordenes=Count('id'),
+            total_gastado=Sum('total_price'),
+            ultima_compra=Max('created_at'),
+        )
+        .order_by('-ultima_compra', 'customer_id')
+    )
 
     headers = ['Cliente', 'Órdenes', 'Total Gastado (Bs)', 'Última Compra']
     rows: List[List[Any]] = []
-    total_gastado = 0.0
-    for data in by_user.values():
-        total_gastado += data['total_gastado']
+    total_gastado = 0
+    for data in by_user:
+        gastado = data['total_gastado'] or 0
+        total_gastado += gastado
         rows.append([
-            data['username'],
+            data['customer__username'],
             data['num_ordenes'],
-            f"Bs {data['total_gastado']:.2f}",
+            f"Bs {gastado:.2f}",
             data['ultima_compra'].strftime('%d/%m/%Y') if data['ultima_compra'] else 'N/A',
         ])
     totals = {'total_gastado': f"Bs {total_gastado:.2f}", 'clientes': len(rows)}
@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Order, OrderItem, PaymentMethod # Importar PaymentMethod
 from products.serializers import ProductSerializer
@@ -36,4 +37,25 @@ class OrderSerializer(serializers.ModelSerializer):
             'payment_method', 'payment_method_detail', 
             'created_at', 'items'
         ]
-        read_only_fields = ['customer', 'status', 'total_price', 'created_at']
\ No newline at end of file
+        read_only_fields = ['customer', 'status', 'total_price', 'created_at']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Carga por adelantado las relaciones que este serializador recorre
+        (cliente con su perfil, método de pago e items con su producto),
+        evitando consultas N+1 al listar órdenes.
+        """
+        items = OrderItem.objects.select_related(
+            'product__category', 'product__brand', 'product__warranty'
+        )
+        return queryset.select_related(
+            'customer__profile', 'payment_method'
+        ).prefetch_related(
+            Prefetch('items', queryset=items)
+        ).only(
+            'id', 'customer', 'status', 'total_price', 'payment_method', 'created_at',
+            'customer__id', 'customer__username', 'customer__email', 'customer__first_name',
+            'customer__last_name', 'customer__is_staff', 'customer__is_superuser',
+            'customer__profile', 'payment_method__id', 'payment_method__name', 'payment_method__is_active',
+        )
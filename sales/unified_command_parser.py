@@ -4,15 +4,213 @@ Sistema Unificado de Análisis de Comandos Inteligentes
 Combina las mejores características de prompt_parser.py e intelligent_report_router.py
 """
 
+import calendar
+import itertools
 import re
+import string
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from functools import cached_property, lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils import timezone
 import logging
 import unicodedata
 
 logger = logging.getLogger(__name__)
 
+# Vocales acentuadas y eñe -> letra base (equivale a NFD sin diacríticos)
+_ACCENT_TABLE = str.maketrans('áéíóúüñÁÉÍÓÚÜÑ', 'aeiouunAEIOUUN')
+
+# Minúsculas ASCII + vocales acentuadas/eñe -> letra base en minúscula (una sola pasada)
+_NORMALIZE_TABLE = str.maketrans(
+    string.ascii_uppercase + 'áéíóúüñÁÉÍÓÚÜÑ',
+    string.ascii_lowercase + 'aeiouunaeiouun'
+)
+
+# Patrones de fechas compilados una sola vez (usados por _extract_dates)
+_RANGE_BOTH_WORDS = re.compile(r'del?\s+(\w+)\s+al?\s+(\w+)\s+de\s+(\w+)')
+_RANGE_WORD_DIGIT = re.compile(r'del?\s+(\w+)(?:\s+de\s+(\w+))?\s+al?\s+(\d{1,2})\s+de\s+(\w+)')
+_RANGE_MONTH = re.compile(r'del?\s+(\d{1,2})(?:\s+de\s+(\w+))?\s+al?\s+(\d{1,2})\s+de\s+(\w+)')
+_SPECIFIC_DAY_WORD = re.compile(r'(?:del?\s+)?(\w+)\s+de\s+(\w+)')
+_SPECIFIC_DAY = re.compile(r'(?:del?\s+)?(\d{1,2})\s+de\s+(\w+)')
+_SHORT_DATE = re.compile(r'(?:del?\s+)?(\d{1,2}[/-]\d{1,2})(?:[/-](\d{2,4}))?')
+_LAST_N_DAYS = re.compile(r'(?:ultimos?|pasados?|last)\s+(\d+)\s+(?:dias?|days?)')
+_DATE_RANGE = re.compile(r'del?\s+(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+al?\s+(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})')
+_YEAR = re.compile(r'(?:del?\s+)?año\s+(\d{4})')
+# Alternancia de las estrategias de día/rango (0a, 0b, 1, 2a, 2b) en una sola pasada
+_DAY_STRATEGIES = re.compile('|'.join(
+    f'(?P<{name}>{pattern.pattern})' for name, pattern in (
+        ('both_words', _RANGE_BOTH_WORDS),
+        ('word_digit', _RANGE_WORD_DIGIT),
+        ('digit_range', _RANGE_MONTH),
+        ('day_word', _SPECIFIC_DAY_WORD),
+        ('day_digit', _SPECIFIC_DAY),
+    )
+))
+# Indicios de fecha que no son meses ni números en palabras (ver _extract_dates)
+_DATE_GATE = re.compile(r'\d|mes|semana|hoy|today|ano')
+
+# Patrones de parámetros adicionales (_extract_additional_params)
+_DIGIT_UNIT = re.compile(r'(?:para|de|proximo|proximos|siguiente|siguientes)?\s*(\d+)\s+(dia|dias|day|days|semana|semanas|week|weeks|mes|meses|month|months|ano|anos|year|years)')
+_WORD_UNIT = re.compile(r'(?:para|de|proximo|proximos|siguiente|siguientes)?\s*(\w+)\s+(dia|dias|semana|semanas|mes|meses|ano|anos)')
+_IMPLICIT_UNIT = re.compile(r'(?:proxima|siguiente)\s+(semana|semanas|mes|meses|ano|anos)')
+
+# Patrones de filtros numéricos (_extract_numeric_filters)
+_TOP = re.compile(r'(?:top|mejores|primeros)\s+(\d+)')
+_TOP_WORD = re.compile(r'(?:top|mejores|primeros)\s+(\w+)')
+_GREATER = re.compile(r'(?:mayor(?:es)?|mas)\s+(?:a|de|que)\s+(\d+(?:\.\d+)?)')
+_LESS = re.compile(r'(?:menor(?:es)?|menos)\s+(?:a|de|que)\s+(\d+(?:\.\d+)?)')
+_BETWEEN = re.compile(r'entre\s+(\d+(?:\.\d+)?)\s+y\s+(\d+(?:\.\d+)?)')
+
+# Patrones de alertas (_detect_alert_command)
+_ALERT_THRESHOLD = re.compile(r'(?:menor|menos|bajo)\s+(?:de|a|que)\s+(\d+)')
+_ALERT_PERCENTAGE = re.compile(r'(\d+)\s*%')
+_ALERT_HOUR = re.compile(r'(\d{1,2})\s*(?:am|pm|hs|horas)')
+_ALERT_DAY_OF_MONTH = re.compile(r'dia\s+(\d{1,2})')
+
+
+# Días por mes (febrero bisiesto se resuelve en _is_valid_day)
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _is_valid_day(year: int, month: int, day: int) -> bool:
+    """
+    Indica si el día existe en ese mes, sin construir el datetime
+    (equivale a que datetime(year, month, day) no lance ValueError)
+    """
+    if not 1 <= month <= 12 or day < 1:
+        return False
+    if month == 2 and calendar.isleap(year):
+        return day <= 29
+    return day <= _DAYS_IN_MONTH[month - 1]
+
+
+def _keyword_trie_pattern(keywords) -> re.Pattern:
+    """
+    Construye una expresión regular con forma de trie (prefijos compartidos).
+
+    Evaluada en cada posición del texto (lookahead), captura la keyword más
+    larga que empieza ahí; es el equivalente a un autómata Aho-Corasick
+    usando el motor de regex en C.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = None  # Fin de keyword
+
+    def to_regex(node):
+        branches = [re.escape(char) + to_regex(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        optional = '' in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if optional else '')
+
+    body = to_regex(trie)
+    # Sin keywords: patrón que nunca coincide
+    return re.compile('(?=(' + body + '))' if body else '(?!)')
+
+
+class _KeywordScanner:
+    """
+    Encuentra en una sola pasada todas las keywords contenidas en un texto
+    (misma semántica que evaluar `keyword in text` para cada una).
+    """
+
+    def __init__(self, keywords):
+        keywords = set(keywords)
+        self._pattern = _keyword_trie_pattern(keywords)
+        # Si la keyword más larga coincide en una posición, también lo hacen sus prefijos
+        self._prefixes = {
+            keyword: tuple(
+                keyword[:end] for end in range(1, len(keyword) + 1) if keyword[:end] in keywords
+            )
+            for keyword in keywords
+        }
+
+    def scan(self, text: str) -> set:
+        found = set()
+        for match in self._pattern.finditer(text):
+            found.update(self._prefixes[match.group(1)])
+        return found
+
+    def matches(self, text: str) -> '_KeywordMatches':
+        return _KeywordMatches(self.scan(text), self._prefixes, text)
+
+    def starting(self, text: str) -> tuple:
+        """
+        Keywords con las que empieza el texto (equivale a `text.startswith(keyword)`):
+        la más larga anclada al inicio y sus prefijos.
+        """
+        match = self._pattern.match(text)
+        return self._prefixes[match.group(1)] if match else ()
+
+
+class _KeywordMatches:
+    """
+    Resultado de un escaneo: `phrase in matches` equivale a `phrase in text`.
+    Las frases fuera del vocabulario del scanner se buscan directamente en el texto.
+    """
+
+    __slots__ = ('_found', '_vocabulary', '_text')
+
+    def __init__(self, found: set, vocabulary, text: str):
+        self._found = found
+        self._vocabulary = vocabulary
+        self._text = text
+
+    def __contains__(self, phrase: str) -> bool:
+        if phrase in self._vocabulary:
+            return phrase in self._found
+        return phrase in self._text
+
+    def __iter__(self):
+        """Itera solo las frases del vocabulario encontradas"""
+        return iter(self._found)
+
+
+class _CatalogArrays(NamedTuple):
+    """
+    REPORT_CATALOG en arreglos paralelos (estructura de arreglos) indexados
+    por id de reporte, más el índice de keywords usado en el scoring.
+    """
+    keys: Tuple[str, ...]
+    names: Tuple[str, ...]
+    descriptions: Tuple[str, ...]
+    supports_ml: Tuple[bool, ...]
+    formats: Tuple[List[str], ...]
+    priority_factors: Tuple[float, ...]
+    keyword_index: Dict[str, Tuple[Tuple[int, ...], int]]
+    scanner: _KeywordScanner
+    default_id: int
+
+
+class _DateContext(NamedTuple):
+    """
+    Fechas de referencia derivadas de timezone.now(), calculadas una vez por parsing
+    y compartidas por las estrategias de fechas y de comparación.
+    """
+    today: datetime
+    start_of_day: datetime
+    start_of_week: datetime
+    start_of_month: datetime
+
+
+@lru_cache(maxsize=256)
+def _month_bounds(year: int, month: int, tz) -> Tuple[datetime, datetime]:
+    """Primer instante y último segundo del mes en la zona horaria dada"""
+    start = datetime(year, month, 1, 0, 0, 0, tzinfo=tz)
+    if month == 12:
+        end = datetime(year, 12, 31, 23, 59, 59, tzinfo=tz)
+    else:
+        end = datetime(year, month + 1, 1, 0, 0, 0, tzinfo=tz) - timedelta(seconds=1)
+    return start, end
+
 
 class UnifiedCommandParser:
     """
@@ -140,6 +338,73 @@ class UnifiedCommandParser:
         }
     }
 
+    # Keywords de formato en orden de prioridad. Solo se listan las mínimas:
+    # 'en pdf'/'formato pdf' contienen 'pdf' y 'xlsx'/'en excel' contienen 'xls'/'excel'
+    _FORMAT_KEYWORDS = (
+        ('pdf', ('pdf',)),
+        ('excel', ('excel', 'xls', 'hoja de calculo', 'spreadsheet')),
+    )
+
+    # Agrupaciones (la primera que coincide gana)
+    _GROUPING_KEYWORDS = {
+        'product': ('por producto', 'por productos', 'agrupado por producto', 'de producto', 'de productos'),
+        'client': ('por cliente', 'por clientes', 'agrupado por cliente', 'de cliente', 'de clientes', 'por usuario'),
+        'category': ('por categoria', 'por categorias', 'agrupado por categoria'),
+        'date': ('por fecha', 'por dia', 'diario', 'diarios', 'por fechas', 'por dias')
+    }
+
+    # Monedas en orden de prioridad
+    _CURRENCY_KEYWORDS = (
+        ('USD', ('dolar', 'dolares', 'usd', '$')),
+        ('MXN', ('peso', 'pesos', 'mxn')),
+        ('PEN', ('sol', 'soles', 'pen')),
+        ('EUR', ('euro', 'euros', 'eur', '€')),
+    )
+
+    # Períodos relativos a hoy (estrategias 8-10 de _extract_dates), en orden de prioridad.
+    # 'la semana anterior'/'la semana pasada' contienen 'semana anterior'/'semana pasada'
+    _RELATIVE_PERIODS = (
+        ('_set_current_month', ('este mes', 'mes actual')),
+        ('_set_current_week', ('esta semana', 'semana actual')),
+        ('_set_last_week', ('semana anterior', 'semana pasada')),
+        ('_set_today', ('hoy', 'today')),
+    )
+
+    # Palabras que convierten el comando en una alerta/programación
+    _ALERT_KEYWORDS = (
+        # Notificaciones
+        'avisame', 'avisa', 'notificame', 'notifica', 'alertame', 'alerta',
+        # Programación
+        'cada dia', 'cada semana', 'cada mes', 'cada lunes', 'cada martes',
+        'diario', 'semanal', 'mensual',
+        # Condicionales
+        'cuando', 'si', 'en caso de'
+    )
+
+    # Días de la semana para alertas semanales
+    _WEEKDAYS = {
+        'lunes': 0, 'martes': 1, 'miercoles': 2, 'jueves': 3,
+        'viernes': 4, 'sabado': 5, 'domingo': 6
+    }
+
+    # Otras frases fijas que se consultan durante el parsing (fechas,
+    # comparaciones y alertas); se detectan todas en un solo escaneo
+    _SCAN_PHRASES = (
+        # Fechas
+        'ultimo mes', 'mes pasado', 'últi', 'mes', 'este mes', 'mes actual',
+        'esta semana', 'semana actual', 'semana anterior', 'semana pasada',
+        'la semana anterior', 'la semana pasada', 'hoy', 'today',
+        # Comparaciones
+        'respecto al mes pasado', 'versus mes pasado', 'vs mes pasado', 'contra mes pasado',
+        'comparado con mes pasado', 'esta semana versus semana', 'esta semana vs semana',
+        'semana actual contra semana', 'esta semana comparado con semana',
+        'ano actual vs ano', 'este ano versus ano', 'ano actual contra ano',
+        # Alertas
+        'avisame cuando', 'notificame cuando', 'alertame cuando', 'stock bajo', 'bajo stock',
+        'stock este bajo', 'ventas caen', 'ventas bajen', 'caida de ventas', 'sin stock',
+        'inventario cero', 'todos los dias', 'todas las semanas', 'todos los meses',
+    )
+
     # Sinónimos extendidos para mejor detección
     SYNONYMS = {
         'reporte': ['informe', 'report', 'reporte', 'reportar', 'genera', 'generar', 'dame', 'mostrar', 'muestra'],
@@ -157,6 +422,13 @@ class UnifiedCommandParser:
         'septiembre': 9, 'octubre': 10, 'noviembre': 11, 'diciembre': 12
     }
 
+    # Alternancias precompiladas: permiten descartar estrategias sin candidatos
+    _MONTHS_ALT = re.compile(r'\b(?:' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + ')')
+
+    # Mes completo ("mes de X", "todo X", "completo de X") y día específico ("DD de X")
+    _MONTH_FULL = re.compile(r'(?=(?:mes de|todo|completo de) (' + '|'.join(MONTHS) + '))')
+    _MONTH_WITH_DAY = re.compile(r'\d{1,2}\s+de\s+(' + '|'.join(MONTHS) + ')')
+
     # Números en palabras (español)
     NUMBER_WORDS = {
         'un': 1, 'uno': 1, 'una': 1,
@@ -200,6 +472,14 @@ class UnifiedCommandParser:
         'noveno': 9, 'novena': 9,
         'decimo': 10, 'decima': 10,
     }
+    # "[número en palabras] [unidad]" -> (orden de búsqueda, número, unidad)
+    _NUMBER_UNIT_PHRASES = {
+        f"{number_word} {unit_word}": (order, number_value, unit_word)
+        for order, ((number_word, number_value), unit_word) in enumerate(itertools.product(
+            NUMBER_WORDS.items(), ('dia', 'dias', 'semana', 'semanas', 'mes', 'meses', 'ano', 'anos')
+        ))
+    }
+    _NUMBER_WORDS_ALT = re.compile(r'\b(?:' + '|'.join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r')\b')
 
     @staticmethod
     def _remove_accents(text: str) -> str:
@@ -213,11 +493,32 @@ class UnifiedCommandParser:
         Returns:
             Texto sin acentos
         """
-        # Normalizar a NFD (descompone caracteres acentuados)
+        # Caso común (tildes del español): tabla de traducción en C
+        text = text.translate(_ACCENT_TABLE)
+        if text.isascii():
+            return text
+
+        # Otros diacríticos: normalizar a NFD (descompone caracteres acentuados)
         nfd = unicodedata.normalize('NFD', text)
         # Filtrar solo caracteres no-diacríticos (sin tildes)
         return ''.join(char for char in nfd if unicodedata.category(char) != 'Mn')
 
+    @classmethod
+    @lru_cache(maxsize=1024)
+    def _normalize(cls, command: str) -> str:
+        """
+        Normaliza el comando: lowercase, strip y sin acentos.
+
+        Para texto en español basta una sola traducción con tabla; cualquier
+        otro carácter no ASCII usa el camino completo (lower + NFD). Se cachea
+        por comando: los comandos repetidos (reintentos, consultas por defecto)
+        no se vuelven a normalizar.
+        """
+        normalized = command.translate(_NORMALIZE_TABLE)
+        if normalized.isascii():
+            return normalized.strip()
+        return cls._remove_accents(command.lower().strip())
+
     def __init__(self, command: str):
         """
         Inicializa el parser con un comando de texto
@@ -226,8 +527,13 @@ class UnifiedCommandParser:
             command: Comando en lenguaje natural
         """
         # Normalizar: lowercase, strip, y remover acentos
-        self.command = self._remove_accents(command.lower().strip())
+        self.command = self._normalize(command)
         self.original_command = command.strip()
+        # Fecha/hora de referencia: una sola lectura del reloj por parsing
+        self._now = timezone.now()
+        self._now_year, self._now_month = self._now.year, self._now.month
+        # Zona horaria para las fechas construidas (equivale a timezone.make_aware)
+        self._tz = timezone.get_current_timezone()
         self.result = {
             'success': True,
             'report_type': None,
@@ -248,32 +554,20 @@ class UnifiedCommandParser:
             dict: Resultado del análisis con tipo de reporte y parámetros
         """
         try:
-            # 1. Identificar el tipo de reporte
-            self._identify_report_type()
+            # Los pasos se ejecutan en secuencia: cada uno tarda microsegundos y
+            # despacharlos a un pool de hilos cuesta más que ejecutarlos (GIL)
 
-            # 2. Extraer formato de salida
-            self._extract_format()
+            # 1, 2, 4, 5, 6 y 8: pasos que dependen solo del comando (memoizados)
+            self.result = _copy_result(_parse_command_steps(type(self), self.command))
 
             # 3. Extraer fechas y rangos (SOLO si NO es un reporte ML de predicciones)
             # Las predicciones ML no usan fechas del pasado, predicen el futuro
             if not self.result['params'].get('supports_ml'):
                 self._extract_dates()
 
-            # 4. Extraer agrupación
-            self._extract_grouping()
-
-            # 5. Extraer parámetros adicionales
-            self._extract_additional_params()
-
-            # 6. Extraer filtros numéricos (top N, mayor/menor a X, entre X y Y)
-            self._extract_numeric_filters()
-
             # 7. Detectar períodos de comparación implícitos (si es comparativo_temporal)
             self._detect_comparison_periods()
 
-            # 8. Detectar si es un comando de alerta/programación
-            self._detect_alert_command()
-
             # 9. Calcular confianza final
             self._calculate_confidence()
 
@@ -337,52 +631,187 @@ class UnifiedCommandParser:
         # No es parcial o no se pudo fusionar, parsear normalmente
         return self.parse()
 
+    @classmethod
+    def _phrase_scanner(cls) -> _KeywordScanner:
+        """
+        Scanner sobre todas las frases fijas que consultan los pasos del parsing.
+        Se construye una sola vez por clase.
+        """
+        cached = cls.__dict__.get('_PHRASE_SCANNER')
+        if cached is None:
+            phrases = set(cls._SCAN_PHRASES)
+            phrases.update(cls.MONTHS, cls._WEEKDAYS, cls._NUMBER_UNIT_PHRASES, cls._ALERT_KEYWORDS)
+            for _, keywords in cls._FORMAT_KEYWORDS + cls._CURRENCY_KEYWORDS + cls._RELATIVE_PERIODS:
+                phrases.update(keywords)
+            for keywords in cls._GROUPING_KEYWORDS.values():
+                phrases.update(keywords)
+            cached = _KeywordScanner(phrases)
+            cls._PHRASE_SCANNER = cached
+        return cached
+
+    @cached_property
+    def _phrases(self) -> _KeywordMatches:
+        """
+        Frases presentes en el comando, detectadas en un solo recorrido.
+        `frase in self._phrases` equivale a `frase in self.command`.
+        """
+        return self._phrase_scanner().matches(self.command)
+
+    @cached_property
+    def _dates(self) -> _DateContext:
+        """Inicio del día, de la semana (lunes) y del mes respecto a self._now"""
+        today = self._now
+        start_of_day = today.replace(hour=0, minute=0, second=0, microsecond=0)
+        return _DateContext(
+            today=today,
+            start_of_day=start_of_day,
+            start_of_week=start_of_day - timedelta(days=today.weekday()),
+            start_of_month=start_of_day.replace(day=1),
+        )
+
+    @classmethod
+    def _keyword_tags(cls) -> Dict[str, Tuple[Tuple[str, int, Any], ...]]:
+        """
+        Keyword -> etiquetas (categoría, prioridad, valor) para formato,
+        agrupación, moneda, alerta, período relativo y "número unidad". Se construye una sola vez por clase.
+        """
+        cached = cls.__dict__.get('_KEYWORD_TAGS')
+        if cached is None:
+            tags: Dict[str, List[Tuple[str, int, Any]]] = {}
+            tables = (
+                ('format', cls._FORMAT_KEYWORDS),
+                ('group', tuple(cls._GROUPING_KEYWORDS.items())),
+                ('currency', cls._CURRENCY_KEYWORDS),
+                ('alert', (('alert', cls._ALERT_KEYWORDS),)),
+                ('period', cls._RELATIVE_PERIODS),
+            )
+            for tag, table in tables:
+                for rank, (value, keywords) in enumerate(table):
+                    for keyword in keywords:
+                        tags.setdefault(keyword, []).append((tag, rank, value))
+            # Combinaciones "número unidad" (estrategia 4 de ML): prioridad = orden de NUMBER_WORDS
+            for phrase, (order, number_value, unit_word) in cls._NUMBER_UNIT_PHRASES.items():
+                tags.setdefault(phrase, []).append(('number_unit', order, (number_value, unit_word)))
+            cached = {keyword: tuple(entries) for keyword, entries in tags.items()}
+            cls._KEYWORD_TAGS = cached
+        return cached
+
+    @cached_property
+    def _hits(self) -> Dict[str, Any]:
+        """
+        Categoría -> valor de mayor prioridad presente en el comando
+        (ej: {'format': 'pdf', 'group': 'product'}), a partir del mismo escaneo.
+        """
+        keyword_tags = self._keyword_tags()
+        best: Dict[str, Tuple[int, Any]] = {}
+        for phrase in self._phrases:
+            for tag, rank, value in keyword_tags.get(phrase, ()):
+                if tag not in best or rank < best[tag][0]:
+                    best[tag] = (rank, value)
+        return {tag: value for tag, (_, value) in best.items()}
+
+    @classmethod
+    def _catalog_arrays(cls) -> '_CatalogArrays':
+        """
+        Catálogo en arreglos paralelos indexados por id de reporte (orden del
+        catálogo), más el índice de keywords para el scoring.
+
+        Se construye una sola vez por clase, especializado para los reportes
+        habilitados en settings.UNIFIED_PARSER_ENABLED_REPORTS (todos si está
+        vacío): los reportes deshabilitados no se escanean ni puntúan. Si el
+        setting cambia (override_settings) se reconstruye, ver _reset_report_catalog.
+        """
+        cached = cls.__dict__.get('_CATALOG_ARRAYS')
+        if cached is None:
+            enabled = getattr(settings, 'UNIFIED_PARSER_ENABLED_REPORTS', None)
+            catalog = {
+                report_key: report_info for report_key, report_info in cls.REPORT_CATALOG.items()
+                if not enabled or report_key in enabled
+            }
+            if enabled and len(catalog) != len(set(enabled)):
+                unknown = sorted(set(enabled) - set(cls.REPORT_CATALOG))
+                logger.warning(f"UNIFIED_PARSER_ENABLED_REPORTS contiene reportes desconocidos: {unknown}")
+            if not catalog:
+                catalog = dict(cls.REPORT_CATALOG)
+            infos = list(catalog.values())
+
+            # Cinta plana (keyword, id de reporte, peso base); más peso a las
+            # keywords más específicas (más largas)
+            keyword_tape = [
+                (keyword, report_id, len(keyword.split()) * 2)
+                for report_id, info in enumerate(infos)
+                for keyword in info['keywords']
+            ]
+            keyword_index = {}
+            for keyword, report_id, weight in keyword_tape:
+                report_ids, _ = keyword_index.get(keyword, ((), weight))
+                keyword_index[keyword] = (report_ids + (report_id,), weight)
+
+            cached = _CatalogArrays(
+                keys=tuple(catalog),
+                names=tuple(info['name'] for info in infos),
+                descriptions=tuple(info['description'] for info in infos),
+                supports_ml=tuple(info['supports_ml'] for info in infos),
+                formats=tuple(info['formats'] for info in infos),
+                priority_factors=tuple(info['priority'] / 10.0 for info in infos),
+                keyword_index=keyword_index,
+                scanner=_KeywordScanner(keyword_index),
+                # Reporte por defecto: ventas_basico, o el primero habilitado
+                default_id=list(catalog).index('ventas_basico') if 'ventas_basico' in catalog else 0,
+            )
+            cls._CATALOG_ARRAYS = cached
+        return cached
+
     def _identify_report_type(self):
         """
         Identifica el tipo de reporte basándose en keywords con scoring inteligente
         """
-        best_match = None
+        best_id = None
         best_score = 0
         alternatives = []
 
-        for report_key, report_info in self.REPORT_CATALOG.items():
-            score = 0
-            
-            # Verificar coincidencias de keywords
-            for keyword in report_info['keywords']:
-                if keyword in self.command:
-                    # Dar más peso a keywords más específicas (más largas)
-                    keyword_weight = len(keyword.split()) * 2
-                    # Bonus si la keyword aparece al principio
-                    if self.command.startswith(keyword):
-                        keyword_weight *= 1.5
-                    score += keyword_weight
-            
+        # Una sola pasada sobre el comando encuentra todas las keywords del catálogo.
+        # El costo no depende del orden de las keywords (no hay corte anticipado que
+        # ordenar por frecuencia); los comandos frecuentes ya se sirven desde la
+        # caché de _parse_command_steps.
+        catalog = self._catalog_arrays()
+        scores = [0] * len(catalog.keys)
+        starting_keywords = catalog.scanner.starting(self.command)
+        for keyword in catalog.scanner.scan(self.command):
+            report_ids, keyword_weight = catalog.keyword_index[keyword]
+            # Bonus si la keyword aparece al principio
+            if keyword in starting_keywords:
+                keyword_weight *= 1.5
+            for report_id in report_ids:
+                scores[report_id] += keyword_weight
+
+        for report_id, score in enumerate(scores):
             # Aplicar prioridad del reporte
-            score *= (report_info['priority'] / 10.0)
-            
+            score *= catalog.priority_factors[report_id]
+            if score <= 0:
+                continue
+
             # Guardar alternativas con puntuación > 0
-            if score > 0:
-                alternatives.append({
-                    'type': report_key,
-                    'name': report_info['name'],
-                    'score': score,
-                    'confidence': min(score / 15.0, 1.0)
-                })
-            
+            alternatives.append({
+                'type': catalog.keys[report_id],
+                'name': catalog.names[report_id],
+                'score': score,
+                'confidence': min(score / 15.0, 1.0)
+            })
+
             # Actualizar mejor match
             if score > best_score:
                 best_score = score
-                best_match = (report_key, report_info)
+                best_id = report_id
 
-        if best_match:
-            report_key, report_info = best_match
+        if best_id is not None:
+            report_key = catalog.keys[best_id]
             self.result['report_type'] = report_key
-            self.result['report_name'] = report_info['name']
-            self.result['description'] = report_info['description']
-            self.result['params']['supports_ml'] = report_info['supports_ml']
-            self.result['params']['available_formats'] = report_info['formats']
-            
+            self.result['report_name'] = catalog.names[best_id]
+            self.result['description'] = catalog.descriptions[best_id]
+            self.result['params']['supports_ml'] = catalog.supports_ml[best_id]
+            self.result['params']['available_formats'] = catalog.formats[best_id]
+
             # Ordenar alternativas por score
             alternatives.sort(key=lambda x: x['score'], reverse=True)
             # Eliminar el match principal de las alternativas
@@ -391,46 +820,54 @@ class UnifiedCommandParser:
                 for alt in alternatives if alt['type'] != report_key
             ][:3]
         else:
-            # Por defecto: reporte básico de ventas
-            self.result['report_type'] = 'ventas_basico'
-            self.result['report_name'] = 'Reporte Básico de Ventas'
-            self.result['description'] = 'Ventas generales (opción por defecto)'
-            self.result['params']['supports_ml'] = False
-            self.result['params']['available_formats'] = ['json', 'pdf', 'excel']
+            # Por defecto: reporte básico de ventas (o el primero habilitado)
+            default_id = catalog.default_id
+            report_key = catalog.keys[default_id]
+            self.result['report_type'] = report_key
+            self.result['report_name'] = catalog.names[default_id]
+            if report_key == 'ventas_basico':
+                self.result['description'] = 'Ventas generales (opción por defecto)'
+            else:
+                self.result['description'] = f"{catalog.descriptions[default_id]} (opción por defecto)"
+            self.result['params']['supports_ml'] = catalog.supports_ml[default_id]
+            self.result['params']['available_formats'] = catalog.formats[default_id]
 
     def _extract_format(self):
         """
         Extrae el formato de salida solicitado
         """
-        format_keywords = {
-            'pdf': ['pdf', 'en pdf', 'formato pdf'],
-            'excel': ['excel', 'xls', 'xlsx', 'en excel', 'hoja de calculo', 'spreadsheet'],
-            'json': ['json', 'pantalla', 'screen', 'en pantalla', 'datos', 'api']
-        }
-        
-        for format_type, keywords in format_keywords.items():
-            for keyword in keywords:
-                if keyword in self.command:
-                    self.result['format'] = format_type
-                    return
-        
-        # Por defecto JSON
-        self.result['format'] = 'json'
+        # Por defecto JSON (también para 'json', 'pantalla', 'screen', 'datos', 'api')
+        self.result['format'] = self._hits.get('format', 'json')
 
     def _extract_dates(self):
         """
         Extrae fechas y rangos de tiempo con múltiples estrategias.
         ORDEN IMPORTANTE: De más específico a más general.
         """
+        # Presencia de un mes o de un número en palabras: sin ellos, las
+        # estrategias que los requieren no pueden coincidir
+        has_month = self._MONTHS_ALT.search(self.command) is not None
+        has_number_word = self._NUMBER_WORDS_ALT.search(self.command) is not None
+
+        # Sin dígitos, meses, números en palabras ni palabras clave de período
+        # ninguna estrategia puede coincidir: usar directamente el valor por defecto
+        if not (has_month or has_number_word or _DATE_GATE.search(self.command)):
+            self._set_default_period()
+            return
+
         # ===== ESTRATEGIAS MÁS ESPECÍFICAS (DÍAS EXACTOS) =====
 
+        # Una búsqueda combinada de las estrategias 0a-2b: si no coincide se omiten
+        # todas, y si coincide ninguna puede empezar antes de esa posición
+        day_match = _DAY_STRATEGIES.search(self.command)
+        day_pos = day_match.start() if day_match else 0
+
         # Estrategia 0a: "del [palabra] al [palabra] de mes" (ambos números en palabras)
         # Ej: "del primero al quince de octubre", "del primero al diez de octubre"
-        range_both_words_pattern = r'del?\s+(\w+)\s+al?\s+(\w+)\s+de\s+(\w+)'
-        match = re.search(range_both_words_pattern, self.command)
+        match = _RANGE_BOTH_WORDS.search(self.command, day_pos) if day_match and has_number_word else None
         if match:
-            start_word = match.group(1).lower()
-            end_word = match.group(2).lower()
+            start_word = match.group(1)
+            end_word = match.group(2)
             month_name = match.group(3)
 
             # Intentar convertir ambas palabras a números
@@ -439,26 +876,24 @@ class UnifiedCommandParser:
                 end_day = self.NUMBER_WORDS[end_word]
 
                 # Determinar mes
-                month_num = self.MONTHS.get(month_name, timezone.now().month)
-                year = timezone.now().year
+                month_num = self.MONTHS.get(month_name, self._now_month)
+                year = self._now_year
 
-                try:
-                    start_dt = datetime(year, month_num, start_day, 0, 0, 0)
-                    end_dt = datetime(year, month_num, end_day, 23, 59, 59)
+                # Validar los días antes de construir las fechas (sin excepciones)
+                if _is_valid_day(year, month_num, start_day) and _is_valid_day(year, month_num, end_day):
+                    start_dt = datetime(year, month_num, start_day, 0, 0, 0, tzinfo=self._tz)
+                    end_dt = datetime(year, month_num, end_day, 23, 59, 59, tzinfo=self._tz)
 
-                    self.result['params']['start_date'] = timezone.make_aware(start_dt)
-                    self.result['params']['end_date'] = timezone.make_aware(end_dt)
+                    self.result['params']['start_date'] = start_dt
+                    self.result['params']['end_date'] = end_dt
                     self.result['params']['period_text'] = f"Del {start_day} al {end_day} de {month_name.title()}"
                     return
-                except ValueError:
-                    pass  # Fecha inválida
 
         # Estrategia 0b: "del [palabra] de mes al DD de mes" (inicio en palabra, fin digital)
         # Ej: "del primero de octubre al 19 de octubre", "del primero al 10 de octubre"
-        range_word_digit_pattern = r'del?\s+(\w+)(?:\s+de\s+(\w+))?\s+al?\s+(\d{1,2})\s+de\s+(\w+)'
-        match = re.search(range_word_digit_pattern, self.command)
+        match = _RANGE_WORD_DIGIT.search(self.command, day_pos) if day_match and has_number_word else None
         if match:
-            start_word = match.group(1).lower()
+            start_word = match.group(1)
             start_month_name = match.group(2)
             end_day = int(match.group(3))
             end_month_name = match.group(4)
@@ -473,28 +908,26 @@ class UnifiedCommandParser:
                 elif end_month_name in self.MONTHS:
                     start_month_num = self.MONTHS[end_month_name]
                 else:
-                    start_month_num = timezone.now().month
+                    start_month_num = self._now_month
 
                 # Determinar mes de fin
-                end_month_num = self.MONTHS.get(end_month_name, timezone.now().month)
+                end_month_num = self.MONTHS.get(end_month_name, self._now_month)
 
-                year = timezone.now().year
+                year = self._now_year
 
-                try:
-                    start_dt = datetime(year, start_month_num, start_day, 0, 0, 0)
-                    end_dt = datetime(year, end_month_num, end_day, 23, 59, 59)
+                # Validar los días antes de construir las fechas (sin excepciones)
+                if _is_valid_day(year, start_month_num, start_day) and _is_valid_day(year, end_month_num, end_day):
+                    start_dt = datetime(year, start_month_num, start_day, 0, 0, 0, tzinfo=self._tz)
+                    end_dt = datetime(year, end_month_num, end_day, 23, 59, 59, tzinfo=self._tz)
 
-                    self.result['params']['start_date'] = timezone.make_aware(start_dt)
-                    self.result['params']['end_date'] = timezone.make_aware(end_dt)
+                    self.result['params']['start_date'] = start_dt
+                    self.result['params']['end_date'] = end_dt
                     self.result['params']['period_text'] = f"Del {start_day} al {end_day} de {end_month_name.title()}"
                     return
-                except ValueError:
-                    pass  # Fecha inválida, continuar con otras estrategias
 
         # Estrategia 1: "del DD de mes al DD de mes" (rango dentro del mismo mes o entre meses)
         # Ej: "del 3 al 10 de octubre", "del 28 de septiembre al 5 de octubre"
-        range_month_pattern = r'del?\s+(\d{1,2})(?:\s+de\s+(\w+))?\s+al?\s+(\d{1,2})\s+de\s+(\w+)'
-        match = re.search(range_month_pattern, self.command)
+        match = _RANGE_MONTH.search(self.command, day_pos) if day_match else None
         if match:
             start_day = int(match.group(1))
             start_month_name = match.group(2)  # Puede ser None si no se especifica
@@ -508,113 +941,105 @@ class UnifiedCommandParser:
                 # Si no se especifica mes de inicio, usar el mismo que el final
                 start_month_num = self.MONTHS[end_month_name]
             else:
-                start_month_num = timezone.now().month
+                start_month_num = self._now_month
 
             # Determinar el mes de fin
-            end_month_num = self.MONTHS.get(end_month_name, timezone.now().month)
+            end_month_num = self.MONTHS.get(end_month_name, self._now_month)
 
-            year = timezone.now().year
+            year = self._now_year
 
-            try:
-                start_dt = datetime(year, start_month_num, start_day, 0, 0, 0)
-                end_dt = datetime(year, end_month_num, end_day, 23, 59, 59)
+            # Validar los días antes de construir las fechas (sin excepciones)
+            if _is_valid_day(year, start_month_num, start_day) and _is_valid_day(year, end_month_num, end_day):
+                start_dt = datetime(year, start_month_num, start_day, 0, 0, 0, tzinfo=self._tz)
+                end_dt = datetime(year, end_month_num, end_day, 23, 59, 59, tzinfo=self._tz)
 
-                self.result['params']['start_date'] = timezone.make_aware(start_dt)
-                self.result['params']['end_date'] = timezone.make_aware(end_dt)
+                self.result['params']['start_date'] = start_dt
+                self.result['params']['end_date'] = end_dt
                 self.result['params']['period_text'] = f"Del {start_day} al {end_day} de {end_month_name.title()}"
                 return
-            except ValueError:
-                pass  # Fecha inválida, continuar con otras estrategias
 
         # Estrategia 2a: "[palabra] de mes" (día específico en palabra)
         # Ej: "primero de octubre", "del segundo de enero"
-        specific_day_word_pattern = r'(?:del?\s+)?(\w+)\s+de\s+(\w+)'
-        match = re.search(specific_day_word_pattern, self.command)
+        match = _SPECIFIC_DAY_WORD.search(self.command, day_pos) if day_match and has_number_word and has_month else None
         if match:
-            day_word = match.group(1).lower()
+            day_word = match.group(1)
             month_name = match.group(2)
 
             # Solo procesar si la palabra es un número y el mes es válido
             if day_word in self.NUMBER_WORDS and month_name in self.MONTHS:
                 day = self.NUMBER_WORDS[day_word]
                 month_num = self.MONTHS[month_name]
-                year = timezone.now().year
+                year = self._now_year
 
-                try:
+                # Validar el día antes de construir las fechas (sin excepciones)
+                if _is_valid_day(year, month_num, day):
                     # Crear fecha para ese día específico
-                    start_dt = datetime(year, month_num, day, 0, 0, 0)
-                    end_dt = datetime(year, month_num, day, 23, 59, 59)
+                    start_dt = datetime(year, month_num, day, 0, 0, 0, tzinfo=self._tz)
+                    end_dt = datetime(year, month_num, day, 23, 59, 59, tzinfo=self._tz)
 
-                    self.result['params']['start_date'] = timezone.make_aware(start_dt)
-                    self.result['params']['end_date'] = timezone.make_aware(end_dt)
+                    self.result['params']['start_date'] = start_dt
+                    self.result['params']['end_date'] = end_dt
                     self.result['params']['period_text'] = f"{day} de {month_name.title()}"
                     return
-                except ValueError:
-                    pass  # Día inválido para ese mes
 
         # Estrategia 2b: "DD de mes" o "del DD de mes" (un día específico digital)
         # Ej: "3 de octubre", "del 15 de enero"
-        specific_day_pattern = r'(?:del?\s+)?(\d{1,2})\s+de\s+(\w+)'
-        match = re.search(specific_day_pattern, self.command)
+        match = _SPECIFIC_DAY.search(self.command, day_pos) if day_match and has_month else None
         if match:
             day = int(match.group(1))
             month_name = match.group(2)
 
             if month_name in self.MONTHS:
                 month_num = self.MONTHS[month_name]
-                year = timezone.now().year
+                year = self._now_year
 
-                try:
+                # Validar el día antes de construir las fechas (sin excepciones)
+                if _is_valid_day(year, month_num, day):
                     # Crear fecha para ese día específico
-                    start_dt = datetime(year, month_num, day, 0, 0, 0)
-                    end_dt = datetime(year, month_num, day, 23, 59, 59)
+                    start_dt = datetime(year, month_num, day, 0, 0, 0, tzinfo=self._tz)
+                    end_dt = datetime(year, month_num, day, 23, 59, 59, tzinfo=self._tz)
 
-                    self.result['params']['start_date'] = timezone.make_aware(start_dt)
-                    self.result['params']['end_date'] = timezone.make_aware(end_dt)
+                    self.result['params']['start_date'] = start_dt
+                    self.result['params']['end_date'] = end_dt
                     self.result['params']['period_text'] = f"{day} de {month_name.title()}"
                     return
-                except ValueError:
-                    pass  # Día inválido para ese mes
 
         # Estrategia 3: "DD/MM/YYYY" o "DD-MM-YYYY" o "DD/MM" o "DD-MM" (fecha corta)
         # Ej: "3/10/2024", "15-01", "03/10"
-        short_date_pattern = r'(?:del?\s+)?(\d{1,2}[/-]\d{1,2})(?:[/-](\d{2,4}))?'
-        match = re.search(short_date_pattern, self.command)
+        match = _SHORT_DATE.search(self.command)
         if match:
             date_str = match.group(1).replace('-', '/')
             year_str = match.group(2)
 
             # Si no hay año, usar el actual
             if not year_str:
-                date_str += f"/{timezone.now().year}"
+                date_str += f"/{self._now_year}"
             else:
                 date_str += f"/{year_str}"
 
             parsed_dt = self._parse_date(date_str)
             if parsed_dt:
-                start_dt = parsed_dt.replace(hour=0, minute=0, second=0)
-                end_dt = parsed_dt.replace(hour=23, minute=59, second=59)
+                start_dt = parsed_dt.replace(hour=0, minute=0, second=0, tzinfo=self._tz)
+                end_dt = parsed_dt.replace(hour=23, minute=59, second=59, tzinfo=self._tz)
 
-                self.result['params']['start_date'] = timezone.make_aware(start_dt)
-                self.result['params']['end_date'] = timezone.make_aware(end_dt)
+                self.result['params']['start_date'] = start_dt
+                self.result['params']['end_date'] = end_dt
                 self.result['params']['period_text'] = f"{parsed_dt.strftime('%d/%m/%Y')}"
                 return
 
         # ===== ESTRATEGIAS DE RANGOS =====
 
         # Estrategia 4: "últimos X días"
-        days_pattern = r'(?:ultimos?|pasados?|last)\s+(\d+)\s+(?:dias?|days?)'
-        match = re.search(days_pattern, self.command)
+        match = _LAST_N_DAYS.search(self.command)
         if match:
             days = int(match.group(1))
-            self.result['params']['end_date'] = timezone.now()
+            self.result['params']['end_date'] = self._now
             self.result['params']['start_date'] = self.result['params']['end_date'] - timedelta(days=days)
             self.result['params']['period_text'] = f"Últimos {days} días"
             return
 
         # Estrategia 5: Rangos explícitos "del DD/MM/YYYY al DD/MM/YYYY"
-        date_range_pattern = r'del?\s+(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})\s+al?\s+(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})'
-        match = re.search(date_range_pattern, self.command)
+        match = _DATE_RANGE.search(self.command)
         if match:
             start_str = match.group(1).replace('-', '/')
             end_str = match.group(2).replace('-', '/')
@@ -622,18 +1047,16 @@ class UnifiedCommandParser:
             end_dt = self._parse_date(end_str)
 
             if start_dt and end_dt:
-                self.result['params']['start_date'] = timezone.make_aware(start_dt)
-                self.result['params']['end_date'] = timezone.make_aware(end_dt.replace(hour=23, minute=59, second=59))
+                self.result['params']['start_date'] = start_dt.replace(tzinfo=self._tz)
+                self.result['params']['end_date'] = end_dt.replace(hour=23, minute=59, second=59, tzinfo=self._tz)
                 self.result['params']['period_text'] = f"{start_str} al {end_str}"
                 return
 
         # ===== ESTRATEGIAS DE MESES COMPLETOS (MÁS GENERALES) =====
 
         # Estrategia 6: "último mes" o "mes pasado" (ANTES del loop de meses)
-        if 'ultimo mes' in self.command or 'mes pasado' in self.command or ('últi' in self.command and 'mes' in self.command):
-            today = timezone.now()
-            first_day_current = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            last_day_prev = first_day_current - timedelta(seconds=1)
+        if 'ultimo mes' in self._phrases or 'mes pasado' in self._phrases or ('últi' in self._phrases and 'mes' in self._phrases):
+            last_day_prev = self._dates.start_of_month - timedelta(seconds=1)
             first_day_prev = last_day_prev.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
             self.result['params']['start_date'] = first_day_prev
@@ -643,83 +1066,89 @@ class UnifiedCommandParser:
 
         # Estrategia 7: "mes de [nombre_mes]" (SOLO si no hay día específico)
         # Ej: "mes de octubre", "de octubre" (pero NO "3 de octubre", eso ya se detectó arriba)
-        for month_name, month_num in self.MONTHS.items():
-            # IMPORTANTE: Solo detectar mes completo si NO hay un día específico en el comando
-            # Evitar falsos positivos cuando se dice "3 de octubre" (eso ya fue detectado arriba)
-            has_specific_day = re.search(r'\d{1,2}\s+de\s+' + month_name, self.command)
-
-            if has_specific_day:
-                # Si hay un día específico, ya fue procesado arriba. No hacer nada aquí.
-                continue
-
+        if has_month:
             # Buscar SOLO si dice explícitamente "mes de" o está muy claro que se refiere al mes completo
-            if f"mes de {month_name}" in self.command or f"todo {month_name}" in self.command or f"completo de {month_name}" in self.command:
-                year = timezone.now().year
-                self.result['params']['start_date'] = timezone.make_aware(datetime(year, month_num, 1))
-
-                if month_num == 12:
-                    self.result['params']['end_date'] = timezone.make_aware(datetime(year, 12, 31, 23, 59, 59))
-                else:
-                    self.result['params']['end_date'] = timezone.make_aware(datetime(year, month_num + 1, 1)) - timedelta(seconds=1)
+            full_months = set(self._MONTH_FULL.findall(self.command))
+            if full_months:
+                # IMPORTANTE: Solo detectar mes completo si NO hay un día específico en el comando
+                # Evitar falsos positivos cuando se dice "3 de octubre" (eso ya fue detectado arriba)
+                full_months -= set(self._MONTH_WITH_DAY.findall(self.command))
+
+            if full_months:
+                # Si se mencionan varios meses, gana el primero del calendario
+                month_name = min(full_months, key=self.MONTHS.get)
+                month_num = self.MONTHS[month_name]
+                start_date, end_date = _month_bounds(self._now_year, month_num, self._tz)
+                self.result['params']['start_date'] = start_date
+                self.result['params']['end_date'] = end_date
 
                 self.result['params']['period_text'] = f"Mes de {month_name.title()}"
                 return
 
-        # Estrategia 8: "este mes" o "mes actual"
-        if 'este mes' in self.command or 'mes actual' in self.command:
-            today = timezone.now()
-            self.result['params']['start_date'] = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            self.result['params']['end_date'] = today
-            self.result['params']['period_text'] = "Mes actual"
-            return
-
-        # Estrategia 9: "esta semana"
-        if 'esta semana' in self.command or 'semana actual' in self.command:
-            today = timezone.now()
-            start_week = today - timedelta(days=today.weekday())
-            self.result['params']['start_date'] = start_week.replace(hour=0, minute=0, second=0, microsecond=0)
-            self.result['params']['end_date'] = today
-            self.result['params']['period_text'] = "Esta semana"
-            return
-
-        # Estrategia 9b: "semana anterior", "semana pasada", "la semana pasada"
-        if ('semana anterior' in self.command or 'semana pasada' in self.command or
-            'la semana anterior' in self.command or 'la semana pasada' in self.command):
-            today = timezone.now()
-            # Calcular el inicio de la semana actual (lunes a las 00:00:00)
-            start_current_week = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-            # La semana anterior termina el domingo (justo antes del lunes de esta semana)
-            end_last_week = start_current_week - timedelta(seconds=1)
-            # La semana anterior empieza el lunes (7 días antes del lunes de esta semana)
-            start_last_week = start_current_week - timedelta(days=7)
-
-            self.result['params']['start_date'] = start_last_week
-            self.result['params']['end_date'] = end_last_week
-            self.result['params']['period_text'] = "Semana anterior"
-            return
-
-        # Estrategia 10: "hoy"
-        if 'hoy' in self.command or 'today' in self.command:
-            today = timezone.now()
-            self.result['params']['start_date'] = today.replace(hour=0, minute=0, second=0, microsecond=0)
-            self.result['params']['end_date'] = today
-            self.result['params']['period_text'] = "Hoy"
+        # Estrategias 8-10: "este mes", "esta semana", "semana anterior", "hoy"
+        # (el primero de _RELATIVE_PERIODS presente en el comando)
+        period_handler = self._hits.get('period')
+        if period_handler:
+            getattr(self, period_handler)()
             return
 
         # Estrategia 11: "año [número]" o "del año [número]"
-        year_pattern = r'(?:del?\s+)?año\s+(\d{4})'
-        match = re.search(year_pattern, self.command)
+        match = _YEAR.search(self.command)
         if match:
             year = int(match.group(1))
-            self.result['params']['start_date'] = timezone.make_aware(datetime(year, 1, 1))
-            self.result['params']['end_date'] = timezone.make_aware(datetime(year, 12, 31, 23, 59, 59))
+            self.result['params']['start_date'] = datetime(year, 1, 1, tzinfo=self._tz)
+            self.result['params']['end_date'] = datetime(year, 12, 31, 23, 59, 59, tzinfo=self._tz)
             self.result['params']['period_text'] = f"Año {year}"
             return
 
         # Por defecto: mes actual
-        today = timezone.now()
-        self.result['params']['start_date'] = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        self.result['params']['end_date'] = today
+        self._set_default_period()
+
+    def _set_current_month(self):
+        """
+        Estrategia 8: "este mes" o "mes actual"
+        """
+        self.result['params']['start_date'] = self._dates.start_of_month
+        self.result['params']['end_date'] = self._dates.today
+        self.result['params']['period_text'] = "Mes actual"
+
+    def _set_current_week(self):
+        """
+        Estrategia 9: "esta semana" o "semana actual"
+        """
+        self.result['params']['start_date'] = self._dates.start_of_week
+        self.result['params']['end_date'] = self._dates.today
+        self.result['params']['period_text'] = "Esta semana"
+
+    def _set_last_week(self):
+        """
+        Estrategia 9b: "semana anterior", "semana pasada", "la semana pasada"
+        """
+        # Inicio de la semana actual (lunes a las 00:00:00)
+        start_current_week = self._dates.start_of_week
+        # La semana anterior termina el domingo (justo antes del lunes de esta semana)
+        end_last_week = start_current_week - timedelta(seconds=1)
+        # La semana anterior empieza el lunes (7 días antes del lunes de esta semana)
+        start_last_week = start_current_week - timedelta(days=7)
+
+        self.result['params']['start_date'] = start_last_week
+        self.result['params']['end_date'] = end_last_week
+        self.result['params']['period_text'] = "Semana anterior"
+
+    def _set_today(self):
+        """
+        Estrategia 10: "hoy"
+        """
+        self.result['params']['start_date'] = self._dates.start_of_day
+        self.result['params']['end_date'] = self._dates.today
+        self.result['params']['period_text'] = "Hoy"
+
+    def _set_default_period(self):
+        """
+        Asigna el período por defecto (mes actual hasta hoy)
+        """
+        self.result['params']['start_date'] = self._dates.start_of_month
+        self.result['params']['end_date'] = self._dates.today
         self.result['params']['period_text'] = "Mes actual (por defecto)"
 
     def _parse_date(self, date_str: str) -> Optional[datetime]:
@@ -740,18 +1169,9 @@ class UnifiedCommandParser:
         """
         Extrae el tipo de agrupación solicitado
         """
-        grouping_keywords = {
-            'product': ['por producto', 'por productos', 'agrupado por producto', 'de producto', 'de productos'],
-            'client': ['por cliente', 'por clientes', 'agrupado por cliente', 'de cliente', 'de clientes', 'por usuario'],
-            'category': ['por categoria', 'por categorias', 'agrupado por categoria'],
-            'date': ['por fecha', 'por dia', 'diario', 'diarios', 'por fechas', 'por dias']
-        }
-        
-        for group_type, keywords in grouping_keywords.items():
-            for keyword in keywords:
-                if keyword in self.command:
-                    self.result['params']['group_by'] = group_type
-                    return
+        group_type = self._hits.get('group')
+        if group_type:
+            self.result['params']['group_by'] = group_type
 
     def _extract_additional_params(self):
         """
@@ -764,21 +1184,19 @@ class UnifiedCommandParser:
 
             # ESTRATEGIA 1: Buscar números digitales con unidad de tiempo
             # Patrón: "7 días", "2 semanas", "3 meses", "1 año"
-            digit_unit_pattern = r'(?:para|de|proximo|proximos|siguiente|siguientes)?\s*(\d+)\s+(dia|dias|day|days|semana|semanas|week|weeks|mes|meses|month|months|ano|anos|year|years)'
-            match = re.search(digit_unit_pattern, self.command)
+            match = _DIGIT_UNIT.search(self.command)
             if match:
                 number = int(match.group(1))
-                unit = match.group(2).lower()
+                unit = match.group(2)
                 days = self._convert_to_days(number, unit)
 
             # ESTRATEGIA 2: Buscar números en palabras con unidad de tiempo
             # Patrón: "dos días", "tres semanas", "dos meses"
             if days is None:
-                word_unit_pattern = r'(?:para|de|proximo|proximos|siguiente|siguientes)?\s*(\w+)\s+(dia|dias|semana|semanas|mes|meses|ano|anos)'
-                match = re.search(word_unit_pattern, self.command)
+                match = _WORD_UNIT.search(self.command)
                 if match:
-                    number_word = match.group(1).lower()
-                    unit = match.group(2).lower()
+                    number_word = match.group(1)
+                    unit = match.group(2)
                     if number_word in self.NUMBER_WORDS:
                         number = self.NUMBER_WORDS[number_word]
                         days = self._convert_to_days(number, unit)
@@ -787,24 +1205,20 @@ class UnifiedCommandParser:
             # Ej: "próxima semana", "siguiente mes"
             if days is None:
                 # Buscar "próxima/siguiente" seguido de unidad de tiempo
-                implicit_pattern = r'(?:proxima|siguiente)\s+(semana|semanas|mes|meses|ano|anos)'
-                match = re.search(implicit_pattern, self.command)
+                match = _IMPLICIT_UNIT.search(self.command)
                 if match:
-                    unit = match.group(1).lower()
+                    unit = match.group(1)
                     # Implícitamente es 1 unidad
                     days = self._convert_to_days(1, unit)
 
             # ESTRATEGIA 4: Buscar números en palabras sin preposición
             # Ej: "dos días", "tres semanas"
             if days is None:
-                for number_word, number_value in self.NUMBER_WORDS.items():
-                    # Buscar con diferentes unidades
-                    for unit_word in ['dia', 'dias', 'semana', 'semanas', 'mes', 'meses', 'ano', 'anos']:
-                        if f"{number_word} {unit_word}" in self.command:
-                            days = self._convert_to_days(number_value, unit_word)
-                            break
-                    if days:
-                        break
+                # La primera combinación (número, unidad) presente, en orden de NUMBER_WORDS
+                number_unit = self._hits.get('number_unit')
+                if number_unit:
+                    number_value, unit_word = number_unit
+                    days = self._convert_to_days(number_value, unit_word)
 
             # Asignar días encontrados o valor por defecto
             if days:
@@ -859,8 +1273,7 @@ class UnifiedCommandParser:
 
         # FILTRO 1: Top N / Mejores N / Primeros N
         # Ej: "top 10 productos", "mejores 5 clientes", "primeros 3"
-        top_pattern = r'(?:top|mejores|primeros)\s+(\d+)'
-        match = re.search(top_pattern, self.command)
+        match = _TOP.search(self.command)
         if match:
             limit = int(match.group(1))
             self.result['params']['limit'] = limit
@@ -869,10 +1282,9 @@ class UnifiedCommandParser:
 
         # También detectar "top" con número en palabras
         # Ej: "mejores cinco", "top diez"
-        top_word_pattern = r'(?:top|mejores|primeros)\s+(\w+)'
-        match = re.search(top_word_pattern, self.command)
+        match = _TOP_WORD.search(self.command)
         if match and 'limit' not in self.result['params']:
-            number_word = match.group(1).lower()
+            number_word = match.group(1)
             if number_word in self.NUMBER_WORDS:
                 limit = self.NUMBER_WORDS[number_word]
                 self.result['params']['limit'] = limit
@@ -881,8 +1293,7 @@ class UnifiedCommandParser:
 
         # FILTRO 2: Mayor a X / Más de X
         # Ej: "ventas mayores a 1000", "clientes que gastaron más de 500"
-        greater_pattern = r'(?:mayor(?:es)?|mas)\s+(?:a|de|que)\s+(\d+(?:\.\d+)?)'
-        match = re.search(greater_pattern, self.command)
+        match = _GREATER.search(self.command)
         if match:
             min_amount = float(match.group(1))
             self.result['params']['min_amount'] = min_amount
@@ -890,8 +1301,7 @@ class UnifiedCommandParser:
 
         # FILTRO 3: Menor a X / Menos de X
         # Ej: "productos con precio menor a 50", "ventas menos de 100"
-        less_pattern = r'(?:menor(?:es)?|menos)\s+(?:a|de|que)\s+(\d+(?:\.\d+)?)'
-        match = re.search(less_pattern, self.command)
+        match = _LESS.search(self.command)
         if match:
             max_amount = float(match.group(1))
             self.result['params']['max_amount'] = max_amount
@@ -899,8 +1309,7 @@ class UnifiedCommandParser:
 
         # FILTRO 4: Entre X y Y
         # Ej: "ventas entre 100 y 500", "productos entre 50 y 200"
-        between_pattern = r'entre\s+(\d+(?:\.\d+)?)\s+y\s+(\d+(?:\.\d+)?)'
-        match = re.search(between_pattern, self.command)
+        match = _BETWEEN.search(self.command)
         if match:
             min_amount = float(match.group(1))
             max_amount = float(match.group(2))
@@ -910,14 +1319,9 @@ class UnifiedCommandParser:
 
         # FILTRO 5: Detectar moneda
         # Ej: "dólares", "pesos", "soles", "$", "USD"
-        if any(word in self.command for word in ['dolar', 'dolares', 'usd', '$']):
-            self.result['params']['currency'] = 'USD'
-        elif any(word in self.command for word in ['peso', 'pesos', 'mxn']):
-            self.result['params']['currency'] = 'MXN'
-        elif any(word in self.command for word in ['sol', 'soles', 'pen']):
-            self.result['params']['currency'] = 'PEN'
-        elif any(word in self.command for word in ['euro', 'euros', 'eur', '€']):
-            self.result['params']['currency'] = 'EUR'
+        currency = self._hits.get('currency')
+        if currency:
+            self.result['params']['currency'] = currency
 
     def _detect_comparison_periods(self):
         """
@@ -929,12 +1333,13 @@ class UnifiedCommandParser:
         if self.result['report_type'] != 'comparativo_temporal':
             return
 
-        today = timezone.now()
+        today = self._now
+        dates = self._dates
 
         # PATRÓN 1: "este mes vs mes pasado" o "crecimiento respecto al mes pasado"
-        if any(phrase in self.command for phrase in ['respecto al mes pasado', 'versus mes pasado', 'vs mes pasado', 'contra mes pasado', 'comparado con mes pasado']):
+        if any(phrase in self._phrases for phrase in ['respecto al mes pasado', 'versus mes pasado', 'vs mes pasado', 'contra mes pasado', 'comparado con mes pasado']):
             # Período 1: Este mes (desde día 1 hasta hoy)
-            start1 = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            start1 = dates.start_of_month
             end1 = today
 
             # Período 2: Mes pasado (mes completo)
@@ -953,13 +1358,13 @@ class UnifiedCommandParser:
             return
 
         # PATRÓN 2: "esta semana vs semana pasada"
-        if any(phrase in self.command for phrase in ['esta semana versus semana', 'esta semana vs semana', 'semana actual contra semana', 'esta semana comparado con semana']):
+        if any(phrase in self._phrases for phrase in ['esta semana versus semana', 'esta semana vs semana', 'semana actual contra semana', 'esta semana comparado con semana']):
             # Período 1: Esta semana (desde lunes hasta hoy)
-            start1 = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+            start1 = dates.start_of_week
             end1 = today
 
             # Período 2: Semana pasada (lunes a domingo completo)
-            start_current_week = (today - timedelta(days=today.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+            start_current_week = dates.start_of_week
             start2 = start_current_week - timedelta(days=7)
             end2 = start_current_week - timedelta(seconds=1)
 
@@ -976,7 +1381,7 @@ class UnifiedCommandParser:
         # Detectar dos meses mencionados
         months_mentioned = []
         for month_name, month_num in self.MONTHS.items():
-            if month_name in self.command:
+            if month_name in self._phrases:
                 months_mentioned.append((month_name, month_num))
 
         if len(months_mentioned) == 2:
@@ -987,18 +1392,10 @@ class UnifiedCommandParser:
             year = today.year
 
             # Período 1: Primer mes mencionado
-            start1 = timezone.make_aware(datetime(year, month1_num, 1, 0, 0, 0))
-            if month1_num == 12:
-                end1 = timezone.make_aware(datetime(year, 12, 31, 23, 59, 59))
-            else:
-                end1 = timezone.make_aware(datetime(year, month1_num + 1, 1, 0, 0, 0)) - timedelta(seconds=1)
+            start1, end1 = _month_bounds(year, month1_num, self._tz)
 
             # Período 2: Segundo mes mencionado
-            start2 = timezone.make_aware(datetime(year, month2_num, 1, 0, 0, 0))
-            if month2_num == 12:
-                end2 = timezone.make_aware(datetime(year, 12, 31, 23, 59, 59))
-            else:
-                end2 = timezone.make_aware(datetime(year, month2_num + 1, 1, 0, 0, 0)) - timedelta(seconds=1)
+            start2, end2 = _month_bounds(year, month2_num, self._tz)
 
             self.result['params']['period1_start'] = start1
             self.result['params']['period1_end'] = end1
@@ -1010,14 +1407,14 @@ class UnifiedCommandParser:
             return
 
         # PATRÓN 4: "año actual vs año pasado" o "este año contra año anterior"
-        if any(phrase in self.command for phrase in ['ano actual vs ano', 'este ano versus ano', 'ano actual contra ano']):
+        if any(phrase in self._phrases for phrase in ['ano actual vs ano', 'este ano versus ano', 'ano actual contra ano']):
             # Período 1: Este año (desde enero 1 hasta hoy)
-            start1 = timezone.make_aware(datetime(today.year, 1, 1, 0, 0, 0))
+            start1 = datetime(today.year, 1, 1, 0, 0, 0, tzinfo=self._tz)
             end1 = today
 
             # Período 2: Año pasado (año completo)
-            start2 = timezone.make_aware(datetime(today.year - 1, 1, 1, 0, 0, 0))
-            end2 = timezone.make_aware(datetime(today.year - 1, 12, 31, 23, 59, 59))
+            start2 = datetime(today.year - 1, 1, 1, 0, 0, 0, tzinfo=self._tz)
+            end2 = datetime(today.year - 1, 12, 31, 23, 59, 59, tzinfo=self._tz)
 
             self.result['params']['period1_start'] = start1
             self.result['params']['period1_end'] = end1
@@ -1035,18 +1432,8 @@ class UnifiedCommandParser:
         Modifica self.result para indicar que es un comando de alerta
         """
 
-        alert_keywords = [
-            # Notificaciones
-            'avisame', 'avisa', 'notificame', 'notifica', 'alertame', 'alerta',
-            # Programación
-            'cada dia', 'cada semana', 'cada mes', 'cada lunes', 'cada martes',
-            'diario', 'semanal', 'mensual',
-            # Condicionales
-            'cuando', 'si', 'en caso de'
-        ]
-
         # Verificar si contiene keywords de alerta
-        if not any(keyword in self.command for keyword in alert_keywords):
+        if 'alert' not in self._hits:
             return
 
         # ES UN COMANDO DE ALERTA
@@ -1056,15 +1443,15 @@ class UnifiedCommandParser:
         logger.info("Comando de alerta detectado")
 
         # PATRÓN 1: "avísame cuando [condición]"
-        if any(word in self.command for word in ['avisame cuando', 'notificame cuando', 'alertame cuando']):
+        if any(word in self._phrases for word in ['avisame cuando', 'notificame cuando', 'alertame cuando']):
             self.result['alert_params']['type'] = 'condition'
 
             # Detectar condiciones específicas
-            if 'stock bajo' in self.command or 'bajo stock' in self.command or 'stock este bajo' in self.command:
+            if 'stock bajo' in self._phrases or 'bajo stock' in self._phrases or 'stock este bajo' in self._phrases:
                 self.result['alert_params']['condition_type'] = 'stock_low'
 
                 # Extraer umbral si lo menciona
-                threshold_match = re.search(r'(?:menor|menos|bajo)\s+(?:de|a|que)\s+(\d+)', self.command)
+                threshold_match = _ALERT_THRESHOLD.search(self.command)
                 if threshold_match:
                     self.result['alert_params']['threshold'] = int(threshold_match.group(1))
                 else:
@@ -1072,11 +1459,11 @@ class UnifiedCommandParser:
 
                 logger.info(f"Condición: stock bajo (umbral: {self.result['alert_params']['threshold']})")
 
-            elif 'ventas caen' in self.command or 'ventas bajen' in self.command or 'caida de ventas' in self.command:
+            elif 'ventas caen' in self._phrases or 'ventas bajen' in self._phrases or 'caida de ventas' in self._phrases:
                 self.result['alert_params']['condition_type'] = 'sales_drop'
 
                 # Extraer porcentaje
-                pct_match = re.search(r'(\d+)\s*%', self.command)
+                pct_match = _ALERT_PERCENTAGE.search(self.command)
                 if pct_match:
                     self.result['alert_params']['percentage'] = int(pct_match.group(1))
                 else:
@@ -1084,21 +1471,21 @@ class UnifiedCommandParser:
 
                 logger.info(f"Condición: caída de ventas (>{self.result['alert_params']['percentage']}%)")
 
-            elif 'sin stock' in self.command or 'inventario cero' in self.command:
+            elif 'sin stock' in self._phrases or 'inventario cero' in self._phrases:
                 self.result['alert_params']['condition_type'] = 'inventory_zero'
                 logger.info("Condición: inventario en cero")
 
         # PATRÓN 2: "envíame/manda [reporte] cada [frecuencia]"
-        elif any(phrase in self.command for phrase in ['cada dia', 'cada semana', 'cada mes', 'cada lunes',
+        elif any(phrase in self._phrases for phrase in ['cada dia', 'cada semana', 'cada mes', 'cada lunes',
                                                         'diario', 'semanal', 'mensual']):
             self.result['alert_params']['type'] = 'scheduled'
 
             # Detectar frecuencia
-            if 'cada dia' in self.command or 'diario' in self.command or 'todos los dias' in self.command:
+            if 'cada dia' in self._phrases or 'diario' in self._phrases or 'todos los dias' in self._phrases:
                 self.result['alert_params']['frequency'] = 'daily'
 
                 # Extraer hora si la menciona
-                hour_match = re.search(r'(\d{1,2})\s*(?:am|pm|hs|horas)', self.command)
+                hour_match = _ALERT_HOUR.search(self.command)
                 if hour_match:
                     hour = int(hour_match.group(1))
                     self.result['alert_params']['hour'] = hour if hour <= 12 else hour - 12
@@ -1107,18 +1494,15 @@ class UnifiedCommandParser:
 
                 logger.info(f"Programación: diaria a las {self.result['alert_params']['hour']}:00")
 
-            elif 'cada semana' in self.command or 'semanal' in self.command or 'todas las semanas' in self.command:
+            elif 'cada semana' in self._phrases or 'semanal' in self._phrases or 'todas las semanas' in self._phrases:
                 self.result['alert_params']['frequency'] = 'weekly'
 
                 # Detectar día de la semana
-                days_map = {
-                    'lunes': 0, 'martes': 1, 'miercoles': 2, 'jueves': 3,
-                    'viernes': 4, 'sabado': 5, 'domingo': 6
-                }
+                days_map = self._WEEKDAYS
 
                 day_of_week = 0  # Lunes por defecto
                 for day_name, day_num in days_map.items():
-                    if day_name in self.command:
+                    if day_name in self._phrases:
                         day_of_week = day_num
                         break
 
@@ -1128,11 +1512,11 @@ class UnifiedCommandParser:
                 day_name = list(days_map.keys())[day_of_week]
                 logger.info(f"Programación: semanal cada {day_name} a las 9:00")
 
-            elif 'cada mes' in self.command or 'mensual' in self.command or 'todos los meses' in self.command:
+            elif 'cada mes' in self._phrases or 'mensual' in self._phrases or 'todos los meses' in self._phrases:
                 self.result['alert_params']['frequency'] = 'monthly'
 
                 # Detectar día del mes
-                day_match = re.search(r'dia\s+(\d{1,2})', self.command)
+                day_match = _ALERT_DAY_OF_MONTH.search(self.command)
                 if day_match:
                     day_of_month = int(day_match.group(1))
                 else:
@@ -1197,6 +1581,60 @@ class UnifiedCommandParser:
                 logger.warning(f"Formato '{original_format}' no soportado para '{self.result['report_name']}'. Usando '{self.result['format']}'")
 
 
+@lru_cache(maxsize=2048)
+def _parse_command_steps(parser_class, command: str) -> Dict:
+    """
+    Ejecuta los pasos del parsing que no dependen de la fecha actual:
+    tipo de reporte, formato, agrupación, parámetros ML, filtros numéricos
+    y alertas. Las fechas se calculan en cada llamada para no devolver
+    rangos desactualizados (ej: "últimos 7 días").
+
+    Args:
+        parser_class: Clase del parser (permite subclases)
+        command: Comando ya normalizado
+
+    Returns:
+        dict: Resultado parcial; no modificar (se comparte entre llamadas)
+    """
+    parser = parser_class(command)
+    parser._identify_report_type()          # 1
+    parser._extract_format()                # 2
+    parser._extract_grouping()              # 4
+    parser._extract_additional_params()     # 5
+    parser._extract_numeric_filters()       # 6
+    parser._detect_alert_command()          # 8
+    return parser.result
+
+
+@receiver(setting_changed)
+def _reset_report_catalog(setting, **kwargs):
+    """
+    Descarta el catálogo especializado y los resultados cacheados cuando
+    cambia UNIFIED_PARSER_ENABLED_REPORTS (p.ej. override_settings en tests).
+    """
+    if setting != 'UNIFIED_PARSER_ENABLED_REPORTS':
+        return
+    pending = [UnifiedCommandParser]
+    while pending:
+        parser_class = pending.pop()
+        if '_CATALOG_ARRAYS' in parser_class.__dict__:
+            del parser_class._CATALOG_ARRAYS
+        pending.extend(parser_class.__subclasses__())
+    _parse_command_steps.cache_clear()
+
+
+def _copy_result(value):
+    """
+    Copia de un resultado cacheado: solo dicts y listas son mutables en él
+    (el resto son str, números, bool o None), así que no hace falta deepcopy.
+    """
+    if isinstance(value, dict):
+        return {key: _copy_result(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_result(item) for item in value]
+    return value
+
+
 def parse_command(command: str) -> Dict:
     """
     Función helper para parsear un comando
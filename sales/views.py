@@ -447,12 +447,9 @@ class SalesHistoryView(generics.ListAPIView):
         """
         Filtra las órdenes para devolver solo las que tienen el estado 'COMPLETED'.
         """
-        return (
+        return OrderSerializer.setup_eager_loading(
             Order.objects.filter(status='COMPLETED')
-            .select_related('customer')
-            .prefetch_related('items__product')
-            .order_by('-updated_at')
-        )
+        ).order_by('-updated_at')
 
 
 class SalesHistoryDetailView(generics.RetrieveAPIView):
@@ -468,7 +465,7 @@ class SalesHistoryDetailView(generics.RetrieveAPIView):
         """
         Filtra las órdenes para devolver solo las que tienen el estado 'COMPLETED'.
         """
-        return Order.objects.filter(status='COMPLETED').select_related('customer').prefetch_related('items__product__category')
+        return OrderSerializer.setup_eager_loading(Order.objects.filter(status='COMPLETED'))
 
 # --- VISTA PARA GENERAR COMPROBANTES EN PDF ---
 class GenerateOrderReceiptPDF(views.APIView):
@@ -563,7 +560,7 @@ class MyOrderListView(generics.ListAPIView):
         # (solo mostramos las COMPLETED y CANCELLED, no el carrito activo)
         queryset = Order.objects.filter(customer=user).exclude(status='PENDING')
         # Ordenamos por fecha, las más recientes primero
-        return queryset.order_by('-created_at')
+        return OrderSerializer.setup_eager_loading(queryset).order_by('-created_at')
 
 
 # === VISTA PARA MÉTODOS DE PAGO (NUEVO) ===
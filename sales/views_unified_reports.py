@@ -116,13 +116,18 @@ def obtener_datos_graficas(request):
 @permission_classes([IsAuthenticated])
 def generar_reporte_ventas(request):
     """
-    GET /api/sales/reports/ventas/?formato=pdf|excel|docx&fecha_inicio=YYYY-MM-DD&fecha_fin=YYYY-MM-DD
+    GET /api/sales/reports/ventas/?formato=pdf|excel|docx&fecha_inicio=YYYY-MM-DD&fecha_fin=YYYY-MM-DD[&offset=N&limit=N]
     """
     try:
         formato = (request.GET.get('formato') or 'pdf').lower()
         fecha_inicio = request.GET.get('fecha_inicio')
         fecha_fin = request.GET.get('fecha_fin')
-        filtros = {'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin}
+        filtros = {
+            'fecha_inicio': fecha_inicio,
+            'fecha_fin': fecha_fin,
+            'offset': request.GET.get('offset'),
+            'limit': request.GET.get('limit'),
+        }
 
         headers, rows, totals = construir_datos_ventas(filtros)
         report = _build_report_dict('Reporte de Ventas', headers, rows, totals)
@@ -0,0 +1,105 @@
+"""
+Tests para la escritura asíncrona de la bitácora (cola, flush y respaldo síncrono).
+"""
+import queue
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from sales import models_audit
+from sales.models_audit import AuditLog, PendingAuditLog, flush_audit_queue
+
+
+def _pending(endpoint='/api/products/', **fields):
+    """Registro pendiente mínimo válido."""
+    return PendingAuditLog(fields={
+        'username': 'Anónimo',
+        'action_type': 'READ',
+        'action_description': 'Lectura de productos',
+        'http_method': 'GET',
+        'endpoint': endpoint,
+        'response_status': 200,
+        'success': True,
+        'ip_address': '127.0.0.1',
+        **fields,
+    })
+
+
+@override_settings(AUDIT_ASYNC_WRITES=True, AUDIT_READ_SAMPLE_RATE=1)
+class AuditQueueTests(TransactionTestCase):
+    """
+    TransactionTestCase: dentro de un bloque atómico log_action guarda de
+    forma síncrona y no pasaría por la cola.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        # Cola propia por test; el hilo escritor no se inicia
+        self.queue = queue.Queue(maxsize=2)
+        patcher = mock.patch.object(models_audit, '_AUDIT_QUEUE', self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(models_audit, '_ensure_writer')
+        self.ensure_writer = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _log(self):
+        request = self.factory.get('/api/products/')
+        return AuditLog.log_action(AnonymousUser(), 'READ', 'Lectura de productos', request)
+
+    def test_log_action_enqueues(self):
+        """Con cola disponible el registro se encola y no se guarda aún."""
+        self.assertIsNone(self._log())
+
+        self.assertEqual(self.queue.qsize(), 1)
+        self.assertEqual(AuditLog.objects.count(), 0)
+        self.ensure_writer.assert_called_once()
+
+    def test_queue_full_saves_synchronously(self):
+        """Con la cola llena el registro se guarda en la petición."""
+        self.queue.put_nowait(_pending())
+        self.queue.put_nowait(_pending())
+
+        log = self._log()
+
+        self.assertIsNotNone(log)
+        self.assertIsNotNone(log.pk)
+        self.assertEqual(AuditLog.objects.count(), 1)
+        self.assertEqual(self.queue.qsize(), 2)
+
+    def test_flush_audit_queue_writes_pending(self):
+        """flush_audit_queue guarda todo lo pendiente y vacía la cola."""
+        self.queue.put_nowait(_pending('/api/a/'))
+        self.queue.put_nowait(_pending('/api/b/'))
+
+        with mock.patch.object(models_audit, 'AUDIT_BATCH_SIZE', 1):
+            flush_audit_queue()
+
+        self.assertTrue(self.queue.empty())
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('endpoint', flat=True)),
+            ['/api/a/', '/api/b/']
+        )
+
+    def test_batch_failure_falls_back_per_row(self):
+        """Si falla el lote se guardan los válidos y se informa cada descarte."""
+        batch = [
+            _pending('/api/ok/'),
+            _pending('/api/bad/', response_status=None),
+            _pending('/api/ok2/'),
+        ]
+
+        out = StringIO()
+        with redirect_stdout(out):
+            models_audit._write_batch(batch)
+
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('endpoint', flat=True)),
+            ['/api/ok/', '/api/ok2/']
+        )
+        output = out.getvalue()
+        self.assertIn('Error al guardar lote de bitácora (3 registros)', output)
+        self.assertIn('Error al guardar registro de bitácora (GET /api/bad/)', output)
@@ -0,0 +1,175 @@
+"""
+Tests para los comandos de mantenimiento (bitácora y recomendaciones).
+"""
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from products.models import Product, Category
+from sales.management.commands.partition_audit_logs import Command as PartitionCommand
+from sales.ml_recommender import ProductRecommender
+from sales.models import Order, OrderItem
+from sales.models_recommendations import ProductCoOccurrence, ProductRecentSales
+
+
+User = get_user_model()
+
+
+class RecordingCursor:
+    """Cursor falso que registra el SQL ejecutado (el particionado requiere PostgreSQL)."""
+
+    def __init__(self, existing, moved_rows=0):
+        self.existing = set(existing)
+        self.moved_rows = moved_rows
+        self.statements = []
+        self.rowcount = 0
+        self._last_lookup = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        self.rowcount = self.moved_rows if sql.startswith('WITH moved') else 0
+        self._last_lookup = params[0] if sql.startswith('SELECT 1 FROM pg_class') else None
+
+    def fetchone(self):
+        return (1,) if self._last_lookup in self.existing else None
+
+
+class PartitionAuditLogsTests(TestCase):
+    """Tests para partition_audit_logs."""
+
+    def _run(self, cursor, start=date(2026, 10, 1), months_ahead=1):
+        command = PartitionCommand(stdout=StringIO())
+        fake_connection = mock.Mock(vendor='postgresql')
+        fake_connection.cursor.return_value = cursor
+        fake_connection.ops.quote_name = lambda name: f'"{name}"'
+        with mock.patch('sales.management.commands.partition_audit_logs.connection', fake_connection):
+            created = command._ensure_partitions('audit_logs', start, months_ahead)
+        return created, cursor.statements
+
+    def test_noop_outside_postgresql(self):
+        """En SQLite el comando solo avisa."""
+        out = StringIO()
+        call_command('partition_audit_logs', stdout=out)
+        self.assertIn('solo está disponible en PostgreSQL', out.getvalue())
+
+    def test_creates_missing_partitions_and_default(self):
+        """Sin DEFAULT previa: crea los meses y luego la DEFAULT."""
+        created, statements = self._run(RecordingCursor(existing=[]))
+
+        self.assertEqual(created, 2)
+        self.assertFalse(any('DETACH' in sql for sql in statements))
+        self.assertIn('PARTITION OF "audit_logs" DEFAULT', statements[-1])
+
+    def test_moves_default_rows_into_new_partition(self):
+        """Con DEFAULT previa: separar, crear, mover registros y volver a unir."""
+        cursor = RecordingCursor(existing=['audit_logs_default', 'audit_logs_2026_10'], moved_rows=3)
+        created, statements = self._run(cursor)
+
+        self.assertEqual(created, 1)
+        ddl = [sql.split(' ')[0] for sql in statements if not sql.startswith('SELECT')]
+        self.assertEqual(ddl, ['ALTER', 'CREATE', 'WITH', 'ALTER'])
+        self.assertIn('DETACH PARTITION "audit_logs_default"', statements[3])
+        self.assertIn('"audit_logs_2026_11"', statements[4])
+        self.assertIn('ATTACH PARTITION "audit_logs_default" DEFAULT', statements[-1])
+
+    def test_existing_partitions_leave_default_attached(self):
+        """Si no falta ninguna partición no se toca la DEFAULT."""
+        cursor = RecordingCursor(
+            existing=['audit_logs_default', 'audit_logs_2026_10', 'audit_logs_2026_11']
+        )
+        created, statements = self._run(cursor)
+
+        self.assertEqual(created, 0)
+        self.assertFalse(any('DETACH' in sql or 'ATTACH' in sql for sql in statements))
+
+
+class RefreshRecommendationStatsTests(TestCase):
+    """Tests para refresh_recommendation_stats y el uso de sus tablas."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Electronics', slug='electronics')
+        self.products = [
+            Product.objects.create(category=category, name=f'Producto {i}', price=10, stock=10)
+            for i in range(4)
+        ]
+        p0, p1, p2, p3 = self.products
+
+        self.user = User.objects.create_user(username='cliente', password='testpass123')
+        other = User.objects.create_user(username='otro', password='testpass123')
+
+        self._order(self.user, [p0, p1])
+        # p2 aparece con ambos productos del usuario en la misma orden
+        self._order(other, [p0, p1, p2])
+        self._order(other, [p0, p2])
+        self._order(other, [p1, p3])
+        # Las órdenes no completadas no cuentan
+        self._order(other, [p0, p3], status='PENDING')
+
+        self.recommender = ProductRecommender()
+
+    def _order(self, customer, products, status='COMPLETED'):
+        order = Order.objects.create(customer=customer, status=status, total_price=0)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=10)
+        return order
+
+    def test_command_refreshes_tables(self):
+        """El comando llena ventas recientes y pares por órdenes distintas."""
+        out = StringIO()
+        call_command('refresh_recommendation_stats', stdout=out)
+
+        self.assertIn('pares de productos actualizados', out.getvalue())
+        p0, p1, p2, p3 = self.products
+        self.assertEqual(ProductRecentSales.objects.get(product=p0).recent_sales, 3)
+        pair = ProductCoOccurrence.objects.get(product_a=p0, product_b=p2)
+        self.assertEqual(pair.count, 2)
+        self.assertFalse(ProductCoOccurrence.objects.filter(product_a=p0, product_b=p3).exists())
+
+    def test_co_occurrence_table_matches_live_query(self):
+        """La tabla de pares y el query en vivo cuentan órdenes distintas."""
+        call_command('refresh_recommendation_stats', stdout=StringIO())
+        p0, p1, p2, p3 = self.products
+        user_products = {p0.id, p1.id}
+
+        from_table = self.recommender._co_occurrence_scores(user_products, 10)
+        live = {
+            row['id']: row['co_occurrence']
+            for row in self.recommender._get_product_strategy_stats(user_products, 10)
+            if row['co_occurrence'] > 0 and row['id'] not in user_products
+        }
+
+        # p2: 2 órdenes (no 3 sumando los pares p0-p2 y p1-p2); p3: 1 orden
+        self.assertEqual(live, {p2.id: 2, p3.id: 1})
+        self.assertEqual(from_table, [(p2.id, 1.0), (p3.id, 0.5)])
+
+    def test_trending_uses_fresh_recent_sales(self):
+        """Con la tabla al día, trending la usa en lugar del query en vivo."""
+        p0, p1, p2, p3 = self.products
+        ProductRecentSales.objects.create(product=p3, recent_sales=50)
+
+        self.assertEqual(self.recommender._get_trending_products(2), [(p3.id, 1.0)])
+
+    def test_trending_ignores_stale_recent_sales(self):
+        """Filas más viejas que RECENT_SALES_MAX_AGE se ignoran (query en vivo)."""
+        p0, p1, p2, p3 = self.products
+        ProductRecentSales.objects.create(
+            product=p3,
+            recent_sales=50,
+            refreshed_at=timezone.now() - ProductRecommender.RECENT_SALES_MAX_AGE - timedelta(minutes=1)
+        )
+
+        trending = self.recommender._get_trending_products(2)
+
+        # p0 y p1 tienen 3 ventas completadas cada uno
+        self.assertCountEqual(trending, [(p0.id, 1.0), (p1.id, 1.0)])
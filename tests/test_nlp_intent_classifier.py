@@ -0,0 +1,48 @@
+"""
+Tests para el clasificador NLP de intención (entrenamiento y caché del modelo).
+"""
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sales import nlp_intent_classifier
+from sales.intelligent_report_router import IntelligentReportRouter
+
+
+class IntentModelRetrainTests(SimpleTestCase):
+    """El modelo se guarda en un directorio temporal para no tocar ml_models/."""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.model_path = Path(tmp_dir.name) / 'nlp_intent_model.pkl'
+
+        patcher = mock.patch.object(nlp_intent_classifier, 'MODEL_PATH', self.model_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(nlp_intent_classifier, '_CACHED', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.reports = IntelligentReportRouter("").AVAILABLE_REPORTS
+
+    def test_retrain_keeps_cached_pipeline_usable(self):
+        """Reentrenar no invalida el pipeline ya cargado con mmap."""
+        nlp_intent_classifier.train_intent_model(self.reports)
+        old_pipeline = nlp_intent_classifier.load_model_or_none()
+        self.assertIsNotNone(old_pipeline)
+        old_inode = self.model_path.stat().st_ino
+
+        result = nlp_intent_classifier.train_intent_model(self.reports)
+
+        self.assertTrue(result['trained'])
+        # Archivo nuevo reemplazado de forma atómica, no sobrescrito en el lugar
+        self.assertNotEqual(self.model_path.stat().st_ino, old_inode)
+        # Solo queda el modelo final, sin temporales
+        self.assertEqual(list(self.model_path.parent.iterdir()), [self.model_path])
+        # El pipeline anterior sigue leyendo sus arrays (antes: SIGBUS)
+        self.assertIn(old_pipeline.predict(['ventas por producto'])[0], self.reports)
+        prediction = nlp_intent_classifier.predict_intent_or_none('ventas por producto')
+        self.assertIn(prediction['label'], self.reports)
@@ -11,11 +11,14 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
+from django.core.cache import cache
 from datetime import datetime, timedelta
 from decimal import Decimal
+from unittest import mock
 import json
 
 from products.models import Product, Category
+from sales import reports_core
 from sales.models import Order, OrderItem
 from api.models import Profile
 from sales.prompt_parser import PromptParser
@@ -739,3 +742,55 @@ class ExportTestCase(TestCase):
    - Exportar comprobantes
    - Exportar dashboard
 """
+
+
+class DashboardMetricsCacheTestCase(TestCase):
+    """Tests para la caché de métricas del dashboard (reports_core)"""
+    
+    def setUp(self):
+        """Configuración inicial"""
+        cache.clear()
+        self.addCleanup(cache.clear)
+        
+        self.client_user = User.objects.create_user(
+            username='cliente_cache',
+            password='pass123'
+        )
+        self.order = Order.objects.create(
+            customer=self.client_user,
+            status='COMPLETED',
+            total_price=Decimal('100.00')
+        )
+    
+    def test_metrics_are_cached(self):
+        """Test: La segunda llamada se sirve desde la caché"""
+        with mock.patch(
+            'sales.reports_core._calcular_metricas_y_series',
+            wraps=reports_core._calcular_metricas_y_series
+        ) as calcular:
+            first = reports_core.obtener_metricas_y_series({})
+            second = reports_core.obtener_metricas_y_series({})
+        
+        self.assertEqual(calcular.call_count, 1)
+        self.assertEqual(first, second)
+    
+    def test_order_save_invalidates_metrics(self):
+        """Test: Guardar una orden (COMPLETED -> CANCELLED) recalcula las métricas"""
+        metricas = reports_core.obtener_metricas_y_series({})['metricas']
+        self.assertEqual(metricas['total_ventas'], 100.0)
+        self.assertEqual(metricas['total_ordenes'], 1)
+        
+        self.order.status = 'CANCELLED'
+        self.order.save()
+        
+        metricas = reports_core.obtener_metricas_y_series({})['metricas']
+        self.assertEqual(metricas['total_ventas'], 0.0)
+        self.assertEqual(metricas['total_ordenes'], 0)
+    
+    def test_order_delete_invalidates_metrics(self):
+        """Test: Eliminar una orden recalcula las métricas"""
+        self.assertEqual(reports_core.obtener_metricas_y_series({})['metricas']['total_ordenes'], 1)
+        
+        self.order.delete()
+        
+        self.assertEqual(reports_core.obtener_metricas_y_series({})['metricas']['total_ordenes'], 0)
@@ -5,7 +5,7 @@ Tests para el Sistema Unificado de Comandos Inteligentes
 
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from sales.unified_command_parser import UnifiedCommandParser, parse_command, get_available_reports
 
@@ -377,3 +377,31 @@ class TestParserPerformance(TestCase):
         # Todos deben tener tipos diferentes
         types = [r['report_type'] for r in results]
         assert len(set(types)) == len(types), "Tipos duplicados en comandos diferentes"
+
+
+class TestParserEnabledReports(TestCase):
+    """
+    Tests del catálogo restringido con UNIFIED_PARSER_ENABLED_REPORTS
+    """
+    
+    def test_restricted_catalog(self):
+        """Test: Solo se identifican los reportes habilitados"""
+        assert parse_command("dashboard ejecutivo")['report_type'] == 'dashboard_ejecutivo'
+        
+        with override_settings(UNIFIED_PARSER_ENABLED_REPORTS=['ventas_por_producto', 'analisis_rfm']):
+            assert parse_command("analisis rfm")['report_type'] == 'analisis_rfm'
+            assert parse_command("dashboard ejecutivo")['report_type'] != 'dashboard_ejecutivo'
+        
+        # Al restaurar el setting se vuelve a usar el catálogo completo
+        assert parse_command("dashboard ejecutivo")['report_type'] == 'dashboard_ejecutivo'
+    
+    def test_default_report_when_disabled(self):
+        """Test: Sin coincidencias se usa el primer reporte habilitado"""
+        assert parse_command("qwerty")['report_type'] == 'ventas_basico'
+        
+        with override_settings(UNIFIED_PARSER_ENABLED_REPORTS=['ventas_por_producto', 'analisis_rfm']):
+            result = parse_command("qwerty")
+        
+        assert result['report_type'] == 'ventas_por_producto'
+        assert result['report_name'] == 'Ventas por Producto'
+        assert result['description'].endswith('(opción por defecto)')